@@ -0,0 +1,102 @@
+import asyncio
+import threading
+import time
+from collections import Counter
+
+
+class MicroBatcher:
+    """
+    Regroupe les requêtes unitaires concurrentes en un seul appel de prédiction.
+
+    Les lignes soumises dans une fenêtre de `window_ms` millisecondes (ou
+    jusqu'à `max_batch_size` lignes) sont scorées ensemble sur un thread de
+    travail, puis chaque résultat est renvoyé à la requête qui l'attend.
+
+    Parameters
+    ----------
+    predict_fn : callable
+        Fonction `list[dict] -> séquence de float`, appelée hors de la boucle
+        asyncio.
+    window_ms : float, default=3.0
+        Durée maximale d'attente après la première ligne d'un batch.
+    max_batch_size : int, default=64
+        Nombre maximal de lignes par appel de prédiction.
+    """
+
+    def __init__(self, predict_fn, window_ms: float = 3.0, max_batch_size: int = 64):
+        self.predict_fn = predict_fn
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._queue = None
+        self._worker = None
+
+        self._lock = threading.Lock()
+        self._sizes = Counter()
+        self._n_batches = 0
+        self._n_rows = 0
+        self._max_size = 0
+        self._predict_seconds = 0.0
+
+    async def submit(self, row: dict) -> float:
+        if self._worker is None:
+            # Démarrage paresseux : la file doit être créée dans la boucle du serveur
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, future))
+        return await future
+
+    async def _collect(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.window
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            rows = [row for row, _ in batch]
+            start = time.perf_counter()
+            try:
+                predictions = await asyncio.to_thread(self.predict_fn, rows)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for (_, future), prediction in zip(batch, predictions):
+                    if not future.done():
+                        future.set_result(float(prediction))
+            self._record(len(batch), time.perf_counter() - start)
+
+    def _record(self, size: int, seconds: float):
+        with self._lock:
+            # Histogramme par puissances de 2 (1, 2, 4, 8, ...)
+            bucket = 1 << (size - 1).bit_length()
+            self._sizes[bucket] += 1
+            self._n_batches += 1
+            self._n_rows += size
+            self._max_size = max(self._max_size, size)
+            self._predict_seconds += seconds
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "window_ms": self.window * 1000,
+                "max_batch_size": self.max_batch_size,
+                "batches": self._n_batches,
+                "rows": self._n_rows,
+                "mean_batch_size": self._n_rows / self._n_batches if self._n_batches else 0.0,
+                "max_observed_batch_size": self._max_size,
+                "batch_size_histogram": {f"<={k}": v for k, v in sorted(self._sizes.items())},
+                "predict_seconds_total": round(self._predict_seconds, 6),
+                "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            }
@@ -1,19 +1,201 @@
-from fastapi import FastAPI, Depends
-from schemas import InputData
-from model_loader import get_model
-from security import verify_api_key
-import pandas as pd
+import os
+import sys
+from pathlib import Path
+
+# Racine du projet importable (scripts/, train/), quel que soit le dossier de lancement
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from fastapi import FastAPI, Depends, HTTPException  # noqa: E402
+from fastapi.concurrency import run_in_threadpool  # noqa: E402
+from pydantic import ValidationError  # noqa: E402
+from schemas import InputData, BatchInputData  # noqa: E402
+from model_loader import predict_records, supports_records, FlatPipeline  # noqa: E402
+from scripts.feature_store import LEVELS, load_commune_index, load_feature_store  # noqa: E402
+from model_registry import ModelRegistry  # noqa: E402
+from security import verify_api_key  # noqa: E402
+from batcher import MicroBatcher  # noqa: E402
+import pandas as pd  # noqa: E402
 
 app = FastAPI()
 
-model = get_model()
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "10000"))
+
+# Coalescence des requêtes /predict (opt-in)
+COALESCE = os.getenv("PREDICT_COALESCE", "0") == "1"
+COALESCE_WINDOW_MS = float(os.getenv("COALESCE_WINDOW_MS", "3"))
+COALESCE_MAX_BATCH = int(os.getenv("COALESCE_MAX_BATCH", "64"))
+
+# En dessous de ce nombre de lignes, on court-circuite pandas (voir predict_records)
+FAST_PATH_MAX_ROWS = int(os.getenv("FAST_PATH_MAX_ROWS", "256"))
+
+# Statistiques précalculées par commune / département / code postal
+FEATURE_STORE_PATH = os.getenv("FEATURE_STORE_PATH", "data/features/stats_2020.parquet")
+COMMUNE_INDEX_PATH = os.getenv("COMMUNE_INDEX_PATH", "data/features/communes_2020.parquet")
+
+# Ligne de référence pour réchauffer un modèle avant sa mise en service
+WARMUP_ROW = {
+    "surface_reelle_bati": 50.0,
+    "nombre_pieces_principales": 2,
+    "latitude": 48.8566,
+    "longitude": 2.3522,
+    "has_dependance": 0,
+    "nom_commune": "Paris",
+    "code_commune": "75056",
+}
+
+
+COMMUNE_FIELDS = {"nom_commune", "code_commune"}
+
+
+def commune_keys(model) -> set:
+    # Champs commune lus par les encodeurs du modèle (attribut `key` :
+    # nom_commune pour CommuneSalesEncoder, code INSEE pour CommuneCodeEncoder)
+    return {getattr(step, "key", None) for _, step in getattr(model, "steps", [])} & COMMUNE_FIELDS
+
+
+def resolve_commune(row: dict, keys: set) -> dict:
+    # Complète, via l'index des communes, le champ attendu par le modèle
+    # (`keys`) quand la requête ne fournit que l'autre. Un modèle indexé sur
+    # le nom sert donc une requête nom_commune seule sans index.
+    # Index absent, code inconnu ou nom ambigu (homonymes) : ValueError, la
+    # ligne n'est pas prédite sur la valeur par défaut du modèle. Un nom
+    # inconnu de l'index est gardé tel quel (commune sans vente).
+    missing = [key for key in sorted(keys) if not row.get(key)]
+    if not missing:
+        return row
+    try:
+        index = load_commune_index(COMMUNE_INDEX_PATH)
+    except FileNotFoundError:
+        raise ValueError(f"Index des communes indisponible : fournir {', '.join(missing)}.")
+    if "nom_commune" in missing:
+        row["nom_commune"] = index.name_of(row["code_commune"])
+        if row["nom_commune"] is None:
+            raise ValueError(f"code_commune inconnu : {row['code_commune']}")
+    if "code_commune" in missing:
+        row["code_commune"] = index.code_of(row["nom_commune"])
+    return row
+
+
+def predict_with(model, rows: list[dict]) -> list[float]:
+    if isinstance(model, FlatPipeline):
+        return [float(p) for p in model.predict_records(rows)]
+    if len(rows) <= FAST_PATH_MAX_ROWS and supports_records(model):
+        return [float(p) for p in predict_records(model, rows)]
+    return [float(p) for p in model.predict(pd.DataFrame(rows))]
+
+
+registry = ModelRegistry(
+    default_version=os.getenv("DEFAULT_MODEL_VERSION"),
+    warmup=lambda model: predict_with(model, [WARMUP_ROW]),
+)
+registry.start_watcher()
+
+
+def get_versioned_model(version: str | None = None):
+    try:
+        return registry.get(version)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+
+
+def predict_rows(rows: list[dict], version: str | None = None) -> list[float]:
+    return predict_with(get_versioned_model(version), rows)
+
+
+batcher = MicroBatcher(predict_rows, COALESCE_WINDOW_MS, COALESCE_MAX_BATCH) if COALESCE else None
 
 @app.get("/")
 def root():
     return {"message": "API ML OK 🚀"}
 
 @app.post("/predict")
-def predict(data: InputData, api_key: str = Depends(verify_api_key)):
-    df = pd.DataFrame([data.dict()])
-    prediction = model.predict(df)[0]
-    return {"prix_m2": prediction}
\ No newline at end of file
+async def predict(data: InputData, version: str | None = None, api_key: str = Depends(verify_api_key)):
+    model = await run_in_threadpool(get_versioned_model, version)
+    try:
+        row = resolve_commune(data.dict(), commune_keys(model))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if batcher is not None and version in (None, registry.default_version):
+        prediction = await batcher.submit(row)
+    else:
+        prediction = (await run_in_threadpool(predict_rows, [row], version))[0]
+    return {"prix_m2": prediction}
+
+@app.post("/predict/batch")
+def predict_batch(batch: BatchInputData, version: str | None = None, api_key: str = Depends(verify_api_key)):
+    if batch.rows is not None and batch.columns is not None:
+        raise HTTPException(status_code=422, detail="Fournir `rows` ou `columns`, pas les deux.")
+    # Taille vérifiée avant de déplier le payload colonnaire en lignes
+    n_rows = batch.n_rows()
+    if n_rows > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch trop grand : {n_rows} lignes (max {MAX_BATCH_SIZE}).",
+        )
+    try:
+        rows = batch.to_rows()
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    # Validation ligne par ligne : les lignes invalides sont signalées
+    # sans bloquer le scoring des autres.
+    model = get_versioned_model(version)
+    keys = commune_keys(model)
+    valid_idx, valid_rows, errors = [], [], []
+    for i, row in enumerate(rows):
+        try:
+            valid_rows.append(resolve_commune(InputData(**row).dict(), keys))
+            valid_idx.append(i)
+        except ValidationError as e:
+            errors.append({"index": i, "detail": e.errors(include_url=False)})
+        except ValueError as e:
+            # Commune non résolue (voir resolve_commune)
+            errors.append({"index": i, "detail": [{"type": "value_error", "loc": ["commune"], "msg": str(e)}]})
+
+    predictions = [None] * len(rows)
+    if valid_rows:
+        # Un seul appel vectorisé pour tout le batch
+        for i, score in zip(valid_idx, predict_with(model, valid_rows)):
+            predictions[i] = score
+
+    return {
+        "predictions": predictions,
+        "n_rows": len(rows),
+        "n_errors": len(errors),
+        "errors": errors,
+    }
+
+@app.get("/features/{niveau}/{cle}")
+def get_features(niveau: str, cle: str, api_key: str = Depends(verify_api_key)):
+    if niveau not in LEVELS:
+        raise HTTPException(status_code=404, detail=f"Niveau inconnu : {niveau} (attendu : {', '.join(LEVELS)})")
+    try:
+        store = load_feature_store(FEATURE_STORE_PATH)
+    except FileNotFoundError:
+        raise HTTPException(status_code=503, detail="Statistiques indisponibles (feature store absent).")
+    stats = store.get(niveau, cle)
+    if stats is None:
+        raise HTTPException(status_code=404, detail=f"{niveau} inconnu : {cle}")
+    return {"niveau": niveau, "cle": cle, **stats}
+
+@app.get("/metrics/batching")
+def batching_metrics(api_key: str = Depends(verify_api_key)):
+    if batcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **batcher.metrics()}
+
+
+@app.get("/admin/models")
+def list_models(api_key: str = Depends(verify_api_key)):
+    return registry.stats()
+
+@app.post("/admin/models/{version}/reload")
+def reload_model(version: str, api_key: str = Depends(verify_api_key)):
+    # Le nouvel artefact est chargé et réchauffé pendant que l'ancien continue de servir
+    registry.discover()
+    try:
+        return registry.reload(version)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
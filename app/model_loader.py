@@ -1,4 +1,46 @@
+import os
+import sys
+import time
+from pathlib import Path
+
 import joblib
+import psutil
+
+# Les transformers custom du pipeline (train/train.py) doivent être
+# importables pour dépickler le modèle et pour l'inférence sans DataFrame.
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.append(str(PROJECT_ROOT))
+
+from train.train import CommuneSalesEncoder, FeatureSelector, predict_records, supports_records  # noqa: E402,F401
+from train.flat_forest import FLAT_FORMAT, FlatPipeline  # noqa: E402
+
+MODEL_PATH = os.getenv("MODEL_PATH", "model/model.joblib")
+
+# "r" : les tableaux du modèle sont mappés en mémoire (lecture seule) et
+# partagés entre workers via le cache de pages de l'OS. Ne vaut que pour un
+# modèle à plat non compressé : sklearn recopie les noeuds de chaque arbre
+# au dépickling, un pipeline sklearn reste donc privé à chaque worker.
+MODEL_MMAP = os.getenv("MODEL_MMAP", "r") or None
+
+def _memory_mb() -> tuple[float, float]:
+    info = psutil.Process().memory_full_info()
+    return info.rss / 1e6, info.uss / 1e6
+
+def get_model(path: str = MODEL_PATH, mmap_mode: str | None = MODEL_MMAP):
+    # Accepte indifféremment un pipeline sklearn ou un modèle exporté
+    # par `python -m train.flat_forest`.
+    rss_before, uss_before = _memory_mb()
+    start = time.perf_counter()
+
+    obj = joblib.load(path, mmap_mode=mmap_mode)
+    if isinstance(obj, dict) and obj.get("format") == FLAT_FORMAT:
+        obj = FlatPipeline.from_dict(obj)
 
-def get_model():
-    return joblib.load("model/model.joblib")
\ No newline at end of file
+    rss_after, uss_after = _memory_mb()
+    print(
+        f"🧠 Modèle chargé : {path} (pid {os.getpid()}, mmap={mmap_mode}) en "
+        f"{time.perf_counter() - start:.2f} s — RSS +{rss_after - rss_before:.1f} Mo, "
+        f"mémoire privée (USS) +{uss_after - uss_before:.1f} Mo"
+    )
+    return obj
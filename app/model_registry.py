@@ -0,0 +1,182 @@
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from model_loader import MODEL_PATH, get_model
+
+MODEL_DIR = os.getenv("MODEL_DIR", "model")
+MODEL_WATCH_INTERVAL = float(os.getenv("MODEL_WATCH_INTERVAL", "0"))
+
+
+@dataclass
+class ModelEntry:
+    version: str
+    path: Path
+    model: object
+    mtime: float
+    size_bytes: int
+    load_seconds: float
+    loaded_at: float = field(default_factory=time.time)
+
+    def info(self) -> dict:
+        return {
+            "version": self.version,
+            "loaded": True,
+            "path": str(self.path),
+            "size_mb": round(self.size_bytes / 1e6, 2),
+            "load_seconds": round(self.load_seconds, 3),
+            "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.loaded_at)),
+            "model_type": type(self.model).__name__,
+        }
+
+
+class ModelRegistry:
+    """
+    Registre de modèles versionnés, chargés à la demande.
+
+    Les artefacts `model_<version>.joblib` du dossier `model_dir` sont
+    découverts au démarrage (`model.joblib` devient la version "default").
+    Un modèle n'est chargé qu'à sa première utilisation. Un rechargement
+    prépare et réchauffe le nouvel artefact à côté de l'ancien, puis le
+    remplace d'un seul coup : les requêtes en cours continuent d'utiliser
+    l'ancienne version jusque-là. Les artefacts étant mappés en mémoire,
+    un nouvel artefact doit être publié par renommage (jamais réécrit en place).
+
+    Parameters
+    ----------
+    model_dir : str
+        Dossier contenant les artefacts.
+    default_version : str, optional
+        Version servie quand la requête n'en précise pas.
+    warmup : callable, optional
+        Appelée sur chaque nouveau modèle avant sa mise en service.
+    """
+
+    def __init__(self, model_dir: str = MODEL_DIR, default_version: str | None = None, warmup=None):
+        self.model_dir = Path(model_dir)
+        self.warmup = warmup
+        self._paths: dict[str, Path] = {}
+        self._entries: dict[str, ModelEntry] = {}
+        self._locks: dict[str, threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+        self._watcher = None
+        self.discover()
+        self.default_version = default_version or self._guess_default()
+
+    # --------------------------------------------------
+    # Découverte
+    # --------------------------------------------------
+    def discover(self) -> dict[str, Path]:
+        found = {}
+        for path in sorted(self.model_dir.glob("model*.joblib")):
+            version = "default" if path.stem == "model" else path.stem.removeprefix("model_")
+            found[version] = path
+        # MODEL_PATH l'emporte sur model/model.joblib (ex. model_flat.joblib) ;
+        # l'artefact n'est pas enregistré (ni mappé) une seconde fois sous son nom
+        default_path = Path(MODEL_PATH)
+        if default_path.exists():
+            found = {v: p for v, p in found.items() if p.resolve() != default_path.resolve()}
+            found["default"] = default_path
+        with self._registry_lock:
+            # Artefacts supprimés depuis la dernière découverte : plus servis
+            # aux nouvelles demandes (un modèle déjà chargé reste en mémoire)
+            for version in [v for v, path in self._paths.items() if not path.exists()]:
+                del self._paths[version]
+            self._paths.update(found)
+        return found
+
+    def register(self, version: str, path) -> None:
+        with self._registry_lock:
+            self._paths[version] = Path(path)
+
+    def _guess_default(self) -> str | None:
+        if "default" in self._paths:
+            return "default"
+        return max(self._paths) if self._paths else None
+
+    @property
+    def versions(self) -> list[str]:
+        return sorted(self._paths)
+
+    # --------------------------------------------------
+    # Chargement
+    # --------------------------------------------------
+    def _lock_for(self, version: str) -> threading.Lock:
+        with self._registry_lock:
+            return self._locks.setdefault(version, threading.Lock())
+
+    def _load(self, version: str) -> ModelEntry:
+        path = self._paths.get(version)
+        if path is None:
+            raise KeyError(f"Version de modèle inconnue : {version}")
+        stat = path.stat()
+        start = time.perf_counter()
+        model = get_model(str(path))
+        if self.warmup is not None:
+            self.warmup(model)
+        return ModelEntry(
+            version=version,
+            path=path,
+            model=model,
+            mtime=stat.st_mtime,
+            size_bytes=stat.st_size,
+            load_seconds=time.perf_counter() - start,
+        )
+
+    def get(self, version: str | None = None):
+        version = version or self.default_version
+        entry = self._entries.get(version)
+        if entry is None:
+            with self._lock_for(version):
+                # Double vérification : un autre thread a pu charger entre-temps
+                entry = self._entries.get(version)
+                if entry is None:
+                    entry = self._entries[version] = self._load(version)
+        return entry.model
+
+    def reload(self, version: str | None = None) -> dict:
+        version = version or self.default_version
+        with self._lock_for(version):
+            entry = self._load(version)
+            # Remplacement atomique : une seule affectation de référence
+            self._entries[version] = entry
+        print(f"🔁 Modèle {version} rechargé ({entry.load_seconds:.2f} s)")
+        return entry.info()
+
+    # --------------------------------------------------
+    # Surveillance des fichiers
+    # --------------------------------------------------
+    def start_watcher(self, interval: float = MODEL_WATCH_INTERVAL) -> None:
+        if interval <= 0 or self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), daemon=True)
+        self._watcher.start()
+
+    def _watch(self, interval: float) -> None:
+        while True:
+            time.sleep(interval)
+            self.discover()
+            for version, entry in list(self._entries.items()):
+                if version not in self._paths:
+                    continue
+                try:
+                    if entry.path.stat().st_mtime != entry.mtime:
+                        self.reload(version)
+                except Exception as e:
+                    # On continue de servir l'ancienne version
+                    print(f"❌ Rechargement du modèle {version} impossible : {e}")
+
+    # --------------------------------------------------
+    # Statistiques
+    # --------------------------------------------------
+    def stats(self) -> dict:
+        return {
+            "default_version": self.default_version,
+            "models": [
+                self._entries[v].info() if v in self._entries
+                else {"version": v, "path": str(self._paths[v]), "loaded": False}
+                for v in self.versions
+            ],
+        }
@@ -1,4 +1,7 @@
-from pydantic import BaseModel
+from typing import Any, Optional
+
+from pydantic import BaseModel, field_validator, model_validator
+
 
 class InputData(BaseModel):
     surface_reelle_bati: float
@@ -6,4 +9,49 @@ class InputData(BaseModel):
     latitude: float
     longitude: float
     has_dependance: int
-    nom_commune: str
\ No newline at end of file
+    # La commune est identifiée par son nom ou son code INSEE ; l'autre
+    # champ est complété par l'API à partir de l'index des communes.
+    nom_commune: Optional[str] = None
+    code_commune: Optional[str] = None
+
+    @field_validator("code_commune", mode="before")
+    @classmethod
+    def normalize_code_commune(cls, value):
+        # 1053 -> "01053" (codes numériques ou sans zéro initial)
+        if isinstance(value, int):
+            value = str(value)
+        if isinstance(value, str) and value.isdigit():
+            value = value.zfill(5)
+        return value
+
+    @model_validator(mode="after")
+    def check_commune(self):
+        if not self.nom_commune and not self.code_commune:
+            raise ValueError("nom_commune ou code_commune requis.")
+        return self
+
+
+class BatchInputData(BaseModel):
+    # Deux formats acceptés : liste de lignes ou payload colonnaire
+    # ({"surface_reelle_bati": [...], "latitude": [...], ...}).
+    # Les lignes ne sont pas typées ici : chaque ligne est validée
+    # individuellement contre InputData pour remonter les erreurs par ligne.
+    rows: Optional[list[dict[str, Any]]] = None
+    columns: Optional[dict[str, list[Any]]] = None
+
+    def n_rows(self) -> int:
+        # Plus longue colonne : un payload trop grand est refusé avant to_rows
+        if self.rows is not None:
+            return len(self.rows)
+        return max((len(v) for v in (self.columns or {}).values()), default=0)
+
+    def to_rows(self) -> list[dict[str, Any]]:
+        if self.rows is not None:
+            return self.rows
+        if not self.columns:
+            return []
+        lengths = {len(v) for v in self.columns.values()}
+        if len(lengths) > 1:
+            raise ValueError("Toutes les colonnes doivent avoir la même longueur.")
+        n = lengths.pop()
+        return [{k: v[i] for k, v in self.columns.items()} for i in range(n)]
@@ -0,0 +1,245 @@
+import os
+import sys
+import json
+import hashlib
+import argparse
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+from scripts.io_utils import ParquetDatasetWriter, sha256_file  # noqa: E402
+from scripts.map_grid import compute_grid  # noqa: E402
+
+# Agrégats des pages d'analyse Streamlit, précalculés une fois par version
+# des datasets de production : la page lit quelques petites tables au lieu
+# de ré-agréger le dataset complet à chaque interaction.
+#
+# Une version = empreinte du contenu des deux datasets et du code qui
+# calcule les agrégats ; elle est publiée par `ParquetDatasetWriter`
+# (une table par fichier, manifeste remplacé atomiquement).
+AGGREGATES_CODE = ["scripts/aggregates.py", "scripts/map_grid.py"]
+
+# Grille des curseurs de la page 04 (quantiles bas / haut de la coupe)
+QUANTILE_STEP = 0.005
+Q_LOW_RANGE = (0.0, 0.10)
+Q_HIGH_RANGE = (0.90, 1.0)
+HIST_BINS = 90
+# Taille max du curseur d'échantillon (scatter et carte en mode points)
+SAMPLE_SIZE = 200_000
+SAMPLE_COLUMNS = ["prix_m2", "surface_reelle_bati", "latitude", "longitude"]
+PREVIEW_ROWS = 30
+CORR_COLUMNS = [
+    "prix_m2",
+    "surface_reelle_bati",
+    "nombre_pieces_principales",
+    "latitude",
+    "longitude",
+    "has_dependance",
+    "nb_ventes_commune",
+]
+PRIX_QUANTILES = {"prix_m2_q25": 0.25, "prix_m2_q75": 0.75}
+
+
+def default_root(year: int) -> Path:
+    return Path(f"data/features/aggregates_{year}")
+
+
+def default_sources(year: int) -> tuple[Path, Path]:
+    return (Path(f"data/prod/df_streamlit_appart_{year}.parquet.gz"),
+            Path(f"data/prod/df_model_appart_{year}.parquet.gz"))
+
+
+@lru_cache(maxsize=8)
+def _version(sources: tuple, mtimes: tuple) -> str:
+    digests = [sha256_file(path).hexdigest() for path in sources]
+    digests += [sha256_file(PROJECT_ROOT / path).hexdigest() for path in AGGREGATES_CODE]
+    return hashlib.sha256("|".join(digests).encode()).hexdigest()[:16]
+
+
+def dataset_version(stream_path, model_path) -> str:
+    """Version des agrégats pour ces datasets (recalculée si un fichier change)."""
+    sources = (str(stream_path), str(model_path))
+    return _version(sources, tuple(os.path.getmtime(path) for path in sources))
+
+
+def _ensure_prix_m2(df: pd.DataFrame) -> pd.DataFrame:
+    if "prix_m2" not in df.columns and {"valeur_fonciere", "surface_reelle_bati"}.issubset(df.columns):
+        df = df[df["surface_reelle_bati"].fillna(0) > 0].copy()
+        df["prix_m2"] = df["valeur_fonciere"] / df["surface_reelle_bati"]
+    return df
+
+
+def _cut_grid(bounds: tuple) -> np.ndarray:
+    n = int(round((bounds[1] - bounds[0]) / QUANTILE_STEP))
+    return np.round(bounds[0] + QUANTILE_STEP * np.arange(n + 1), 3)
+
+
+def _group_stats(df: pd.DataFrame, column: str) -> pd.DataFrame:
+    grouped = df.dropna(subset=[column, "prix_m2"]).groupby(column, observed=True, sort=True)
+    stats = pd.DataFrame({
+        "nb_ventes": grouped.size().astype("int32"),
+        "prix_m2": grouped["prix_m2"].median(),
+    })
+    quantiles = grouped["prix_m2"].quantile(list(PRIX_QUANTILES.values())).unstack()
+    for name, q in PRIX_QUANTILES.items():
+        stats[name] = quantiles[q]
+    if {"latitude", "longitude"}.issubset(df.columns):
+        stats["latitude"] = grouped["latitude"].median()
+        stats["longitude"] = grouped["longitude"].median()
+    return stats.reset_index()
+
+
+def _histograms(prix: np.ndarray) -> pd.DataFrame:
+    """Histogramme (HIST_BINS classes) de prix_m2 tronqué, pour chaque couple de coupes."""
+    prix = np.sort(prix[~np.isnan(prix)])
+    lows, highs = _cut_grid(Q_LOW_RANGE), _cut_grid(Q_HIGH_RANGE)
+    values = np.quantile(prix, np.concatenate([lows, highs]))
+    q_values = dict(zip(np.concatenate([lows, highs]), values))
+
+    frames = []
+    for q_low in lows:
+        for q_high in highs:
+            edges = np.linspace(q_values[q_low], q_values[q_high], HIST_BINS + 1)
+            # Même convention que np.histogram : dernière classe fermée à droite
+            positions = np.searchsorted(prix, edges, side="left")
+            positions[-1] = np.searchsorted(prix, edges[-1], side="right")
+            frames.append(pd.DataFrame({
+                "q_low": q_low, "q_high": q_high,
+                "x0": edges[:-1], "x1": edges[1:], "nb_ventes": np.diff(positions),
+            }))
+    return pd.concat(frames, ignore_index=True).astype(
+        {"x0": "float32", "x1": "float32", "nb_ventes": "int32"}
+    )
+
+
+def compute_aggregates(df_stream: pd.DataFrame, df_model: pd.DataFrame) -> dict:
+    """
+    Toutes les tables de la page 04, à partir des deux datasets de production.
+
+    Returns
+    -------
+    dict[str, pd.DataFrame]
+        kpis, completude, apercu, schemas, quantiles, histogrammes,
+        departements, communes, correlations, echantillon, grille
+    """
+    df_stream, df_model = _ensure_prix_m2(df_stream), _ensure_prix_m2(df_model)
+    tables = {}
+
+    tables["kpis"] = pd.DataFrame([
+        {"jeu": name, "lignes": len(df), "colonnes": df.shape[1],
+         "prix_m2_median": float(df["prix_m2"].median()) if "prix_m2" in df and len(df) else np.nan}
+        for name, df in [("streamlit", df_stream), ("modele", df_model)]
+    ])
+    geo_cols = [c for c in ["latitude", "longitude"] if c in df_stream.columns]
+    tables["completude"] = pd.DataFrame({
+        "colonne": geo_cols,
+        "taux_na": df_stream[geo_cols].isna().mean().mul(100).round(2).to_numpy(),
+    })
+    tables["apercu"] = df_stream.head(PREVIEW_ROWS).reset_index(drop=True)
+    tables["schemas"] = pd.concat([
+        pd.DataFrame({"jeu": name, "col": df.columns, "dtype": df.dtypes.astype(str).to_numpy()})
+        for name, df in [("streamlit", df_stream), ("modele", df_model)]
+    ], ignore_index=True)
+
+    if "prix_m2" in df_stream.columns:
+        prix = df_stream["prix_m2"].to_numpy(dtype=np.float64)
+        q = np.round(np.arange(0, round(1 / QUANTILE_STEP) + 1) * QUANTILE_STEP, 3)
+        tables["quantiles"] = pd.DataFrame({"q": q, "prix_m2": df_stream["prix_m2"].quantile(q).to_numpy()})
+        tables["histogrammes"] = _histograms(prix)
+
+    for name, column in [("departements", "code_departement"), ("communes", "nom_commune")]:
+        if column in df_stream.columns and "prix_m2" in df_stream.columns:
+            tables[name] = _group_stats(df_stream, column)
+
+    num_cols = df_model.select_dtypes(include=[np.number]).columns
+    selected_cols = [c for c in CORR_COLUMNS if c in num_cols]
+    if len(selected_cols) >= 2:
+        corr = df_model[selected_cols].corr(numeric_only=True)
+        tables["correlations"] = corr.rename_axis("variable").reset_index()
+
+    sample_cols = [c for c in SAMPLE_COLUMNS if c in df_stream.columns]
+    sample = df_stream[sample_cols].dropna(subset=[c for c in ["surface_reelle_bati", "prix_m2"] if c in sample_cols])
+    tables["echantillon"] = sample.sample(min(SAMPLE_SIZE, len(sample)), random_state=42).reset_index(drop=True)
+
+    if {"latitude", "longitude", "prix_m2", "surface_reelle_bati"}.issubset(df_stream.columns):
+        tables["grille"] = compute_grid(df_stream)
+    return tables
+
+
+def build_aggregates(year: int, stream_path=None, model_path=None, root=None, force=False) -> str:
+    """
+    Calcule et publie les agrégats d'une année, sauf si la version publiée
+    correspond déjà aux datasets courants.
+
+    Parameters
+    ----------
+    year : int
+        Année des datasets de production
+    stream_path, model_path : str, optional
+        Datasets Streamlit et Modèle (défaut : data/prod/df_*_appart_YYYY.parquet.gz)
+    root : str, optional
+        Dossier des agrégats (défaut : data/features/aggregates_YYYY)
+    force : bool, default=False
+        Recalcule même si la version est à jour
+
+    Returns
+    -------
+    str
+        Version publiée
+    """
+    default_stream, default_model = default_sources(year)
+    stream_path, model_path = Path(stream_path or default_stream), Path(model_path or default_model)
+    root = Path(root or default_root(year))
+    version = dataset_version(stream_path, model_path)
+    if not force and published_version(root) == version:
+        print(f"✅ Agrégats {year} à jour (version {version})")
+        return version
+
+    tables = compute_aggregates(pd.read_parquet(stream_path), pd.read_parquet(model_path))
+    writer = ParquetDatasetWriter(root, version)
+    for name, table in tables.items():
+        writer.write_part(table, name, compression="zstd")
+    writer.commit()
+    size = sum(path.stat().st_size for path in writer.version_dir.glob("*.parquet"))
+    print(f"✅ Agrégats {year} publiés : {len(tables)} tables, {size / 1e6:.1f} Mo (version {version})")
+    return version
+
+
+def _manifest(root) -> dict | None:
+    path = Path(root) / ParquetDatasetWriter.MANIFEST
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def published_version(root) -> str | None:
+    manifest = _manifest(root)
+    return manifest["version"] if manifest else None
+
+
+def load_aggregates(root) -> dict:
+    """Tables de la version publiée, par nom (ex. `aggs["quantiles"]`)."""
+    manifest = _manifest(root)
+    if manifest is None:
+        raise FileNotFoundError(f"Aucune version d'agrégats publiée dans {root}")
+    return {
+        Path(f["path"]).stem: pd.read_parquet(Path(root) / f["path"])
+        for f in manifest["files"]
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Agrégats précalculés des pages d'analyse Streamlit.")
+    parser.add_argument("--years", nargs="+", type=int, default=[2020])
+    parser.add_argument("--stream-path", help="Défaut : data/prod/df_streamlit_appart_YYYY.parquet.gz")
+    parser.add_argument("--model-path", help="Défaut : data/prod/df_model_appart_YYYY.parquet.gz")
+    parser.add_argument("--root", help="Défaut : data/features/aggregates_YYYY")
+    parser.add_argument("--force", action="store_true", help="Recalcule même si la version est à jour")
+    args = parser.parse_args()
+
+    for year in args.years:
+        build_aggregates(year, args.stream_path, args.model_path, args.root, args.force)
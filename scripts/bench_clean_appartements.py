@@ -0,0 +1,93 @@
+"""
+Parité et temps : nettoyage des appartements, notebook 05 vs version vectorisée.
+
+Usage (depuis la racine du repo) :
+    python scripts/bench_clean_appartements.py [data/parquet/optimized_2020.parquet] [n_mutations]
+"""
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from scripts.clean_appartements import clean_appartements  # noqa: E402
+
+ALLOWED_TYPES = {"Appartement", "Dépendance"}
+
+
+def clean_appartements_notebook(df: pd.DataFrame) -> pd.DataFrame:
+    """Référence : cellules du notebook 05, reprises telles quelles."""
+    df_ventes = df.loc[df['nature_mutation'] == 'Vente'].copy()
+    df_ventes["is_appartement"] = df_ventes["type_local"].eq("Appartement")
+    df_ventes_app_mut = (
+        df_ventes
+        .groupby("id_mutation", as_index=False)
+        .filter(lambda g: g["is_appartement"].any())
+        .copy()
+    )
+    valid_ids = (
+        df_ventes_app_mut
+        .groupby("id_mutation")["type_local"]
+        .apply(
+            lambda s: (
+                "Appartement" in set(s.dropna())
+                and set(s.dropna()).issubset(ALLOWED_TYPES)
+            )
+        )
+    )
+    df_ventes_app_clean = df_ventes_app_mut[
+        df_ventes_app_mut["id_mutation"].isin(valid_ids[valid_ids].index)
+    ].copy()
+    app_count_per_mut = (
+        df_ventes_app_clean[df_ventes_app_clean["is_appartement"]]
+        .groupby("id_mutation")
+        .size()
+    )
+    single_app_ids = app_count_per_mut[app_count_per_mut == 1].index
+    df_ventes_app_final = df_ventes_app_clean[
+        df_ventes_app_clean["id_mutation"].isin(single_app_ids)
+    ].copy()
+    df_vente_app_agg = (
+        df_ventes_app_final
+        .loc[df_ventes_app_final["is_appartement"]]
+        .copy()
+    )
+    mut_agg = (
+        df_ventes_app_final
+        .groupby("id_mutation")
+        .agg(
+            has_dependance=("type_local", lambda s: (s == "Dépendance").any()),
+            has_nan_type_local=("type_local", lambda s: s.isna().any()),
+            surface_terrain=("surface_terrain", "sum"),
+            nb_lignes_mutation=("type_local", "size"),
+        )
+        .reset_index()
+    )
+    return df_vente_app_agg.merge(mut_agg, on="id_mutation", how="left")
+
+
+def timed(fn, df):
+    start = time.perf_counter()
+    out = fn(df)
+    return out, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    data_path = sys.argv[1] if len(sys.argv) > 1 else "data/parquet/optimized_2020.parquet"
+    n_mutations = int(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    df = pd.read_parquet(data_path)
+    if n_mutations:
+        ids = df["id_mutation"].drop_duplicates().sample(n_mutations, random_state=42)
+        df = df[df["id_mutation"].isin(ids)].reset_index(drop=True)
+    print(f"📦 {len(df):,} lignes | {df['id_mutation'].nunique():,} mutations".replace(",", " "))
+
+    expected, t_ref = timed(clean_appartements_notebook, df)
+    got, t_vec = timed(lambda d: clean_appartements(d, verbose=False), df)
+
+    pd.testing.assert_frame_equal(got, expected)
+    print(f"✅ Parité : {len(got):,} lignes identiques".replace(",", " "))
+    print(f"⏱️ Notebook {t_ref:.1f} s | vectorisé {t_vec:.2f} s (x{t_ref / t_vec:.0f})")
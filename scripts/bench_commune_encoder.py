@@ -0,0 +1,62 @@
+"""
+Transform des encodeurs de commune : map pandas sur le nom vs identifiants int32.
+
+Usage (depuis la racine du repo) :
+    python scripts/bench_commune_encoder.py [data/prod/df_model_appart_2020.parquet.gz]
+
+Le benchmark porte sur code_commune si le dataset l'a, sinon sur nom_commune
+(même mécanisme, les anciens datasets de production n'ont pas le code).
+"""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from train.train import CommuneCodeEncoder, CommuneSalesEncoder  # noqa: E402
+
+DATA_PATH = PROJECT_ROOT / "data/prod/df_model_appart_2020.parquet.gz"
+REPEATS = 5
+
+
+def best_of(fn, repeats=REPEATS) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+if __name__ == "__main__":
+    df = pd.read_parquet(sys.argv[1] if len(sys.argv) > 1 else DATA_PATH)
+    key = "code_commune" if "code_commune" in df.columns else "nom_commune"
+    print(f"📦 {len(df):,} lignes | {df[key].nunique():,} communes (clé : {key})".replace(",", " "))
+
+    by_name = CommuneSalesEncoder().fit(df)
+    by_id = CommuneCodeEncoder(key=key).fit(df)
+    df_cat = df.assign(**{key: df[key].astype("category")})
+    values = df[key].tolist()
+
+    # Parité sur la même clé (nom) : mêmes comptages, même repli médian
+    if key == "nom_commune":
+        expected = by_name.transform(df)["nb_ventes_commune"].to_numpy()
+        got = by_id.transform(df)["nb_ventes_commune"].to_numpy()
+        assert np.array_equal(expected, got), "écart entre les deux encodeurs"
+        print("✅ Parité : comptages identiques")
+
+    cases = [
+        ("map pandas (nom, CommuneSalesEncoder)", lambda: by_name.transform(df)),
+        (f"ids int32 ({key}, chaînes)", lambda: by_id.transform(df)),
+        (f"ids int32 ({key}, catégoriel)", lambda: by_id.transform(df_cat)),
+        ("dict (nom, transform_columns)", lambda: by_name.transform_columns({"nom_commune": df["nom_commune"].tolist()})),
+        (f"ids int32 ({key}, transform_columns)", lambda: by_id.transform_columns({key: values})),
+    ]
+    print(f"\n{'transform':<42} {'ms':>8} {'Mlignes/s':>10}")
+    for label, fn in cases:
+        seconds = best_of(fn)
+        print(f"{label:<42} {1000 * seconds:>8.1f} {len(df) / seconds / 1e6:>10.1f}")
@@ -0,0 +1,117 @@
+"""
+Pic mémoire de la conversion CSV DVF → Parquet en streaming (dl_csvs.py) sur
+un fichier synthétique de plusieurs millions de lignes.
+
+Usage (depuis la racine du repo) :
+    python scripts/bench_csv_to_parquet.py [--rows 3000000] [--memory-budget-mb 256]
+
+Le CSV (gzip, colonnes et types DVF) est généré par lots, puis converti
+dans un processus neuf : le pic mesuré est celui de la conversion seule.
+Le script échoue si le pic mémoire Arrow dépasse le budget, ou si la mémoire
+résidente du processus grandit de plus que le budget.
+"""
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import multiprocessing as mp
+from pathlib import Path
+
+import numpy as np
+import psutil
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from scripts.dl_csvs import _stream_csv_to_parquet  # noqa: E402
+from scripts.dvf_schema import DVF_CSV_TYPES  # noqa: E402
+
+BATCH_ROWS = 250_000
+
+
+def _labels(prefix: str, values: np.ndarray) -> pa.Array:
+    return pc.binary_join_element_wise(prefix, pc.cast(pa.array(values), pa.string()), "")
+
+
+def synthetic_batch(start: int, n: int, rng: np.random.Generator) -> pa.RecordBatch:
+    """Lot au schéma DVF : identifiants uniques, libellés répétés, nulls."""
+    ids = np.arange(start, start + n)
+    columns = {}
+    for name, type_ in DVF_CSV_TYPES.items():
+        if name == "id_mutation":
+            values = _labels("2020-", ids // 2)
+        elif name == "date_mutation":
+            values = pa.array((18262 + rng.integers(0, 366, n)).astype("int32")).cast(pa.date32())
+        elif pa.types.is_string(type_):
+            values = _labels(f"{name[:6]}_", rng.integers(0, 500, n))
+            values = pc.if_else(pa.array(rng.random(n) < 0.3), pa.nulls(n, pa.string()), values)
+        elif pa.types.is_integer(type_):
+            values = pa.array(rng.integers(0, 10, n).astype("int32"))
+        else:
+            values = pa.array(rng.random(n) * 1e5)
+        columns[name] = values
+    return pa.RecordBatch.from_pydict(columns)
+
+
+def write_synthetic_csv(path: Path, rows: int):
+    rng = np.random.default_rng(0)
+    with pa.CompressedOutputStream(str(path), "gzip") as sink:
+        writer = None
+        for start in range(0, rows, BATCH_ROWS):
+            batch = synthetic_batch(start, min(BATCH_ROWS, rows - start), rng)
+            if writer is None:
+                writer = pv.CSVWriter(sink, batch.schema)
+            writer.write_batch(batch)
+        writer.close()
+
+
+def convert(csv_path: str, parquet_path: str, memory_budget_mb: int) -> tuple[int, int, float]:
+    """Conversion dans le processus courant : (lignes, pic Arrow, pic RSS au-dessus du départ, en octets)."""
+    process = psutil.Process()
+    rss_before = rss_peak = process.memory_info().rss
+    done = threading.Event()
+
+    def sample():
+        nonlocal rss_peak
+        while not done.is_set():
+            rss_peak = max(rss_peak, process.memory_info().rss)
+            time.sleep(0.02)
+
+    sampler = threading.Thread(target=sample)
+    sampler.start()
+    try:
+        n_rows, peak_bytes = _stream_csv_to_parquet(csv_path, parquet_path, memory_budget_mb, 500_000)
+    finally:
+        done.set()
+        sampler.join()
+    return n_rows, peak_bytes, rss_peak - rss_before
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=3_000_000)
+    parser.add_argument("--memory-budget-mb", type=int, default=256)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path, parquet_path = Path(tmp) / "full_synth.csv.gz", Path(tmp) / "full_synth.parquet"
+        write_synthetic_csv(csv_path, args.rows)
+        print(f"📦 CSV synthétique : {args.rows:,} lignes, {csv_path.stat().st_size / 1e6:.0f} Mo (gzip)"
+              .replace(",", " "))
+
+        with mp.get_context("spawn").Pool(1) as pool:
+            n_rows, peak_bytes, rss_growth = pool.apply(
+                convert, (str(csv_path), str(parquet_path), args.memory_budget_mb))
+
+        assert n_rows == args.rows == pq.ParquetFile(parquet_path).metadata.num_rows, "lignes perdues"
+        budget = args.memory_budget_mb * 1e6
+        print(f"📈 Pic Arrow {peak_bytes / 1e6:.0f} Mo | croissance RSS {rss_growth / 1e6:.0f} Mo "
+              f"| budget {args.memory_budget_mb} Mo")
+        assert peak_bytes <= budget, f"pic mémoire Arrow {peak_bytes / 1e6:.0f} Mo > budget"
+        assert rss_growth <= budget, f"croissance RSS {rss_growth / 1e6:.0f} Mo > budget"
+        print("✅ Conversion sous le budget mémoire")
@@ -0,0 +1,71 @@
+"""
+Parité et débit : pipeline sklearn vs forêt à plat.
+
+Usage (depuis la racine du repo) :
+    python scripts/bench_flat_forest.py [model/model.joblib] [n_lignes]
+"""
+import sys
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from train.train import predict_records  # noqa: E402
+from train.flat_forest import FlatPipeline  # noqa: E402
+
+DATA_PATH = PROJECT_ROOT / "data/prod/df_model_appart_2020.parquet.gz"
+BATCH_SIZES = [1, 32, 1_024, 10_000]
+
+
+def rows_per_second(fn, batch, min_seconds: float = 1.0) -> float:
+    n_calls, start = 0, time.perf_counter()
+    while True:
+        fn(batch)
+        n_calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return n_calls * len(batch) / elapsed
+
+
+def timed_load(loader, path):
+    start = time.perf_counter()
+    obj = loader(path)
+    return obj, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    model_path = sys.argv[1] if len(sys.argv) > 1 else "model/model.joblib"
+    n_rows = int(sys.argv[2]) if len(sys.argv) > 2 else 20_000
+    flat_path = str(Path(model_path).with_name(Path(model_path).stem + "_flat.joblib"))
+
+    pipeline, t_sk = timed_load(joblib.load, model_path)
+    FlatPipeline.from_pipeline(pipeline).save(flat_path)
+    flat, t_flat = timed_load(FlatPipeline.load, flat_path)
+    print(f"⏱️ Chargement : sklearn {t_sk:.2f} s | à plat {t_flat:.2f} s")
+
+    df = pd.read_parquet(DATA_PATH).sample(n_rows, random_state=42, replace=True)
+    df["has_dependance"] = df["has_dependance"].astype(int)
+    X = df.drop(columns=["prix_m2"]).reset_index(drop=True)
+    records = X.to_dict("records")
+
+    # Parité
+    expected = pipeline.predict(X)
+    for name, got in [("predict_records", predict_records(pipeline, records)),
+                      ("forêt à plat", flat.predict(X))]:
+        diff = float(np.abs(got - expected).max())
+        assert diff <= 1e-9, f"{name} : écart max {diff}"
+        print(f"✅ Parité {name} : écart max = {diff:.3g}")
+
+    # Débit
+    print(f"\n{'batch':>8} {'sklearn':>14} {'records':>14} {'à plat':>14}  (lignes/s)")
+    for size in BATCH_SIZES:
+        batch = records[:size]
+        r_sk = rows_per_second(lambda b: pipeline.predict(pd.DataFrame(b)), batch)
+        r_rec = rows_per_second(lambda b: predict_records(pipeline, b), batch)
+        r_flat = rows_per_second(flat.predict_records, batch)
+        print(f"{size:>8} {r_sk:>14,.0f} {r_rec:>14,.0f} {r_flat:>14,.0f}".replace(",", " "))
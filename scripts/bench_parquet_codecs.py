@@ -0,0 +1,77 @@
+"""
+Taille, temps d'écriture et temps de lecture par codec Parquet.
+
+Usage (depuis la racine du repo) :
+    python scripts/bench_parquet_codecs.py [fichier.parquet ...]
+
+Par défaut : les deux datasets de production (modèle et Streamlit).
+"""
+import io
+import sys
+import time
+import tempfile
+import contextlib
+from pathlib import Path
+
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from scripts.io_utils import save_parquet  # noqa: E402
+
+DEFAULT_FILES = [
+    PROJECT_ROOT / "data/prod/df_model_appart_2020.parquet.gz",
+    PROJECT_ROOT / "data/prod/df_streamlit_appart_2020.parquet.gz",
+]
+
+# (libellé, codec, niveau)
+CODECS = [
+    ("none", "none", None),
+    ("snappy", "snappy", None),
+    ("lz4", "lz4", None),
+    ("zstd-1", "zstd", 1),
+    ("zstd-3", "zstd", 3),
+    ("zstd-9", "zstd", 9),
+    ("gzip-6", "gzip", 6),
+    ("gzip-9", "gzip", 9),
+]
+REPEATS = 5
+
+
+def best_of(fn, repeats=REPEATS) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def bench_file(path: Path, tmp_dir: Path) -> pd.DataFrame:
+    df = pd.read_parquet(path)
+    rows = []
+    for label, codec, level in CODECS:
+        out = tmp_dir / f"{path.name.split('.')[0]}_{label}.parquet"
+
+        def write():
+            with contextlib.redirect_stdout(io.StringIO()):
+                save_parquet(df, out, compression=codec, compression_level=level)
+
+        t_write = best_of(write)
+        t_read = best_of(lambda: pd.read_parquet(out))
+        rows.append({
+            "codec": label,
+            "taille_mo": out.stat().st_size / 1e6,
+            "ecriture_ms": 1000 * t_write,
+            "lecture_ms": 1000 * t_read,
+        })
+    return pd.DataFrame(rows).round(1)
+
+
+if __name__ == "__main__":
+    files = [Path(p) for p in sys.argv[1:]] or DEFAULT_FILES
+    with tempfile.TemporaryDirectory() as tmp:
+        for path in files:
+            print(f"\n📦 {path.name} ({path.stat().st_size / 1e6:.1f} Mo sur disque)")
+            print(bench_file(path, Path(tmp)).to_string(index=False))
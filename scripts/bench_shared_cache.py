@@ -0,0 +1,131 @@
+"""
+Mémoire des sessions Streamlit simulées : cache partagé (streamlit/data_access.py,
+Arrow IPC memory-mappé) vs une copie du DataFrame par session.
+
+Usage (depuis la racine du repo) :
+    python scripts/bench_shared_cache.py [data/prod/df_streamlit_appart_2020.parquet.gz]
+
+Deux situations :
+- sessions d'un même processus (threads) : une copie par session, comme
+  st.cache_data qui renvoie un DataFrame dépicklé à chaque appel, vs le
+  DataFrame partagé du cache ;
+- processus distincts (plusieurs serveurs Streamlit) : pd.read_parquet dans
+  chaque processus vs les vues sur le même fichier memory-mappé.
+
+La mémoire mesurée est la mémoire privée (USS) : les pages du fichier mappé
+sont dans le page cache, partagé par tous les processus. Le script échoue si
+la mémoire des sessions partagées ne reste pas (quasi) constante.
+"""
+import os
+import sys
+import pickle
+import tempfile
+import threading
+import multiprocessing as mp
+from pathlib import Path
+
+import pandas as pd
+import psutil
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+DATA_PATH = PROJECT_ROOT / "data/prod/df_streamlit_appart_2020.parquet.gz"
+SESSIONS = [1, 2, 4, 8, 16]
+PROCESSES = [1, 2, 4, 8]
+
+
+def uss_mb() -> float:
+    return psutil.Process().memory_full_info().uss / 1e6
+
+
+def _import_data_access(cache_dir: str):
+    os.environ["STREAMLIT_ARROW_CACHE_DIR"] = cache_dir
+    sys.path.append(str(PROJECT_ROOT / "streamlit"))
+    import data_access
+    return data_access
+
+
+def thread_sessions(path: Path, cache_dir: str, n: int, shared: bool) -> float:
+    """Mémoire privée ajoutée par `n` sessions (threads) d'un processus."""
+    data_access = _import_data_access(cache_dir)
+    pickled = None if shared else pickle.dumps(pd.read_parquet(path))
+    frames, lock = [], threading.Lock()
+
+    def session():
+        df = data_access.read_parquet(path) if shared else pickle.loads(pickled)
+        with lock:
+            frames.append(df)
+
+    before = uss_mb()
+    threads = [threading.Thread(target=session) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return uss_mb() - before
+
+
+def _process_session(path, cache_dir, shared, results, ready, done):
+    data_access = _import_data_access(cache_dir)
+    before = uss_mb()
+    df = data_access.read_parquet(path) if shared else pd.read_parquet(path)
+    results.put(uss_mb() - before)
+    ready.wait()  # tous les processus vivants en même temps
+    done.wait()
+    del df
+
+
+def process_sessions(path: Path, cache_dir: str, n: int, shared: bool) -> float:
+    """Somme des mémoires privées ajoutées par `n` processus."""
+    ctx = mp.get_context("spawn")
+    results, ready, done = ctx.Queue(), ctx.Barrier(n + 1), ctx.Event()
+    procs = [ctx.Process(target=_process_session, args=(path, cache_dir, shared, results, ready, done))
+             for _ in range(n)]
+    for p in procs:
+        p.start()
+    deltas = [results.get() for _ in procs]
+    ready.wait()
+    done.set()
+    for p in procs:
+        p.join()
+    return sum(deltas)
+
+
+def isolated(fn, *args) -> float:
+    """Mesure dans un processus neuf (pas de mémoire libérée par une mesure précédente)."""
+    with mp.get_context("spawn").Pool(1) as pool:
+        return pool.apply(fn, args)
+
+
+def table(rows: list, label: str) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=[label, "copie_mo", "partage_mo"]).round(1)
+
+
+if __name__ == "__main__":
+    path = Path(sys.argv[1]) if len(sys.argv) > 1 else DATA_PATH
+    size = pd.read_parquet(path).memory_usage(deep=True).sum() / 1e6
+    print(f"📦 {path.name} : {size:.1f} Mo en mémoire (pandas)")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # Fichier Arrow construit une fois, comme au premier affichage d'une page
+        _import_data_access(cache_dir).read_parquet(path)
+
+        rows = [(n, isolated(thread_sessions, path, cache_dir, n, False),
+                 isolated(thread_sessions, path, cache_dir, n, True)) for n in SESSIONS]
+        threads = table(rows, "sessions")
+        print("\n🧵 Sessions d'un processus (mémoire privée ajoutée)")
+        print(threads.to_string(index=False))
+
+        rows = [(n, process_sessions(path, cache_dir, n, shared=False),
+                 process_sessions(path, cache_dir, n, shared=True)) for n in PROCESSES]
+        procs = table(rows, "processus")
+        print("\n🖥️ Processus distincts (somme des mémoires privées)")
+        print(procs.to_string(index=False))
+
+    # Sessions : une seule copie quel que soit leur nombre ; processus : la
+    # part privée par processus reste une petite fraction du dataset
+    growth = threads["partage_mo"].iloc[-1] - threads["partage_mo"].iloc[0]
+    per_process = procs["partage_mo"].iloc[-1] / PROCESSES[-1]
+    assert growth < 0.05 * size, f"mémoire des sessions partagées non constante (+{growth:.1f} Mo)"
+    assert per_process < 0.35 * size, f"mémoire privée par processus trop élevée ({per_process:.1f} Mo)"
+    print(f"\n✅ +{growth:.1f} Mo de {SESSIONS[0]} à {SESSIONS[-1]} sessions ; "
+          f"{per_process:.1f} Mo privés par processus (dataset : {size:.1f} Mo)")
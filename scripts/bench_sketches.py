@@ -0,0 +1,65 @@
+"""
+Précision et mémoire des sketches (scripts/sketches.py) face aux calculs
+exacts, pour plusieurs réglages.
+
+Usage (depuis la racine du repo) :
+    python scripts/bench_sketches.py [data/prod/df_streamlit_appart_2020.parquet.gz]
+
+Les sketches sont construits par département puis fusionnés. Le script échoue si une erreur dépasse la borne
+annoncée (rang : 2/k ; distincts : 3 écarts-types HyperLogLog).
+"""
+import sys
+import pickle
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+
+from scripts.sketches import DistinctCounter, QuantileSketch  # noqa: E402
+
+DATA_PATH = PROJECT_ROOT / "data/prod/df_streamlit_appart_2020.parquet.gz"
+QUANTILES = [0.01, 0.25, 0.5, 0.75, 0.99]
+K_VALUES = [200, 500, 2000]
+P_VALUES = [10, 12, 14]
+
+
+def merged(groups, make):
+    """Un sketch par département, fusionnés dans le premier."""
+    sketches = [make().update(values) for values in groups]
+    for sketch in sketches[1:]:
+        sketches[0].merge(sketch)
+    return sketches[0]
+
+
+if __name__ == "__main__":
+    df = pd.read_parquet(sys.argv[1] if len(sys.argv) > 1 else DATA_PATH,
+                         columns=["prix_m2", "code_departement", "nom_commune"])
+    groups = [g for _, g in df.groupby("code_departement", observed=True)]
+    prix = np.sort(df["prix_m2"].dropna().to_numpy(dtype=np.float64))
+    print(f"📦 {len(df):,} lignes | {len(groups)} départements".replace(",", " "))
+
+    print(f"\n{'quantiles':<12} {'erreur rang max':>16} {'borne':>8} {'Ko':>8} {'s':>6}")
+    for k in K_VALUES:
+        start = time.perf_counter()
+        sketch = merged([g["prix_m2"] for g in groups], lambda: QuantileSketch(k, seed=0))
+        seconds = time.perf_counter() - start
+        ranks = np.searchsorted(prix, sketch.quantile(QUANTILES), side="right") / len(prix)
+        error = np.abs(ranks - QUANTILES).max()
+        print(f"{'k=' + str(k):<12} {100 * error:>15.3f}% {200 / k:>7.2f}% "
+              f"{len(pickle.dumps(sketch)) / 1e3:>8.1f} {seconds:>6.2f}")
+        assert error <= 2 / k, f"erreur de rang {error:.4f} > 2/k pour k={k}"
+
+    exact = df["nom_commune"].nunique()
+    print(f"\n{'distincts':<12} {'estimation':>12} {'exact':>8} {'erreur':>8} {'Ko':>8}")
+    for p in P_VALUES:
+        estimate = merged([g["nom_commune"] for g in groups], lambda: DistinctCounter(p)).count()
+        error = abs(estimate / exact - 1)
+        print(f"{'p=' + str(p):<12} {estimate:>12,} {exact:>8,} {100 * error:>7.2f}% "
+              f"{2 ** p / 1e3:>8.1f}".replace(",", " "))
+        assert error <= 3 * 1.04 / np.sqrt(2 ** p), f"erreur {error:.4f} hors borne pour p={p}"
+
+    print("\n✅ Erreurs dans les bornes annoncées")
@@ -0,0 +1,233 @@
+import os
+import sys
+import time
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from scripts.clean_appartements import NATURE_VENTE, clean_appartements  # noqa: E402
+from scripts.dl_csvs import partition_year  # noqa: E402
+from scripts.io_utils import read_dvf_dataset, save_parquet_gzip  # noqa: E402
+
+# Colonnes lues par département : celles des règles de nettoyage et celles
+# des datasets finaux (projection poussée jusqu'au Parquet)
+SOURCE_COLUMNS = [
+    "id_mutation", "date_mutation", "nature_mutation", "valeur_fonciere",
+    "code_postal", "code_commune", "nom_commune", "code_departement", "type_local",
+    "surface_reelle_bati", "nombre_pieces_principales", "surface_terrain",
+    "longitude", "latitude",
+]
+
+# Sélection finale du notebook 06, plus le code INSEE de la commune
+# (nom_commune seul confond les communes homonymes)
+MODEL_FEATURES = [
+    "surface_reelle_bati",
+    "nombre_pieces_principales",
+    "latitude",
+    "longitude",
+    "has_dependance",
+    "nom_commune",
+    "code_commune",
+]
+TARGET = "prix_m2"
+
+STREAMLIT_COLS = [
+    "prix_m2",
+    "valeur_fonciere",
+    "surface_reelle_bati",
+    "nombre_pieces_principales",
+    "has_dependance",
+    "latitude",
+    "longitude",
+    "code_departement",
+    "nom_commune",
+    "code_commune",
+    "code_postal",
+    "date_mutation",
+]
+
+# Types des datasets de production (ceux des fichiers data/prod existants)
+FLOAT32_COLUMNS = ["valeur_fonciere", "surface_reelle_bati", "nombre_pieces_principales",
+                   "surface_terrain", "latitude", "longitude"]
+PROD_DTYPES = {
+    "prix_m2": "float32", "valeur_fonciere": "float32", "surface_reelle_bati": "float32",
+    "nombre_pieces_principales": "float32", "latitude": "float32", "longitude": "float32",
+    "has_dependance": "bool", "code_departement": "str", "nom_commune": "str",
+    "code_commune": "str", "code_postal": "str", "date_mutation": "datetime64[ns]",
+}
+
+PRIX_QUANTILES = (0.01, 0.99)
+BBOX_METROPOLE = {"lon_min": -5.0, "lon_max": 10.0, "lat_min": 41.0, "lat_max": 51.0}
+
+# Rapport entre la taille décompressée des colonnes Parquet et l'empreinte
+# pandas d'un département pendant le nettoyage (copies intermédiaires)
+PANDAS_OVERHEAD = 3
+
+
+def process_departement(dataset_dir: str, year: int, departement: str):
+    """
+    Nettoie un département : règles du notebook 05 puis calcul de prix_m2.
+
+    La coupe 1 %-99 % sur prix_m2 dépend de toute l'année et les filtres
+    géographiques du notebook 06 viennent après elle : les deux sont
+    appliqués par `finalize_prod_datasets`, après concaténation.
+
+    Returns
+    -------
+    tuple[str, pd.DataFrame]
+        Département et appartements retenus (colonnes STREAMLIT_COLS)
+    """
+    df = read_dvf_dataset(
+        dataset_dir,
+        years=[year],
+        departements=[departement],
+        columns=SOURCE_COLUMNS,
+        filters=[("nature_mutation", "==", NATURE_VENTE)],
+    )
+    df[FLOAT32_COLUMNS] = df[FLOAT32_COLUMNS].astype("float32")
+
+    apparts = clean_appartements(df, verbose=False)
+    apparts["prix_m2"] = apparts["valeur_fonciere"] / apparts["surface_reelle_bati"]
+    return departement, apparts[STREAMLIT_COLS].reset_index(drop=True)
+
+
+def list_departements(dataset_dir: str, year: int) -> dict:
+    """
+    Départements d'une année et estimation de leur empreinte mémoire.
+
+    L'estimation lit uniquement les métadonnées Parquet (taille décompressée
+    des colonnes utiles), sans charger de données.
+    """
+    year_dir = Path(dataset_dir) / f"annee={year}"
+    estimates = {}
+    for part_dir in sorted(p for p in year_dir.iterdir() if p.is_dir() and "=" in p.name):
+        nbytes = 0
+        for path in part_dir.glob("*.parquet"):
+            metadata = pq.ParquetFile(path).metadata
+            for i in range(metadata.num_row_groups):
+                row_group = metadata.row_group(i)
+                for j in range(row_group.num_columns):
+                    column = row_group.column(j)
+                    if column.path_in_schema in SOURCE_COLUMNS:
+                        nbytes += column.total_uncompressed_size
+        estimates[part_dir.name.split("=", 1)[1]] = nbytes * PANDAS_OVERHEAD
+    return estimates
+
+
+def run_departements(dataset_dir: str, year: int, workers: int, memory_budget_mb: int, departements=None):
+    """
+    Traite les départements dans un pool de processus en bornant la mémoire :
+    un département n'est lancé que si la somme des empreintes estimées des
+    départements en cours reste sous `memory_budget_mb` (au moins un
+    département tourne toujours, même s'il dépasse seul le budget).
+
+    Returns
+    -------
+    dict[str, pd.DataFrame]
+        Appartements retenus par département (tous, ou `departements`)
+    """
+    estimates = list_departements(dataset_dir, year)
+    if departements is not None:
+        estimates = {dep: estimates[dep] for dep in departements}
+    budget = memory_budget_mb * 1e6
+    # Les plus gros d'abord : meilleur remplissage du pool
+    queue = sorted(estimates, key=estimates.get, reverse=True)
+    results, running, in_flight = {}, {}, 0.0
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while queue or running:
+            while queue and len(running) < workers and (not running or in_flight + estimates[queue[0]] <= budget):
+                dep = queue.pop(0)
+                running[pool.submit(process_departement, str(dataset_dir), year, dep)] = dep
+                in_flight += estimates[dep]
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                dep = running.pop(future)
+                in_flight -= estimates[dep]
+                results[dep] = future.result()[1]
+    return results
+
+
+def finalize_prod_datasets(parts: dict, year: int, prod_dir="data/prod"):
+    """
+    Assemble les départements nettoyés et écrit les datasets de production :
+    coupe 1 %-99 % sur les quantiles de l'année entière, puis filtres
+    géographiques (France métropolitaine), comme dans le notebook 06.
+
+    Parameters
+    ----------
+    parts : dict[str, pd.DataFrame]
+        Sorties de `process_departement`, par département
+    year : int
+        Année, pour le nom des fichiers
+    prod_dir : str, default="data/prod"
+        Dossier des datasets finaux
+    """
+    df = pd.concat([parts[dep] for dep in sorted(parts)], ignore_index=True)
+    q_low, q_high = df["prix_m2"].quantile(PRIX_QUANTILES[0]), df["prix_m2"].quantile(PRIX_QUANTILES[1])
+    df = df[(df["prix_m2"] >= q_low) & (df["prix_m2"] <= q_high)]
+    df = df.dropna(subset=["latitude", "longitude"])
+    df = df[
+        (df["longitude"] >= BBOX_METROPOLE["lon_min"]) &
+        (df["longitude"] <= BBOX_METROPOLE["lon_max"]) &
+        (df["latitude"] >= BBOX_METROPOLE["lat_min"]) &
+        (df["latitude"] <= BBOX_METROPOLE["lat_max"])
+    ]
+    df = df.astype(PROD_DTYPES).reset_index(drop=True)
+    print(f"   → {len(df):,} appartements | prix_m2 entre {q_low:.2f} et {q_high:.2f}".replace(",", " "))
+
+    outputs = [Path(prod_dir) / f"df_model_appart_{year}.parquet.gz",
+               Path(prod_dir) / f"df_streamlit_appart_{year}.parquet.gz"]
+    save_parquet_gzip(df[MODEL_FEATURES + [TARGET]], outputs[0])
+    save_parquet_gzip(df[STREAMLIT_COLS], outputs[1])
+    return outputs
+
+
+def build_prod_datasets(year: int, dataset_dir="data/parquet/dvf", parquet_dir="data/parquet",
+                        prod_dir="data/prod", workers=None, memory_budget_mb=1024):
+    """
+    Construit df_model_appart_YYYY et df_streamlit_appart_YYYY hors mémoire,
+    département par département.
+
+    Parameters
+    ----------
+    year : int
+        Année à traiter
+    dataset_dir : str, default="data/parquet/dvf"
+        Dataset partitionné ; l'année est partitionnée depuis
+        `parquet_dir/full_YYYY.parquet` si elle n'y figure pas encore
+    prod_dir : str, default="data/prod"
+        Dossier des datasets finaux
+    workers : int, optional
+        Nombre de processus (nombre de CPU par défaut)
+    memory_budget_mb : int, default=1024
+        Mémoire totale visée pour les départements traités simultanément
+    """
+    start = time.perf_counter()
+    if not (Path(dataset_dir) / f"annee={year}").exists():
+        partition_year(Path(parquet_dir) / f"full_{year}.parquet", dataset_dir, year)
+
+    print(f"🧹 Nettoyage {year} par département ({workers or os.cpu_count()} processus, "
+          f"budget {memory_budget_mb} Mo)")
+    parts = run_departements(dataset_dir, year, workers or os.cpu_count(), memory_budget_mb)
+    finalize_prod_datasets(parts, year, prod_dir)
+    print(f"✅ Datasets {year} construits en {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construction hors mémoire des datasets de production.")
+    parser.add_argument("--years", nargs="+", type=int, default=[2020])
+    parser.add_argument("--dataset-dir", default="./data/parquet/dvf")
+    parser.add_argument("--parquet-dir", default="./data/parquet")
+    parser.add_argument("--prod-dir", default="./data/prod")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--memory-budget-mb", type=int, default=1024)
+    args = parser.parse_args()
+
+    for year in args.years:
+        build_prod_datasets(year, args.dataset_dir, args.parquet_dir, args.prod_dir,
+                            args.workers, args.memory_budget_mb)
@@ -0,0 +1,115 @@
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from scripts.io_utils import save_parquet_gzip  # noqa: E402
+
+# Règles métier du notebook 05 : une mutation retenue est une vente contenant
+# exactement un appartement et, hormis des dépendances, aucun autre type de
+# local renseigné (les lignes sans type_local sont tolérées).
+NATURE_VENTE = "Vente"
+TYPE_APPARTEMENT = "Appartement"
+TYPE_DEPENDANCE = "Dépendance"
+
+
+def _flag(series: pd.Series, value: str) -> np.ndarray:
+    return series.eq(value).fillna(False).to_numpy(dtype=bool)
+
+
+def clean_appartements(df: pd.DataFrame, verbose: bool = True) -> pd.DataFrame:
+    """
+    Applique les règles "1 mutation = 1 appartement" du notebook 05.
+
+    Implémentation vectorisée : les identifiants de mutation sont factorisés
+    en entiers, les règles sont évaluées par comptage (`np.bincount`) puis
+    rediffusées ligne à ligne, sans aucun callback Python par mutation.
+    Le résultat est identique à celui du notebook (mêmes lignes, même ordre,
+    mêmes colonnes, dont `surface_terrain_x` / `surface_terrain_y`).
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Mutations DVF d'une année (ex. optimized_2020.parquet)
+    verbose : bool, default=True
+        Affiche le nombre de lignes / mutations retenues
+
+    Returns
+    -------
+    pd.DataFrame
+        Une ligne par mutation retenue (la ligne de l'appartement),
+        enrichie de has_dependance, has_nan_type_local,
+        surface_terrain_y (somme sur la mutation) et nb_lignes_mutation
+    """
+    start = time.perf_counter()
+    ventes = df.loc[_flag(df["nature_mutation"], NATURE_VENTE)].copy()
+    type_local = ventes["type_local"]
+    is_app = _flag(type_local, TYPE_APPARTEMENT)
+    ventes["is_appartement"] = is_app
+
+    # Identifiant de mutation -> entier dense (les id manquants sont écartés,
+    # comme le fait groupby)
+    codes, uniques = pd.factorize(ventes["id_mutation"])
+    has_id = codes >= 0
+    if not has_id.all():
+        ventes, codes, is_app, type_local = ventes[has_id], codes[has_id], is_app[has_id], type_local[has_id]
+    n_mut = len(uniques)
+
+    is_dep = _flag(type_local, TYPE_DEPENDANCE)
+    is_nan = type_local.isna().to_numpy()
+    is_other = ~(is_app | is_dep | is_nan)
+
+    n_app = np.bincount(codes, weights=is_app, minlength=n_mut)
+    n_other = np.bincount(codes, weights=is_other, minlength=n_mut)
+    valid = (n_app == 1) & (n_other == 0)
+
+    keep = valid[codes]
+    mutations = ventes[keep]
+    mut_codes = codes[keep]
+
+    # Agrégats par mutation, sommés sur toutes les lignes de la mutation
+    has_dependance = np.bincount(mut_codes, weights=is_dep[keep], minlength=n_mut) > 0
+    has_nan_type_local = np.bincount(mut_codes, weights=is_nan[keep], minlength=n_mut) > 0
+    nb_lignes = np.bincount(mut_codes, minlength=n_mut).astype("int64")
+    # Somme pandas (même algorithme et même type que l'agg du notebook)
+    surface_terrain = mutations["surface_terrain"].groupby(mut_codes, sort=False).sum()
+
+    app_rows = is_app[keep]
+    out = mutations[app_rows].reset_index(drop=True)
+    out_codes = mut_codes[app_rows]
+    out = out.rename(columns={"surface_terrain": "surface_terrain_x"})
+    out["has_dependance"] = has_dependance[out_codes]
+    out["has_nan_type_local"] = has_nan_type_local[out_codes]
+    out["surface_terrain_y"] = surface_terrain.reindex(out_codes).to_numpy()
+    out["nb_lignes_mutation"] = nb_lignes[out_codes]
+
+    if verbose:
+        print(
+            f"🧹 Appartements : {len(out):,} mutations retenues sur {n_mut:,} ventes "
+            f"({time.perf_counter() - start:.1f} s)".replace(",", " ")
+        )
+    return out
+
+
+def default_input(year: int, parquet_dir: str = "data/parquet") -> Path:
+    """optimized_YYYY.parquet si disponible, sinon full_YYYY.parquet."""
+    optimized = Path(parquet_dir) / f"optimized_{year}.parquet"
+    return optimized if optimized.exists() else Path(parquet_dir) / f"full_{year}.parquet"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Nettoyage 'une mutation = un appartement' des ventes DVF.")
+    parser.add_argument("--year", type=int, default=2020)
+    parser.add_argument("--input", help="Parquet d'entrée (défaut : data/parquet/optimized_YYYY.parquet)")
+    parser.add_argument("--output", help="Défaut : data/processed/dvf_appartements_vente_YYYY.parquet.gz")
+    args = parser.parse_args()
+
+    input_path = args.input or default_input(args.year)
+    output_path = args.output or f"data/processed/dvf_appartements_vente_{args.year}.parquet.gz"
+
+    df = pd.read_parquet(input_path, filters=[("nature_mutation", "==", NATURE_VENTE)])
+    save_parquet_gzip(clean_appartements(df), output_path)
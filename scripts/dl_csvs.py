@@ -1,54 +1,438 @@
 import os
+import sys
+import time
+import hashlib
+import argparse
 import requests
-import pandas as pd
+import shutil
+import pyarrow as pa
+import pyarrow.csv as pv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 from pathlib import Path
 
-def download_file(url, dest_folder, filename):
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from scripts.dvf_schema import DVF_CSV_TYPES, DVF_PARTITION_SCHEMA, DVF_SORT_KEYS, SOURCE_SHA256_KEY  # noqa: E402
+from scripts.io_utils import load_manifest, sha256_file, update_manifest  # noqa: E402
+from scripts.optimize_dtypes import optimize_parquet  # noqa: E402
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed  # noqa: E402
+
+DVF_BASE_URL = "https://files.data.gouv.fr/geo-dvf/latest/csv"
+DVF_YEARS = [2020, 2021, 2022, 2023, 2024]
+
+def build_urls(years=DVF_YEARS, base_url=DVF_BASE_URL):
+    return {f"{base_url.rstrip('/')}/{year}/full.csv.gz": f"full_{year}.csv.gz" for year in years}
+
+def year_of(filename):
+    return Path(filename).name.split(".")[0].removeprefix("full_")
+
+def raw_sha256(raw_path):
+    """SHA-256 d'un fichier brut, repris du manifeste de téléchargement s'il est à jour."""
+    raw_path = Path(raw_path)
+    entry = load_manifest(str(raw_path.parent / "manifest.json")).get(raw_path.name, {})
+    if entry.get("complete") and entry.get("sha256") and entry.get("size") == raw_path.stat().st_size:
+        return entry["sha256"]
+    return sha256_file(raw_path).hexdigest()
+
+def source_sha256(parquet_path):
+    """SHA-256 du CSV dont un Parquet annuel est issu (None : absent ou sans empreinte)."""
+    if not os.path.exists(parquet_path):
+        return None
+    value = (pq.read_schema(parquet_path).metadata or {}).get(SOURCE_SHA256_KEY)
+    return value.decode() if value else None
+
+def download_file(url, dest_folder, filename, chunk_size=1 << 20, manifest_name="manifest.json"):
+    """
+    Télécharge un fichier de façon reprenable et vérifiable.
+
+    - le transfert se fait dans `<fichier>.part`, renommé atomiquement à la fin ;
+    - un `.part` existant est repris avec un en-tête HTTP Range (If-Range
+      garantit que le fichier distant n'a pas changé entre-temps) ;
+    - un fichier déjà téléchargé est revalidé par requête conditionnelle
+      (ETag / Last-Modified) : seul un fichier modifié côté serveur
+      (ex. mise à jour de `latest/`) est re-téléchargé ;
+    - taille, SHA-256 et validateurs HTTP sont consignés dans un manifeste
+      local (`manifest.json` du dossier de destination).
+
+    Parameters
+    ----------
+    url : str
+        URL du fichier
+    dest_folder : str
+        Dossier de destination
+    filename : str
+        Nom du fichier local
+    chunk_size : int, default=1 Mo
+        Taille des blocs lus sur le réseau et écrits sur disque
+    """
     os.makedirs(dest_folder, exist_ok=True)
     local_path = os.path.join(dest_folder, filename)
-    if os.path.exists(local_path):
-        print(f"✅ File already exists: {local_path}")
-        return local_path
-    with requests.get(url, stream=True) as r:
+    part_path = local_path + ".part"
+    manifest_path = os.path.join(dest_folder, manifest_name)
+    entry = load_manifest(manifest_path).get(filename, {})
+
+    headers = {}
+    complete = os.path.exists(local_path) and entry.get("complete")
+    if complete:
+        # Revalidation du fichier complet
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    elif os.path.exists(part_path) and not entry.get("complete"):
+        offset = os.path.getsize(part_path)
+        validator = entry.get("etag") or entry.get("last_modified")
+        if offset and validator:
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = validator
+    elif os.path.exists(local_path):
+        # Fichier antérieur au manifeste : on le garde s'il a la taille distante
+        try:
+            head = requests.head(url, allow_redirects=True, timeout=30)
+            head.raise_for_status()
+            if int(head.headers.get("Content-Length", -1)) == os.path.getsize(local_path):
+                update_manifest(manifest_path, filename, {
+                    "url": url, "complete": True, "size": os.path.getsize(local_path),
+                    "sha256": sha256_file(local_path).hexdigest(),
+                    "etag": head.headers.get("ETag"), "last_modified": head.headers.get("Last-Modified"),
+                })
+                print(f"✅ File already exists: {local_path}")
+                return local_path
+        except requests.RequestException as e:
+            print(f"⚠️ Serveur injoignable, fichier local conservé : {local_path} ({e})")
+            return local_path
+
+    try:
+        r = requests.get(url, stream=True, headers=headers, timeout=60)
+    except requests.RequestException as e:
+        if complete:
+            print(f"⚠️ Serveur injoignable, fichier local conservé : {local_path} ({e})")
+            return local_path
+        raise
+
+    with r:
+        if r.status_code == 304:
+            print(f"✅ File already exists (inchangé côté serveur) : {local_path}")
+            return local_path
+        if r.status_code == 416:
+            # Range invalide (.part incohérent) : on repart de zéro
+            os.remove(part_path)
+            return download_file(url, dest_folder, filename, chunk_size, manifest_name)
         r.raise_for_status()
-        with open(local_path, 'wb') as f:
-            for chunk in r.iter_content(chunk_size=8192):
+
+        resumed = r.status_code == 206
+        etag, last_modified = r.headers.get("ETag"), r.headers.get("Last-Modified")
+        if resumed:
+            digest = sha256_file(part_path)
+            offset = os.path.getsize(part_path)
+            print(f"⏯️ Reprise du téléchargement à {offset / 1e6:.1f} Mo : {local_path}")
+        else:
+            digest, offset = hashlib.sha256(), 0
+        expected = int(r.headers["Content-Length"]) + offset if "Content-Length" in r.headers else None
+
+        # Validateurs enregistrés avant le transfert pour pouvoir reprendre un .part
+        update_manifest(manifest_path, filename, {
+            "url": url, "complete": False, "etag": etag, "last_modified": last_modified,
+        })
+        with open(part_path, "ab" if resumed else "wb") as f:
+            # Octets bruts (sans décodage Content-Encoding) pour que taille et
+            # hash correspondent au fichier servi
+            for chunk in r.raw.stream(chunk_size, decode_content=False):
                 f.write(chunk)
+                digest.update(chunk)
+
+    size = os.path.getsize(part_path)
+    if expected is not None and size != expected:
+        raise IOError(f"Téléchargement incomplet pour {url} : {size} octets sur {expected}")
+
+    os.replace(part_path, local_path)
+    update_manifest(manifest_path, filename, {
+        "url": url, "complete": True, "size": size, "sha256": digest.hexdigest(),
+        "etag": etag, "last_modified": last_modified,
+        "downloaded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    })
     print(f"⬇️ Downloaded: {local_path}")
     return local_path
 
-def convert_to_parquet(input_path, output_folder):
+def convert_to_parquet(input_path, output_folder, memory_budget_mb=256, row_group_size=500_000):
+    """
+    Convertit un CSV DVF (éventuellement gzip) en Parquet, en streaming.
+
+    Le CSV est lu par blocs avec le lecteur CSV de pyarrow et chaque bloc est
+    écrit aussitôt dans un ParquetWriter : la mémoire utilisée dépend de la
+    taille de bloc, pas de la taille du fichier.
+
+    Parameters
+    ----------
+    input_path : str
+        Chemin du fichier .csv ou .csv.gz
+    output_folder : str
+        Dossier de sortie du .parquet
+    memory_budget_mb : int, default=256
+        Plafond mémoire visé ; la taille de bloc CSV en est déduite
+    row_group_size : int, default=500_000
+        Nombre maximal de lignes par row group Parquet
+    """
     os.makedirs(output_folder, exist_ok=True)
-    parquet_name = Path(input_path).stem + ".parquet"
+    parquet_name = Path(input_path).name.split(".")[0] + ".parquet"
     output_path = os.path.join(output_folder, parquet_name)
 
-    if os.path.exists(output_path):
+    # Ancien nom (full_YYYY.csv.parquet) : renommé plutôt que reconverti
+    legacy_path = os.path.join(output_folder, Path(input_path).name.split(".")[0] + ".csv.parquet")
+    if os.path.exists(legacy_path) and not os.path.exists(output_path):
+        os.replace(legacy_path, output_path)
+
+    # Reconversion si le CSV a changé (ex. mise à jour de latest/) : même
+    # empreinte que le manifeste de téléchargement et rebuild.py
+    sha256 = raw_sha256(input_path)
+    existing = source_sha256(output_path)
+    if existing == sha256:
         print(f"⚠️ Parquet already exists: {output_path} — skipping conversion.")
-        return
+        return output_path
+    if os.path.exists(output_path):
+        print(f"🔄 Source modifiée depuis la conversion (ou empreinte absente) : {output_path}")
 
-    try:
-        print(f"🧩 Converting: {input_path}")
-        df = pd.read_csv(input_path, sep=',', low_memory=False)
-        df.to_parquet(output_path, index=False)
-        print(f"✅ Converted to: {output_path}")
-    except Exception as e:
-        print(f"❌ Failed to convert {input_path}: {e}")
+    # Les erreurs remontent à l'appelant, qui les rapporte par année
+    print(f"🧩 Converting: {input_path}")
+    _stream_csv_to_parquet(input_path, output_path, memory_budget_mb, row_group_size, sha256)
+    print(f"✅ Converted to: {output_path}")
+    return output_path
 
-if __name__ == "__main__":
-    urls = {
-        "https://files.data.gouv.fr/geo-dvf/latest/csv/2020/full.csv.gz": "full_2020.csv.gz",
-        "https://files.data.gouv.fr/geo-dvf/latest/csv/2021/full.csv.gz": "full_2021.csv.gz",
-        "https://files.data.gouv.fr/geo-dvf/latest/csv/2022/full.csv.gz": "full_2022.csv.gz",
-        "https://files.data.gouv.fr/geo-dvf/latest/csv/2023/full.csv.gz": "full_2023.csv.gz",
-        "https://files.data.gouv.fr/geo-dvf/latest/csv/2024/full.csv.gz": "full_2024.csv.gz"
-    }
+def _stream_csv_to_parquet(input_path, output_path, memory_budget_mb, row_group_size, sha256=None):
+    """Conversion en streaming ; renvoie (lignes écrites, pic mémoire Arrow en octets)."""
+    # Le lecteur CSV lit et décode plusieurs blocs en avance : mesuré sur un
+    # DVF, le pool Arrow culmine vers ~40 fois la taille de bloc. Un bloc de
+    # budget / 128 laisse de la marge pour les tampons du ParquetWriter.
+    block_size = max(1 << 18, memory_budget_mb * (1 << 20) // 128)
+    read_options = pv.ReadOptions(block_size=block_size)
+    convert_options = pv.ConvertOptions(
+        column_types=DVF_CSV_TYPES,
+        strings_can_be_null=True,
+        quoted_strings_can_be_null=True,
+    )
+
+    total_bytes = os.path.getsize(input_path)
+    compression = "gzip" if str(input_path).endswith(".gz") else None
+    tmp_path = output_path + ".tmp"
+    n_rows, start, last_report = 0, time.perf_counter(), 0.0
+    peak_bytes = 0
+
+    with pa.OSFile(str(input_path), "rb") as raw:
+        stream = pa.CompressedInputStream(raw, compression) if compression else raw
+        reader = pv.open_csv(stream, read_options=read_options, convert_options=convert_options)
+        missing = [c for c in DVF_CSV_TYPES if c not in reader.schema.names]
+        if missing:
+            raise ValueError(f"Colonnes DVF absentes de {input_path} : {', '.join(missing)}")
+        try:
+            schema = reader.schema
+            if sha256:
+                schema = schema.with_metadata({**(schema.metadata or {}), SOURCE_SHA256_KEY: sha256})
+            with pq.ParquetWriter(tmp_path, schema, compression="snappy") as writer:
+                for batch in reader:
+                    writer.write_batch(batch, row_group_size=row_group_size)
+                    n_rows += batch.num_rows
+                    peak_bytes = max(peak_bytes, pa.total_allocated_bytes())
+
+                    elapsed = time.perf_counter() - start
+                    if elapsed - last_report >= 5:
+                        last_report = elapsed
+                        read_mb = raw.tell() / 1e6
+                        print(
+                            f"   … {n_rows:,} lignes | {read_mb:,.0f}/{total_bytes / 1e6:,.0f} Mo lus "
+                            f"({100 * raw.tell() / total_bytes:.0f}%) | {read_mb / elapsed:.1f} Mo/s | "
+                            f"{n_rows / elapsed:,.0f} lignes/s".replace(",", " ")
+                        )
+        except BaseException:
+            # Pas de Parquet partiel laissé sur disque
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    os.replace(tmp_path, output_path)
+    elapsed = time.perf_counter() - start
+    print(f"   → {n_rows:,} lignes en {elapsed:.1f} s ({n_rows / elapsed:,.0f} lignes/s)".replace(",", " "))
+    print(f"   → pic mémoire Arrow : {peak_bytes / 1e6:.0f} Mo (budget {memory_budget_mb} Mo)")
+    return n_rows, peak_bytes
+
+def partition_year(parquet_path, dataset_dir, year, row_group_size=50_000):
+    """
+    Réécrit un Parquet annuel en dataset partitionné hive
+    `annee=YYYY/code_departement=XX/part-0.parquet`.
+
+    Deux passes à mémoire bornée : les lots du Parquet annuel sont d'abord
+    répartis par département (streaming), puis chaque département (qui tient
+    en mémoire) est trié par commune et mutation et réécrit en un seul
+    fichier avec des row groups de `row_group_size` lignes. La partition de
+    l'année est remplacée d'un bloc à la fin.
+
+    Parameters
+    ----------
+    parquet_path : str
+        Parquet annuel produit par `convert_to_parquet`
+    dataset_dir : str
+        Racine du dataset partitionné (ex. data/parquet/dvf)
+    year : int
+        Année, écrite dans la clé de partition `annee`
+    row_group_size : int, default=50_000
+        Nombre maximal de lignes par row group
+    """
+    year = int(year)
+    dataset_dir = Path(dataset_dir)
+    final_dir = dataset_dir / f"annee={year}"
+    staging_dir = dataset_dir / f"_staging_annee={year}"
+    building_dir = dataset_dir / f"_building_annee={year}"
+    for d in (staging_dir, building_dir):
+        shutil.rmtree(d, ignore_errors=True)
+
+    print(f"🗂️ Partitionnement par département : {parquet_path}")
+    start = time.perf_counter()
+
+    # Passe 1 : répartition par département, en streaming
+    source = ds.dataset(parquet_path, format="parquet")
+    ds.write_dataset(
+        source.to_batches(batch_size=row_group_size),
+        staging_dir,
+        schema=source.schema,
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([DVF_PARTITION_SCHEMA.field("code_departement")]), flavor="hive"),
+        # Ordre des lignes stable : des partitions identiques octet pour octet
+        # d'une exécution à l'autre (empreintes de l'incrémental)
+        preserve_order=True,
+    )
+
+    # Passe 2 : tri et compaction de chaque département
+    n_parts = 0
+    for part_dir in sorted(p for p in staging_dir.iterdir() if p.is_dir()):
+        table = ds.dataset(part_dir, format="parquet").to_table().sort_by(DVF_SORT_KEYS)
+        out_dir = building_dir / part_dir.name
+        out_dir.mkdir(parents=True)
+        pq.write_table(table, out_dir / "part-0.parquet", row_group_size=row_group_size, compression="snappy")
+        n_parts += 1
+    shutil.rmtree(staging_dir)
+
+    # Remplacement de l'année complète
+    if final_dir.exists():
+        shutil.rmtree(final_dir)
+    os.replace(building_dir, final_dir)
+    print(f"✅ Partitions écrites : {final_dir} ({n_parts} départements, {time.perf_counter() - start:.1f} s)")
+    return str(final_dir)
 
-    raw_dir = "./data/raw"
-    parquet_dir = "./data/parquet"
+def convert_and_partition(input_path, parquet_dir, memory_budget_mb=256, dataset_dir=None, optimize=False):
+    parquet_path = convert_to_parquet(input_path, parquet_dir, memory_budget_mb)
+    if optimize:
+        optimized_path = Path(parquet_dir) / f"optimized_{year_of(input_path)}.parquet"
+        if source_sha256(optimized_path) != source_sha256(parquet_path) or not optimized_path.exists():
+            optimize_parquet(parquet_path, optimized_path)
+    if dataset_dir:
+        partition_year(parquet_path, dataset_dir, year_of(input_path))
+    return parquet_path
 
+def _failure(stage, error):
+    return {"status": "❌", "stage": stage, "error": f"{type(error).__name__}: {error}"}
+
+def run_sequential(urls, raw_dir, parquet_dir, memory_budget_mb=256, chunk_size=1 << 20, dataset_dir=None,
+                   optimize=False):
+    results = {}
     for url, filename in urls.items():
-        if url.endswith(('.csv', '.gz')):
-            local_file = download_file(url, raw_dir, filename)
-            convert_to_parquet(local_file, parquet_dir)
+        year = year_of(filename)
+        try:
+            local_file = download_file(url, raw_dir, filename, chunk_size)
+        except Exception as e:
+            results[year] = _failure("download", e)
+            continue
+        try:
+            parquet = convert_and_partition(local_file, parquet_dir, memory_budget_mb, dataset_dir, optimize)
+            results[year] = {"status": "✅", "parquet": parquet}
+        except Exception as e:
+            results[year] = _failure("conversion", e)
+    return results
+
+def run_parallel(urls, raw_dir, parquet_dir, download_workers=4, convert_workers=2, memory_budget_mb=256,
+                 chunk_size=1 << 20, dataset_dir=None, optimize=False):
+    """
+    Télécharge et convertit plusieurs années en parallèle.
+
+    Les téléchargements (I/O) tournent dans un pool de threads ; chaque
+    fichier téléchargé est aussitôt confié à un pool de processus pour la
+    conversion (CPU), si bien que les deux étapes se recouvrent.
+
+    Parameters
+    ----------
+    urls : dict
+        {url: nom de fichier local}
+    download_workers : int, default=4
+        Nombre de téléchargements simultanés
+    convert_workers : int, default=2
+        Nombre de conversions simultanées ; chacune respecte `memory_budget_mb`
+
+    Returns
+    -------
+    dict
+        Statut par année : {"status", "parquet"} ou {"status", "stage", "error"}
+    """
+    results = {}
+    with ThreadPoolExecutor(max_workers=download_workers) as downloads, \
+            ProcessPoolExecutor(max_workers=convert_workers) as conversions:
+        pending_downloads = {
+            downloads.submit(download_file, url, raw_dir, filename, chunk_size): year_of(filename)
+            for url, filename in urls.items()
+        }
+        pending_conversions = {}
+        for future in as_completed(pending_downloads):
+            year = pending_downloads[future]
+            try:
+                local_file = future.result()
+            except Exception as e:
+                results[year] = _failure("download", e)
+                continue
+            conversion = conversions.submit(convert_and_partition, local_file, parquet_dir, memory_budget_mb,
+                                            dataset_dir, optimize)
+            pending_conversions[conversion] = year
+
+        for future in as_completed(pending_conversions):
+            year = pending_conversions[future]
+            try:
+                results[year] = {"status": "✅", "parquet": future.result()}
+            except Exception as e:
+                results[year] = _failure("conversion", e)
+    return results
+
+def print_report(results):
+    print("\n📋 Bilan par année")
+    for year in sorted(results):
+        r = results[year]
+        if r["status"] == "✅":
+            print(f"   {year} ✅ {r['parquet']}")
         else:
-            print(f"⚠️ Skipping unsupported file type: {url}")
+            print(f"   {year} ❌ échec ({r['stage']}) : {r['error']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Téléchargement et conversion Parquet des fichiers DVF.")
+    parser.add_argument("--years", nargs="+", type=int, default=DVF_YEARS)
+    parser.add_argument("--base-url", default=DVF_BASE_URL)
+    parser.add_argument("--raw-dir", default="./data/raw")
+    parser.add_argument("--parquet-dir", default="./data/parquet")
+    parser.add_argument("--parallel", action="store_true", help="Recouvre téléchargements et conversions")
+    parser.add_argument("--download-workers", type=int, default=4)
+    parser.add_argument("--convert-workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--memory-budget-mb", type=int, default=256, help="Par conversion")
+    parser.add_argument("--chunk-size-mb", type=float, default=1.0, help="Taille des blocs de téléchargement")
+    parser.add_argument("--partitioned", action="store_true",
+                        help="Écrit aussi le dataset partitionné annee=/code_departement=")
+    parser.add_argument("--dataset-dir", default="./data/parquet/dvf")
+    parser.add_argument("--optimize", action="store_true",
+                        help="Écrit aussi optimized_YYYY.parquet (types compacts, catégories conservées)")
+    args = parser.parse_args()
+
+    urls = build_urls(args.years, args.base_url)
+    chunk_size = int(args.chunk_size_mb * (1 << 20))
+    dataset_dir = args.dataset_dir if args.partitioned else None
+    if args.parallel:
+        results = run_parallel(urls, args.raw_dir, args.parquet_dir, args.download_workers,
+                               args.convert_workers, args.memory_budget_mb, chunk_size, dataset_dir, args.optimize)
+    else:
+        results = run_sequential(urls, args.raw_dir, args.parquet_dir, args.memory_budget_mb, chunk_size,
+                                 dataset_dir, args.optimize)
+
+    print_report(results)
+    sys.exit(0 if all(r["status"] == "✅" for r in results.values()) else 1)
@@ -0,0 +1,114 @@
+import pyarrow as pa
+
+# Colonnes des fichiers geo-dvf `full.csv.gz` (data.gouv.fr), dans l'ordre.
+# Les codes (postal, commune, département, parcelle, lots, ...) restent des
+# chaînes : les zéros de tête sont significatifs ("01000", "2A").
+DVF_CSV_TYPES = {
+    "id_mutation": pa.string(),
+    "date_mutation": pa.date32(),
+    "numero_disposition": pa.int32(),
+    "nature_mutation": pa.string(),
+    "valeur_fonciere": pa.float64(),
+    "adresse_numero": pa.float64(),
+    "adresse_suffixe": pa.string(),
+    "adresse_nom_voie": pa.string(),
+    "adresse_code_voie": pa.string(),
+    "code_postal": pa.string(),
+    "code_commune": pa.string(),
+    "nom_commune": pa.string(),
+    "code_departement": pa.string(),
+    "ancien_code_commune": pa.string(),
+    "ancien_nom_commune": pa.string(),
+    "id_parcelle": pa.string(),
+    "ancien_id_parcelle": pa.string(),
+    "numero_volume": pa.string(),
+    "lot1_numero": pa.string(),
+    "lot1_surface_carrez": pa.float64(),
+    "lot2_numero": pa.string(),
+    "lot2_surface_carrez": pa.float64(),
+    "lot3_numero": pa.string(),
+    "lot3_surface_carrez": pa.float64(),
+    "lot4_numero": pa.string(),
+    "lot4_surface_carrez": pa.float64(),
+    "lot5_numero": pa.string(),
+    "lot5_surface_carrez": pa.float64(),
+    "nombre_lots": pa.int32(),
+    "code_type_local": pa.string(),
+    "type_local": pa.string(),
+    "surface_reelle_bati": pa.float64(),
+    "nombre_pieces_principales": pa.float64(),
+    "code_nature_culture": pa.string(),
+    "nature_culture": pa.string(),
+    "code_nature_culture_speciale": pa.string(),
+    "nature_culture_speciale": pa.string(),
+    "surface_terrain": pa.float64(),
+    "longitude": pa.float64(),
+    "latitude": pa.float64(),
+}
+
+DVF_COLUMNS = list(DVF_CSV_TYPES)
+
+# Métadonnée des Parquet annuels (full_ / optimized_) : SHA-256 du CSV brut
+# converti, comparé au manifeste de téléchargement pour détecter une mise à jour
+SOURCE_SHA256_KEY = b"dvf_source_sha256"
+
+# Partitionnement hive du dataset DVF : data/parquet/dvf/annee=2020/code_departement=75/
+# Typage explicite : sans lui, "01" serait inféré comme l'entier 1 et "2A" casserait l'inférence.
+DVF_PARTITION_SCHEMA = pa.schema([("annee", pa.int16()), ("code_departement", pa.string())])
+
+# Tri à l'intérieur d'une partition : mutations contiguës, statistiques
+# min/max serrées par row group pour les filtres sur la commune.
+DVF_SORT_KEYS = [("code_commune", "ascending"), ("id_mutation", "ascending")]
+
+# Types compacts du DVF "optimisé" (équivalent productionnalisé de
+# `optimize_dataframe` du notebook 02) :
+# - libellés et codes à faible cardinalité : dictionnaire -> category pandas ;
+# - entiers nullables courts, flottants 32 bits, dates en timestamp(ms) ;
+# - identifiants à forte cardinalité : chaînes simples.
+_DICT = pa.dictionary(pa.int32(), pa.string())
+
+DVF_OPTIMIZED_TYPES = {
+    "id_mutation": pa.string(),
+    "date_mutation": pa.timestamp("ms"),
+    "numero_disposition": pa.int16(),
+    "nature_mutation": _DICT,
+    "valeur_fonciere": pa.float32(),
+    "adresse_numero": pa.int32(),
+    "adresse_suffixe": _DICT,
+    "adresse_nom_voie": pa.string(),
+    "adresse_code_voie": pa.string(),
+    "code_postal": _DICT,
+    "code_commune": _DICT,
+    "nom_commune": _DICT,
+    "code_departement": _DICT,
+    "ancien_code_commune": _DICT,
+    "ancien_nom_commune": _DICT,
+    "id_parcelle": pa.string(),
+    "ancien_id_parcelle": pa.string(),
+    "numero_volume": pa.string(),
+    "lot1_numero": pa.string(),
+    "lot1_surface_carrez": pa.float32(),
+    "lot2_numero": pa.string(),
+    "lot2_surface_carrez": pa.float32(),
+    "lot3_numero": pa.string(),
+    "lot3_surface_carrez": pa.float32(),
+    "lot4_numero": pa.string(),
+    "lot4_surface_carrez": pa.float32(),
+    "lot5_numero": pa.string(),
+    "lot5_surface_carrez": pa.float32(),
+    "nombre_lots": pa.int16(),
+    "code_type_local": _DICT,
+    "type_local": _DICT,
+    "surface_reelle_bati": pa.float32(),
+    "nombre_pieces_principales": pa.int16(),
+    "code_nature_culture": _DICT,
+    "nature_culture": _DICT,
+    "code_nature_culture_speciale": _DICT,
+    "nature_culture_speciale": _DICT,
+    "surface_terrain": pa.float32(),
+    "longitude": pa.float32(),
+    "latitude": pa.float32(),
+}
+
+# Codes à longueur fixe, complétés par des zéros à gauche ("1000" -> "01000")
+DVF_FIXED_WIDTH_CODES = {"code_postal": 5, "code_commune": 5, "code_departement": 2}
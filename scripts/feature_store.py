@@ -0,0 +1,250 @@
+import os
+import sys
+import argparse
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from scripts.io_utils import save_parquet  # noqa: E402
+
+# Statistiques précalculées par année et par niveau géographique (commune par
+# nom ou code INSEE, département, code postal), dans un seul Parquet colonne :
+# une ligne par (niveau, clé).
+LEVELS = {
+    "commune": "nom_commune",
+    "code_commune": "code_commune",
+    "departement": "code_departement",
+    "code_postal": "code_postal",
+}
+PRIX_QUANTILES = {"prix_m2_q10": 0.10, "prix_m2_q25": 0.25, "prix_m2_q75": 0.75, "prix_m2_q90": 0.90}
+STATS = [
+    "nb_ventes",
+    "prix_m2_median",
+    "prix_m2_moyen",
+    *PRIX_QUANTILES,
+    "surface_mediane",
+    "surface_moyenne",
+    "valeur_fonciere_mediane",
+]
+KEY_WIDTHS = {"code_commune": 5, "code_departement": 2, "code_postal": 5}
+SOURCE_COLUMNS = ["prix_m2", "valeur_fonciere", "surface_reelle_bati", *LEVELS.values()]
+
+
+def default_path(year: int) -> Path:
+    return Path(f"data/features/stats_{year}.parquet")
+
+
+def default_index_path(year: int) -> Path:
+    return Path(f"data/features/communes_{year}.parquet")
+
+
+def _normalize_keys(keys: pd.Series, column: str) -> pd.Series:
+    # Les anciens datasets de production stockent code_postal en float (1000.0)
+    if pd.api.types.is_numeric_dtype(keys):
+        keys = keys.astype("Int64").astype("string")
+    keys = keys.astype("string").str.strip()
+    if column in KEY_WIDTHS:
+        keys = keys.str.zfill(KEY_WIDTHS[column])
+    return keys
+
+
+def compute_stats(df: pd.DataFrame, column: str) -> pd.DataFrame:
+    """Agrégats d'un niveau : une ligne par valeur de `column`."""
+    d = df.dropna(subset=[column]).assign(cle=lambda x: _normalize_keys(x[column], column))
+    grouped = d.groupby("cle", observed=True, sort=True)
+    stats = pd.DataFrame({
+        "nb_ventes": grouped.size(),
+        "prix_m2_median": grouped["prix_m2"].median(),
+        "prix_m2_moyen": grouped["prix_m2"].mean(),
+        "surface_mediane": grouped["surface_reelle_bati"].median(),
+        "surface_moyenne": grouped["surface_reelle_bati"].mean(),
+        "valeur_fonciere_mediane": grouped["valeur_fonciere"].median(),
+    })
+    quantiles = grouped["prix_m2"].quantile(list(PRIX_QUANTILES.values())).unstack()
+    for name, q in PRIX_QUANTILES.items():
+        stats[name] = quantiles[q]
+    return stats[STATS].reset_index()
+
+
+def build_feature_store(year: int, source=None, output=None) -> Path:
+    """
+    Précalcule les statistiques par commune (nom et code INSEE si
+    disponible), département et code postal d'une année DVF.
+
+    Parameters
+    ----------
+    year : int
+        Année (nom du fichier de sortie)
+    source : str, optional
+        Dataset d'appartements (défaut : data/prod/df_streamlit_appart_YYYY.parquet.gz)
+    output : str, optional
+        Fichier de sortie (défaut : data/features/stats_YYYY.parquet)
+
+    Returns
+    -------
+    Path
+        Chemin du Parquet écrit
+    """
+    source = source or f"data/prod/df_streamlit_appart_{year}.parquet.gz"
+    output = Path(output or default_path(year))
+    # Les anciens datasets de production n'ont pas code_commune
+    available = pq.read_schema(source).names
+    df = pd.read_parquet(source, columns=[c for c in SOURCE_COLUMNS if c in available])
+    save_parquet(compute_feature_store(df), output, compression="zstd")
+    return output
+
+
+def compute_feature_store(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Table du feature store (une ligne par niveau et clé) à partir des lignes
+    de `df`. Les niveaux absents de `df` sont omis, les statistiques des
+    colonnes absentes (ex. valeur_fonciere dans le dataset du modèle) valent NaN.
+    """
+    df = df.assign(**{c: np.nan for c in ["prix_m2", "valeur_fonciere", "surface_reelle_bati"] if c not in df})
+    table = pd.concat(
+        [compute_stats(df, column).assign(niveau=level) for level, column in LEVELS.items() if column in df],
+        ignore_index=True,
+    )
+    return table[["niveau", "cle", *STATS]].astype(
+        {"niveau": "category", "cle": "string", "nb_ventes": "int32",
+         **{stat: "float32" for stat in STATS if stat != "nb_ventes"}}
+    )
+
+
+class FeatureStore:
+    """
+    Accès O(1) aux statistiques précalculées.
+
+    Les colonnes sont gardées en tableaux NumPy et chaque niveau a son index
+    {clé: ligne} : une recherche est une lecture de dict plus un accès
+    tableau, sans pandas.
+
+    Exemple
+    -------
+    >>> store = load_feature_store("data/features/stats_2020.parquet")
+    >>> store.get("commune", "Lyon 3e Arrondissement")["prix_m2_median"]
+    >>> store.lookup("departement", ["75", "69"], "nb_ventes")
+    """
+
+    def __init__(self, table: pd.DataFrame):
+        self.columns = {stat: table[stat].to_numpy() for stat in STATS if stat in table}
+        self.keys = table["cle"].astype(str).to_numpy()
+        levels = table["niveau"].astype(str).to_numpy()
+        self.index = {}
+        for i, (level, key) in enumerate(zip(levels, self.keys)):
+            self.index.setdefault(level, {})[key] = i
+
+    @classmethod
+    def load(cls, path) -> "FeatureStore":
+        return cls(pd.read_parquet(path))
+
+    def levels(self) -> list:
+        return list(self.index)
+
+    def get(self, level: str, key) -> dict | None:
+        """Toutes les statistiques d'une clé, ou None si elle est inconnue."""
+        i = self.index[level].get(str(key))
+        if i is None:
+            return None
+        return {stat: values[i].item() for stat, values in self.columns.items()}
+
+    def lookup(self, level: str, keys, stat: str, default=np.nan) -> np.ndarray:
+        """Une statistique pour une liste de clés ; `default` pour les clés inconnues."""
+        index, values = self.index[level], self.columns[stat]
+        rows = np.fromiter((index.get(str(k), -1) for k in keys), dtype=np.int64, count=len(keys))
+        out = values[rows].astype(np.float64)
+        out[rows < 0] = default
+        return out
+
+    def series(self, level: str, stat: str) -> pd.Series:
+        """Statistique d'un niveau, indexée par clé."""
+        rows = np.fromiter(self.index[level].values(), dtype=np.int64)
+        return pd.Series(self.columns[stat][rows], index=pd.Index(self.keys[rows], name=LEVELS[level]), name=stat)
+
+    def frame(self, level: str) -> pd.DataFrame:
+        """Toutes les statistiques d'un niveau (pour l'affichage)."""
+        rows = np.fromiter(self.index[level].values(), dtype=np.int64)
+        return pd.DataFrame(
+            {LEVELS[level]: self.keys[rows], **{stat: values[rows] for stat, values in self.columns.items()}}
+        )
+
+
+def build_commune_index(year: int, source=None, output=None) -> Path | None:
+    """
+    Table code_commune ↔ nom_commune d'une année, pour résoudre l'un par
+    l'autre (ex. requêtes API). Ignorée si la source n'a pas code_commune.
+    """
+    source = source or f"data/prod/df_streamlit_appart_{year}.parquet.gz"
+    if "code_commune" not in pq.read_schema(source).names:
+        print(f"⚠️ Pas de code_commune dans {source} : index des communes non construit.")
+        return None
+    output = Path(output or default_index_path(year))
+    df = pd.read_parquet(source, columns=["code_commune", "nom_commune"]).dropna()
+    df["code_commune"] = _normalize_keys(df["code_commune"], "code_commune")
+    index = df.drop_duplicates().sort_values(["code_commune", "nom_commune"]).astype("string")
+    save_parquet(index.reset_index(drop=True), output, compression="zstd")
+    return output
+
+
+class CommuneIndex:
+    """
+    Résolution O(1) code INSEE ↔ nom de commune.
+
+    Un nom partagé par plusieurs communes (homonymes dans des départements
+    différents) est ambigu : `code_of` lève alors une ValueError.
+    """
+
+    def __init__(self, table: pd.DataFrame):
+        self.names = dict(zip(table["code_commune"].astype(str), table["nom_commune"].astype(str)))
+        self.codes = {}
+        for code, name in self.names.items():
+            self.codes.setdefault(name, []).append(code)
+
+    @classmethod
+    def load(cls, path) -> "CommuneIndex":
+        return cls(pd.read_parquet(path))
+
+    def name_of(self, code: str) -> str | None:
+        return self.names.get(str(code))
+
+    def code_of(self, name: str) -> str | None:
+        codes = self.codes.get(name)
+        if codes is None:
+            return None
+        if len(codes) > 1:
+            raise ValueError(f"Nom de commune ambigu : {name} ({', '.join(codes)}) — préciser code_commune.")
+        return codes[0]
+
+
+@lru_cache(maxsize=8)
+def _load_cached(cls, path: str, mtime: float):
+    return cls.load(path)
+
+
+def load_feature_store(path) -> FeatureStore:
+    """FeatureStore partagé par processus, rechargé si le fichier change."""
+    path = str(path)
+    return _load_cached(FeatureStore, path, os.path.getmtime(path))
+
+
+def load_commune_index(path) -> CommuneIndex:
+    """CommuneIndex partagé par processus, rechargé si le fichier change."""
+    path = str(path)
+    return _load_cached(CommuneIndex, path, os.path.getmtime(path))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Précalcul des statistiques par commune / département / code postal.")
+    parser.add_argument("--years", nargs="+", type=int, default=[2020])
+    parser.add_argument("--source", help="Dataset d'appartements (défaut : data/prod/df_streamlit_appart_YYYY.parquet.gz)")
+    parser.add_argument("--output", help="Défaut : data/features/stats_YYYY.parquet")
+    parser.add_argument("--index-output", help="Défaut : data/features/communes_YYYY.parquet")
+    args = parser.parse_args()
+
+    for year in args.years:
+        build_feature_store(year, args.source, args.output)
+        build_commune_index(year, args.source, args.index_output)
@@ -1,36 +1,386 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
 from pathlib import Path
 import pandas as pd
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
-def save_parquet_gzip(df: pd.DataFrame,output_path: str,overwrite: bool = True) -> None:
+
+def _try_lock(f) -> bool:
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            # msvcrt verrouille à la position courante ("a+" ouvre en fin de
+            # fichier) : toujours l'octet 0, comme au déverrouillage
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(f) -> None:
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def file_lock(path, timeout: float = None, poll_interval: float = 0.1):
     """
-    Sauvegarde un DataFrame en Parquet compressé GZIP.
+    Verrou exclusif inter-processus sur `<path>.lock` (flock, ou msvcrt sous
+    Windows). Le verrou est libéré par le système si le processus meurt.
+
+    Parameters
+    ----------
+    path : str
+        Fichier à protéger
+    timeout : float, optional
+        Attente maximale en secondes (illimitée par défaut) ; TimeoutError au-delà
+    """
+    lock_path = Path(f"{path}.lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a+") as f:
+        start = time.monotonic()
+        while not _try_lock(f):
+            if timeout is not None and time.monotonic() - start > timeout:
+                raise TimeoutError(f"Verrou non obtenu sur {lock_path} après {timeout} s")
+            time.sleep(poll_interval)
+        try:
+            yield
+        finally:
+            _unlock(f)
+
+
+@contextmanager
+def _no_lock():
+    yield
+
+
+@contextmanager
+def atomic_path(output_path):
+    """
+    Chemin temporaire, dans le même dossier que `output_path`, renommé
+    atomiquement vers `output_path` en sortie (supprimé en cas d'erreur).
+    Un lecteur voit toujours l'ancien fichier complet ou le nouveau.
+    """
+    output_path = Path(output_path)
+    tmp_path = output_path.with_name(f".{output_path.name}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        yield tmp_path
+        os.replace(tmp_path, output_path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def sha256_file(path, chunk_size=1 << 20):
+    """SHA-256 du contenu d'un fichier, lu par blocs (objet hashlib, ex. `.hexdigest()`)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest
+
+
+_manifest_lock = threading.Lock()
+
+
+def load_manifest(manifest_path) -> dict:
+    """Manifeste JSON (téléchargements, pipeline) ; vide s'il n'existe pas."""
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def update_manifest(manifest_path, key, entry):
+    """
+    Remplace (ou supprime si `entry` vaut None) une entrée du manifeste.
+    Écriture atomique, sérialisée entre threads.
+    """
+    with _manifest_lock:
+        manifest = load_manifest(manifest_path)
+        if entry is None:
+            manifest.pop(key, None)
+        else:
+            manifest[key] = entry
+        with atomic_path(manifest_path) as tmp_path:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def save_parquet(
+    df: pd.DataFrame,
+    output_path: str,
+    compression: str = "zstd",
+    compression_level: int = None,
+    use_dictionary: bool = True,
+    row_group_size: int = None,
+    write_statistics: bool = True,
+    overwrite: bool = True,
+    lock: bool = False,
+) -> None:
+    """
+    Sauvegarde un DataFrame en Parquet avec un codec et un encodage choisis.
 
     Parameters
     ----------
     df : pd.DataFrame
         DataFrame à sauvegarder
     output_path : str
-        Chemin du fichier .parquet.gz
+        Chemin du fichier .parquet
+    compression : str, default="zstd"
+        Codec : "zstd", "lz4", "snappy", "gzip", "brotli" ou "none"
+    compression_level : int, optional
+        Niveau du codec (zstd 1-22, gzip 1-9, brotli 0-11) ; défaut du codec sinon
+    use_dictionary : bool, default=True
+        Encodage dictionnaire (efficace sur les colonnes répétitives :
+        communes, départements, codes postaux)
+    row_group_size : int, optional
+        Nombre maximal de lignes par row group (défaut pyarrow sinon)
+    write_statistics : bool, default=True
+        Écrit les statistiques min/max par row group, utilisées pour sauter
+        des row groups lors des lectures filtrées
     overwrite : bool, default=True
         Autorise l'écrasement du fichier existant
+    lock : bool, default=False
+        Sérialise les écrivains concurrents du même fichier (`file_lock`)
+
+    Notes
+    -----
+    L'écriture passe par un fichier temporaire renommé atomiquement : un
+    lecteur concurrent ne voit jamais de Parquet tronqué.
     """
 
     output_path = Path(output_path)
 
-    if output_path.exists() and not overwrite:
-        raise FileExistsError(f"{output_path} existe déjà.")
-
     # Création du dossier si nécessaire
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    df.to_parquet(
-        output_path,
-        engine="pyarrow",
-        compression="gzip",
-        index=False
-    )
+    with file_lock(output_path) if lock else _no_lock():
+        if output_path.exists() and not overwrite:
+            raise FileExistsError(f"{output_path} existe déjà.")
+
+        with atomic_path(output_path) as tmp_path:
+            df.to_parquet(
+                tmp_path,
+                engine="pyarrow",
+                compression=None if compression == "none" else compression,
+                compression_level=compression_level,
+                use_dictionary=use_dictionary,
+                row_group_size=row_group_size,
+                write_statistics=write_statistics,
+                index=False
+            )
 
     print(f"✅ Dataset sauvegardé : {output_path}")
     print(f"   → lignes : {df.shape[0]}")
     print(f"   → colonnes : {df.shape[1]}")
+
+
+def save_parquet_gzip(df: pd.DataFrame,output_path: str,overwrite: bool = True) -> None:
+    """
+    Sauvegarde un DataFrame en Parquet compressé GZIP.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        DataFrame à sauvegarder
+    output_path : str
+        Chemin du fichier .parquet.gz
+    overwrite : bool, default=True
+        Autorise l'écrasement du fichier existant
+    """
+    save_parquet(df, output_path, compression="gzip", overwrite=overwrite)
+
+
+def read_dvf_dataset(
+    root: str = "data/parquet/dvf",
+    years=None,
+    departements=None,
+    columns=None,
+    filters=None,
+) -> pd.DataFrame:
+    """
+    Lit le dataset DVF partitionné (annee=/code_departement=) en ne chargeant
+    que les partitions et colonnes utiles.
+
+    Les filtres sur l'année et le département élaguent des répertoires entiers ;
+    les autres filtres sont poussés à pyarrow, qui saute les row groups via
+    leurs statistiques min/max.
+
+    Parameters
+    ----------
+    root : str, default="data/parquet/dvf"
+        Racine du dataset partitionné
+    years : list[int], optional
+        Années à lire (toutes par défaut)
+    departements : list[str], optional
+        Codes département à lire, ex. ["75", "92", "2A"]
+    columns : list[str], optional
+        Colonnes à charger (toutes par défaut) ; peut inclure les clés de partition
+    filters : list[tuple] | pyarrow.compute.Expression, optional
+        Filtres supplémentaires, au format pandas/pyarrow :
+        [("nature_mutation", "==", "Vente"), ("surface_reelle_bati", ">", 0)]
+
+    Returns
+    -------
+    pd.DataFrame
+    """
+    # Import local : io_utils reste importable sans la racine du repo dans
+    # sys.path (ex. `import io_utils` depuis scripts/)
+    try:
+        from scripts.dvf_schema import DVF_PARTITION_SCHEMA
+    except ImportError:
+        from dvf_schema import DVF_PARTITION_SCHEMA
+
+    dataset = ds.dataset(
+        root,
+        format="parquet",
+        partitioning=ds.partitioning(DVF_PARTITION_SCHEMA, flavor="hive"),
+        exclude_invalid_files=True,
+    )
+
+    expression = None
+    if filters is not None:
+        expression = filters if isinstance(filters, pc.Expression) else pq.filters_to_expression(filters)
+    if years is not None:
+        expression = _and(expression, ds.field("annee").isin([int(y) for y in years]))
+    if departements is not None:
+        expression = _and(expression, ds.field("code_departement").isin([str(d) for d in departements]))
+
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+
+def _and(left, right):
+    return right if left is None else left & right
+
+
+class ParquetDatasetWriter:
+    """
+    Écriture d'un dataset multi-fichiers par plusieurs processus, publié
+    d'un bloc par un manifeste.
+
+    Chaque processus écrit ses fichiers (`write_part`) dans un dossier de
+    version `<root>/v=<version>/` ; le coordinateur appelle ensuite
+    `commit`, qui remplace atomiquement `<root>/_manifest.json`. Les
+    lecteurs (`read_parquet_dataset`) ne lisent que les fichiers du
+    manifeste : ils voient l'ancienne version complète ou la nouvelle,
+    jamais un mélange. L'objet est sérialisable et peut être passé tel quel
+    aux workers d'un ProcessPoolExecutor.
+
+    Exemple
+    -------
+    >>> writer = ParquetDatasetWriter("data/processed/appartements")
+    >>> with ProcessPoolExecutor() as pool:
+    ...     list(pool.map(writer.write_part, frames, names))
+    >>> writer.commit()
+    """
+
+    MANIFEST = "_manifest.json"
+
+    def __init__(self, root: str, version: str = None):
+        self.root = Path(root)
+        self.version = version or f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.version_dir = self.root / f"v={self.version}"
+
+    def write_part(self, df: pd.DataFrame, name: str, **parquet_kwargs) -> Path:
+        """Écrit (atomiquement) un fichier du dataset ; `name` doit être unique."""
+        self.version_dir.mkdir(parents=True, exist_ok=True)
+        path = self.version_dir / f"{name}.parquet"
+        with atomic_path(path) as tmp_path:
+            df.to_parquet(tmp_path, engine="pyarrow", index=False, **parquet_kwargs)
+        return path
+
+    def commit(self, keep_versions: int = 2) -> dict:
+        """
+        Publie la version : écrit le manifeste (fichiers, lignes, tailles)
+        puis supprime les anciennes versions publiées au-delà de
+        `keep_versions` (la précédente est gardée pour les lecteurs encore
+        en cours). Seules les versions de l'historique du manifeste sont
+        supprimées : un dossier en cours d'écriture par un autre processus,
+        jamais publié, n'est pas touché.
+        """
+        files = sorted(self.version_dir.glob("*.parquet")) if self.version_dir.exists() else []
+        manifest = {
+            "version": self.version,
+            "committed_at": datetime.now(timezone.utc).isoformat(),
+            "files": [
+                {
+                    "path": str(path.relative_to(self.root)),
+                    "rows": pq.ParquetFile(path).metadata.num_rows,
+                    "bytes": path.stat().st_size,
+                }
+                for path in files
+            ],
+        }
+        manifest_path = self.root / self.MANIFEST
+        with file_lock(manifest_path):
+            # Versions publiées avant celle-ci, de la plus ancienne à la plus récente
+            previous = json.loads(manifest_path.read_text(encoding="utf-8")) if manifest_path.exists() else {}
+            history = [v for v in [*previous.get("history", []), previous.get("version")]
+                       if v and v != self.version]
+            n_stale = max(0, len(history) - (keep_versions - 1))
+            manifest["history"] = history[n_stale:]
+            with atomic_path(manifest_path) as tmp_path:
+                tmp_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+            self._prune(history[:n_stale])
+
+        n_rows = sum(f["rows"] for f in manifest["files"])
+        print(f"✅ Dataset publié : {self.root} (version {self.version}, {len(files)} fichiers, {n_rows} lignes)")
+        return manifest
+
+    def _prune(self, versions: list) -> None:
+        # Appelé sous le verrou du manifeste, sur des versions déjà remplacées
+        for version in versions:
+            old = self.root / f"v={version}"
+            if not old.is_dir():
+                continue
+            for path in old.iterdir():
+                path.unlink()
+            old.rmdir()
+
+
+def read_parquet_dataset(root: str, columns=None, filters=None) -> pd.DataFrame:
+    """
+    Lit la version publiée d'un dataset écrit par `ParquetDatasetWriter`.
+
+    Parameters
+    ----------
+    root : str
+        Racine du dataset (contenant `_manifest.json`)
+    columns : list[str], optional
+        Colonnes à charger
+    filters : list[tuple] | pyarrow.compute.Expression, optional
+        Filtres poussés à pyarrow, au format pandas/pyarrow
+    """
+    root = Path(root)
+    manifest_path = root / ParquetDatasetWriter.MANIFEST
+    if not manifest_path.exists():
+        raise FileNotFoundError(f"Aucune version publiée dans {root}")
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    paths = [str(root / f["path"]) for f in manifest["files"]]
+    if not paths:
+        return pd.DataFrame(columns=columns)
+
+    expression = None
+    if filters is not None:
+        expression = filters if isinstance(filters, pc.Expression) else pq.filters_to_expression(filters)
+    return ds.dataset(paths, format="parquet").to_table(columns=columns, filter=expression).to_pandas()
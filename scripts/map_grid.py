@@ -0,0 +1,150 @@
+import sys
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from scripts.io_utils import save_parquet  # noqa: E402
+
+# Agrégation des ventes sur une grille multi-résolution pour la carte
+# Streamlit. Les cellules sont les tuiles Web Mercator (celles des fonds de
+# carte) : au niveau n, le monde est découpé en 2^n x 2^n cellules, chaque
+# cellule contient exactement 4 cellules du niveau n+1. Une carte au zoom z
+# affiche donc des cellules de taille constante à l'écran en lisant le
+# niveau z + ZOOM_OFFSET.
+GRID_LEVELS = range(5, 18)
+# Tuiles Mapbox GL de 512 px : au niveau z + 5, une cellule fait 16 px
+TILE_SIZE_PX = 512
+ZOOM_OFFSET = 5
+PRIX_QUANTILES = {"prix_m2_q25": 0.25, "prix_m2_q75": 0.75}
+GRID_COLUMNS = [
+    "niveau", "x", "y", "latitude", "longitude",
+    "nb_ventes", "prix_m2_median", *PRIX_QUANTILES, "surface_mediane",
+]
+MAX_LATITUDE = 85.05112878
+
+
+def default_path(year: int) -> Path:
+    return Path(f"data/features/grid_{year}.parquet")
+
+
+def tile_xy(latitude, longitude, level: int) -> tuple[np.ndarray, np.ndarray]:
+    """Coordonnées (x, y) de la cellule contenant chaque point au niveau `level`."""
+    n = 2 ** level
+    lat = np.radians(np.clip(np.asarray(latitude, dtype=np.float64), -MAX_LATITUDE, MAX_LATITUDE))
+    lon = np.asarray(longitude, dtype=np.float64)
+    x = np.floor((lon + 180.0) / 360.0 * n)
+    y = np.floor((1.0 - np.arcsinh(np.tan(lat)) / np.pi) / 2.0 * n)
+    return np.clip(x, 0, n - 1).astype(np.int32), np.clip(y, 0, n - 1).astype(np.int32)
+
+
+def tile_center(x, y, level: int) -> tuple[np.ndarray, np.ndarray]:
+    """Latitude / longitude du centre des cellules (x, y) au niveau `level`."""
+    n = 2 ** level
+    lon = (np.asarray(x, dtype=np.float64) + 0.5) / n * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1.0 - 2.0 * (np.asarray(y, dtype=np.float64) + 0.5) / n))))
+    return lat, lon
+
+
+def aggregate_level(df: pd.DataFrame, level: int) -> pd.DataFrame:
+    """Une ligne par cellule non vide du niveau `level`."""
+    x, y = tile_xy(df["latitude"], df["longitude"], level)
+    d = pd.DataFrame({
+        "cell": x.astype(np.int64) << 32 | y.astype(np.int64),
+        "prix_m2": df["prix_m2"].to_numpy(),
+        "surface_reelle_bati": df["surface_reelle_bati"].to_numpy(),
+    })
+    grouped = d.groupby("cell", sort=True)
+    cells = pd.DataFrame({
+        "nb_ventes": grouped.size(),
+        "prix_m2_median": grouped["prix_m2"].median(),
+        "surface_mediane": grouped["surface_reelle_bati"].median(),
+    })
+    quantiles = grouped["prix_m2"].quantile(list(PRIX_QUANTILES.values())).unstack()
+    for name, q in PRIX_QUANTILES.items():
+        cells[name] = quantiles[q]
+
+    keys = cells.index.to_numpy()
+    cells["x"], cells["y"] = (keys >> 32).astype(np.int32), (keys & 0xFFFFFFFF).astype(np.int32)
+    cells["latitude"], cells["longitude"] = tile_center(cells["x"], cells["y"], level)
+    cells["niveau"] = level
+    return cells.reset_index(drop=True)
+
+
+def compute_grid(df: pd.DataFrame, levels=GRID_LEVELS) -> pd.DataFrame:
+    """Cellules de tous les niveaux, triées par niveau (colonnes GRID_COLUMNS)."""
+    df = df.dropna(subset=["latitude", "longitude", "prix_m2"])
+    grid = pd.concat([aggregate_level(df, level) for level in levels], ignore_index=True)
+    return grid[GRID_COLUMNS].astype({
+        "niveau": "int8", "latitude": "float32", "longitude": "float32", "nb_ventes": "int32",
+        "prix_m2_median": "float32", **{name: "float32" for name in PRIX_QUANTILES}, "surface_mediane": "float32",
+    })
+
+
+def build_map_grid(year: int, source=None, output=None, levels=GRID_LEVELS) -> Path:
+    """
+    Précalcule la grille d'agrégats (nombre de ventes, médiane et quartiles
+    du prix/m²) de toutes les ventes d'une année, pour chaque niveau.
+
+    Parameters
+    ----------
+    year : int
+        Année (nom du fichier de sortie)
+    source : str, optional
+        Dataset d'appartements (défaut : data/prod/df_streamlit_appart_YYYY.parquet.gz)
+    output : str, optional
+        Fichier de sortie (défaut : data/features/grid_YYYY.parquet)
+    levels : iterable of int, default=GRID_LEVELS
+        Niveaux de grille à calculer
+
+    Returns
+    -------
+    Path
+        Chemin du Parquet écrit
+    """
+    source = source or f"data/prod/df_streamlit_appart_{year}.parquet.gz"
+    output = Path(output or default_path(year))
+    df = pd.read_parquet(source, columns=["latitude", "longitude", "prix_m2", "surface_reelle_bati"])
+    grid = compute_grid(df, levels)
+    # Tri par niveau : une lecture filtrée sur `niveau` ne touche que ses row groups
+    save_parquet(grid, output, compression="zstd", row_group_size=50_000)
+    print(f"🗺️ {len(grid):,} cellules sur {len(list(levels))} niveaux".replace(",", " "))
+    return output
+
+
+def grid_level(zoom: float, levels=GRID_LEVELS) -> int:
+    """Niveau de grille à afficher pour un zoom de carte."""
+    return int(np.clip(int(zoom) + ZOOM_OFFSET, min(levels), max(levels)))
+
+
+def cells_in_view(grid: pd.DataFrame, zoom: float, center_lat: float, center_lon: float,
+                  width_px: int = 1200, height_px: int = 600) -> pd.DataFrame:
+    """
+    Cellules du niveau adapté à `zoom` visibles dans une carte de
+    `width_px` x `height_px` centrée sur (center_lat, center_lon).
+
+    À cellules de taille fixe à l'écran, le nombre de cellules renvoyées est
+    borné par la taille de la carte (quelques milliers), quel que soit le zoom.
+    """
+    level = grid_level(zoom, grid["niveau"].unique())
+    cells = grid[grid["niveau"] == level]
+    # Emprise de la carte, en coordonnées de cellules du niveau choisi
+    scale = 2 ** (level - zoom) / TILE_SIZE_PX
+    cx, cy = (v[0] for v in tile_xy([center_lat], [center_lon], level))
+    half_w, half_h = width_px / 2 * scale + 1, height_px / 2 * scale + 1
+    return cells[
+        cells["x"].between(cx - half_w, cx + half_w) & cells["y"].between(cy - half_h, cy + half_h)
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Grille multi-résolution des ventes pour la carte Streamlit.")
+    parser.add_argument("--years", nargs="+", type=int, default=[2020])
+    parser.add_argument("--source", help="Dataset d'appartements (défaut : data/prod/df_streamlit_appart_YYYY.parquet.gz)")
+    parser.add_argument("--output", help="Défaut : data/features/grid_YYYY.parquet")
+    args = parser.parse_args()
+
+    for year in args.years:
+        build_map_grid(year, args.source, args.output)
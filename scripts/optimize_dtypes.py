@@ -0,0 +1,192 @@
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from scripts.dvf_schema import DVF_OPTIMIZED_TYPES, DVF_FIXED_WIDTH_CODES, SOURCE_SHA256_KEY  # noqa: E402
+
+
+def _pandas_dtype(arrow_type) -> str:
+    if pa.types.is_dictionary(arrow_type):
+        return "category"
+    if pa.types.is_integer(arrow_type):
+        return str(arrow_type).capitalize()  # int16 -> Int16 (nullable)
+    if pa.types.is_timestamp(arrow_type):
+        return f"datetime64[{arrow_type.unit}]"
+    if pa.types.is_string(arrow_type):
+        return "string"
+    return str(arrow_type.to_pandas_dtype().__name__)
+
+
+DVF_PANDAS_DTYPES = {col: _pandas_dtype(t) for col, t in DVF_OPTIMIZED_TYPES.items()}
+
+
+def optimized_schema(source_schema: pa.Schema) -> pa.Schema:
+    """
+    Schéma Arrow cible pour un schéma source DVF.
+
+    Les colonnes hors schéma DVF gardent leur type. Les métadonnées pandas
+    sont jointes au schéma : `pd.read_parquet` restitue alors directement
+    les `category`, `Int16` et `datetime64[ms]`, sans repasser par
+    float64/object.
+    """
+    fields = [
+        pa.field(f.name, DVF_OPTIMIZED_TYPES.get(f.name, f.type))
+        for f in source_schema
+    ]
+    empty = pd.DataFrame({
+        f.name: pd.Series(dtype=DVF_PANDAS_DTYPES[f.name]) if f.name in DVF_PANDAS_DTYPES
+        else pd.Series(dtype=f.type.to_pandas_dtype())
+        for f in source_schema
+    })
+    metadata = pa.Schema.from_pandas(empty, preserve_index=False).metadata
+    return pa.schema(fields, metadata=metadata)
+
+
+def optimize_batch(batch, schema: pa.Schema):
+    """Convertit un RecordBatch / une Table Arrow vers le schéma optimisé."""
+    columns = []
+    for field in schema:
+        column = batch.column(field.name)
+        width = DVF_FIXED_WIDTH_CODES.get(field.name)
+        if width:
+            column = pc.utf8_lpad(column, width=width, padding="0")
+        if pa.types.is_timestamp(field.type) and pa.types.is_date(column.type):
+            column = column.cast(pa.timestamp("s"))
+        columns.append(column.cast(field.type))
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def memory_report(before: dict, after: dict, dtypes_before: dict, dtypes_after: dict) -> pd.DataFrame:
+    report = pd.DataFrame({
+        "colonne": list(before),
+        "type_avant": [dtypes_before[c] for c in before],
+        "type_apres": [dtypes_after[c] for c in before],
+        "mo_avant": [before[c] / 1e6 for c in before],
+        "mo_apres": [after[c] / 1e6 for c in before],
+    })
+    report["gain_%"] = (100 * (1 - report["mo_apres"] / report["mo_avant"].where(report["mo_avant"] > 0))).round(1)
+    return report.sort_values("mo_avant", ascending=False).round(2).reset_index(drop=True)
+
+
+def optimize_dataframe(df: pd.DataFrame, category_thresh: float = 0.05, verbose: bool = True):
+    """
+    Optimise les types d'un DataFrame DVF déjà en mémoire.
+
+    Les colonnes du schéma DVF reçoivent leur type déclaré ; les autres
+    suivent les règles du notebook (float64 -> float32, int64 -> int32,
+    object -> category si le ratio modalités / lignes <= `category_thresh`).
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        DataFrame à optimiser (non modifié)
+    category_thresh : float, default=0.05
+        Seuil de cardinalité relative pour les colonnes hors schéma
+    verbose : bool, default=True
+        Affiche la mémoire totale avant / après
+
+    Returns
+    -------
+    tuple[pd.DataFrame, pd.DataFrame]
+        DataFrame optimisé et rapport mémoire par colonne
+    """
+    before = df.memory_usage(deep=True, index=False).to_dict()
+    dtypes_before = df.dtypes.astype(str).to_dict()
+    out = df.copy()
+
+    for col in out.columns:
+        if col in DVF_PANDAS_DTYPES:
+            target = DVF_PANDAS_DTYPES[col]
+            width = DVF_FIXED_WIDTH_CODES.get(col)
+            if width:
+                codes = out[col].astype("string").str.replace(r"\.0$", "", regex=True)
+                out[col] = codes.str.zfill(width)
+            if target.startswith("datetime64"):
+                out[col] = pd.to_datetime(out[col], errors="coerce").astype(target)
+            else:
+                out[col] = out[col].astype(target)
+        elif out[col].dtype == "float64":
+            out[col] = out[col].astype("float32")
+        elif out[col].dtype == "int64":
+            out[col] = out[col].astype("int32")
+        elif out[col].dtype == "object" and len(out) and out[col].nunique(dropna=False) / len(out) <= category_thresh:
+            out[col] = out[col].astype("category")
+
+    after = out.memory_usage(deep=True, index=False).to_dict()
+    report = memory_report(before, after, dtypes_before, out.dtypes.astype(str).to_dict())
+    if verbose:
+        print(f"🧮 Mémoire : {sum(before.values()) / 1e6:.1f} Mo → {sum(after.values()) / 1e6:.1f} Mo")
+    return out, report
+
+
+def optimize_parquet(input_path, output_path, batch_size: int = 200_000, verbose: bool = True) -> pd.DataFrame:
+    """
+    Étape d'ingestion : réécrit un Parquet DVF brut avec les types optimisés.
+
+    Traitement en streaming par lots ; les catégories sont conservées en
+    Parquet (encodage dictionnaire + métadonnées pandas) au lieu d'être
+    recastées en `str` comme dans le notebook.
+
+    Parameters
+    ----------
+    input_path : str
+        Parquet brut (ex. data/parquet/full_2020.parquet)
+    output_path : str
+        Parquet optimisé (ex. data/parquet/optimized_2020.parquet)
+    batch_size : int, default=200_000
+        Nombre de lignes par lot (et par row group)
+
+    Returns
+    -------
+    pd.DataFrame
+        Rapport mémoire par colonne (taille Arrow en mémoire avant / après)
+    """
+    start = time.perf_counter()
+    source = pq.ParquetFile(input_path)
+    schema = optimized_schema(source.schema_arrow)
+    # Empreinte du CSV d'origine conservée (détection des mises à jour)
+    source_sha256 = (source.schema_arrow.metadata or {}).get(SOURCE_SHA256_KEY)
+    if source_sha256:
+        schema = schema.with_metadata({**schema.metadata, SOURCE_SHA256_KEY: source_sha256})
+    before = dict.fromkeys(source.schema_arrow.names, 0)
+    after = dict.fromkeys(source.schema_arrow.names, 0)
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    with pq.ParquetWriter(tmp_path, schema, compression="snappy") as writer:
+        for batch in source.iter_batches(batch_size=batch_size):
+            optimized = optimize_batch(batch, schema)
+            for name in before:
+                before[name] += batch.column(name).nbytes
+                after[name] += optimized.column(name).nbytes
+            writer.write_batch(optimized)
+    tmp_path.replace(output_path)
+
+    report = memory_report(
+        before, after,
+        {f.name: str(f.type) for f in source.schema_arrow},
+        {f.name: str(f.type) for f in schema},
+    )
+    if verbose:
+        print(f"✅ Parquet optimisé : {output_path} ({time.perf_counter() - start:.1f} s)")
+        print(f"   → mémoire Arrow : {sum(before.values()) / 1e6:.1f} Mo → {sum(after.values()) / 1e6:.1f} Mo")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Optimisation des types d'un Parquet DVF.")
+    parser.add_argument("input", help="Parquet brut, ex. data/parquet/full_2020.parquet")
+    parser.add_argument("output", help="Parquet optimisé, ex. data/parquet/optimized_2020.parquet")
+    parser.add_argument("--batch-size", type=int, default=200_000)
+    args = parser.parse_args()
+
+    report = optimize_parquet(args.input, args.output, args.batch_size)
+    print(report.to_string(index=False))
@@ -0,0 +1,290 @@
+import os
+import sys
+import hashlib
+import argparse
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+from scripts.aggregates import load_aggregates, published_version  # noqa: E402
+from scripts.io_utils import ParquetDatasetWriter, sha256_file  # noqa: E402
+from scripts.sketches import sketch_parquet  # noqa: E402
+
+# Profil d'un fichier Parquet (page d'exploration Streamlit) : schéma, taux
+# de valeurs manquantes, cardinalités, modalités des colonnes catégorielles,
+# histogrammes des colonnes numériques et mutations les plus longues.
+#
+# Calculé une fois par version du fichier (empreinte du contenu et du code),
+# colonne par colonne : la mémoire nécessaire est celle de la plus grosse
+# colonne, pas celle du DataFrame complet. Publié par `ParquetDatasetWriter`
+# comme les agrégats de la page 04.
+#
+# Avec PROFILE_SKETCHES=1, le fichier est lu par lots et résumé par des
+# sketches (scripts/sketches.py) : cardinalités, modalités et histogrammes
+# approchés, mémoire bornée quelle que soit la taille du fichier. Les
+# tailles de mutations restent exactes (quelques lignes par mutation, sous
+# la précision d'un count-min).
+PROFILE_CODE = ["scripts/profile_dataset.py", "scripts/sketches.py"]
+PROFILE_SKETCHES = os.getenv("PROFILE_SKETCHES", "0") == "1"
+
+# Modalités gardées par colonne catégorielle (les plus fréquentes)
+TOP_VALUES = 100
+# Colonnes entières avec au plus DISCRETE_MAX valeurs : une classe par valeur
+DISCRETE_MAX = 100
+# Autres colonnes numériques : HIST_BINS classes entre ces quantiles
+HIST_BINS = 50
+HIST_RANGE = (0.01, 0.99)
+TOP_MUTATIONS = 20
+EXAMPLE_ROWS = 30
+
+
+def default_root(path) -> Path:
+    return Path(f"data/features/profile_{Path(path).name.split('.')[0]}")
+
+
+@lru_cache(maxsize=8)
+def _version(path: str, mtime: float, sketches: bool) -> str:
+    digests = [sha256_file(path).hexdigest()]
+    digests += [sha256_file(PROJECT_ROOT / code).hexdigest() for code in PROFILE_CODE]
+    digests += ["sketches"] if sketches else []
+    return hashlib.sha256("|".join(digests).encode()).hexdigest()[:16]
+
+
+def profile_version(path, sketches=PROFILE_SKETCHES) -> str:
+    """Version du profil pour ce fichier (recalculée si le fichier change)."""
+    return _version(str(path), os.path.getmtime(path), sketches)
+
+
+def _column_kinds(parquet: pq.ParquetFile) -> tuple[list, list]:
+    """Colonnes numériques / catégorielles, d'après les types pandas du fichier."""
+    empty = parquet.schema_arrow.empty_table().to_pandas()
+    num_cols = empty.select_dtypes(include=["number"]).columns.tolist()
+    cat_cols = empty.select_dtypes(include=["object", "bool", "category"]).columns.tolist()
+    return num_cols, cat_cols
+
+
+def _value_counts(s: pd.Series, column: str) -> pd.DataFrame:
+    # NaN compté comme une modalité (valeur nulle dans la table)
+    counts = s.astype("object").value_counts(dropna=False).head(TOP_VALUES)
+    return pd.DataFrame({
+        "colonne": column,
+        "valeur": [None if pd.isna(v) else str(v) for v in counts.index],
+        "nb_lignes": counts.to_numpy(dtype=np.int64),
+    })
+
+
+def _histogram(s: pd.Series, column: str) -> pd.DataFrame:
+    values = s.dropna().to_numpy(dtype=np.float64)
+    if not len(values):
+        return pd.DataFrame(columns=["colonne", "x0", "x1", "nb_lignes"])
+    uniques, counts = np.unique(values, return_counts=True)
+    if pd.api.types.is_integer_dtype(s.dtype) and len(uniques) <= DISCRETE_MAX:
+        x0, x1 = uniques, uniques + 1
+    else:
+        lo, hi = np.quantile(values, HIST_RANGE)
+        counts, edges = np.histogram(values, bins=HIST_BINS, range=(lo, hi))
+        x0, x1 = edges[:-1], edges[1:]
+    return pd.DataFrame({"colonne": column, "x0": x0, "x1": x1, "nb_lignes": counts.astype(np.int64)})
+
+
+def _mutation_sizes(s: pd.Series) -> pd.Series:
+    """Nombre de lignes par mutation, des plus longues aux plus courtes."""
+    return s.groupby(s, sort=True).size().sort_values(ascending=False, kind="stable")
+
+
+def _exact_column(s: pd.Series, column: str, num_cols: list, cat_cols: list) -> dict:
+    return {
+        "schema": {
+            "colonne": column,
+            "type": str(s.dtype),
+            "taux_manquant_%": round(float(s.isna().mean()) * 100, 2),
+            "nb_uniques": int(s.nunique(dropna=True)),
+        },
+        "valeurs": _value_counts(s, column) if column in cat_cols else None,
+        "histogramme": _histogram(s, column) if column in num_cols else None,
+        "min": s.min(skipna=True) if column in num_cols else None,
+        "max": s.max(skipna=True) if column in num_cols else None,
+    }
+
+
+def _sketched_column(sketch, column: str, num_cols: list, cat_cols: list) -> dict:
+    """Même résumé que `_exact_column`, à partir d'un `ColumnSketch`."""
+    summary = {
+        "schema": {
+            "colonne": column,
+            "type": sketch.dtype,
+            "taux_manquant_%": round(sketch.nulls / max(sketch.n, 1) * 100, 2),
+            "nb_uniques": sketch.distinct.count(),
+        },
+        "valeurs": None, "histogramme": None, "min": None, "max": None,
+    }
+    if column in cat_cols and sketch.frequent is not None:
+        top = sketch.frequent.top(TOP_VALUES).astype({"valeur": "object"})
+        if sketch.nulls:
+            top.loc[len(top)] = [None, sketch.nulls]
+        top = top.sort_values("nb_lignes", ascending=False, kind="stable").head(TOP_VALUES)
+        summary["valeurs"] = pd.DataFrame({
+            "colonne": column,
+            "valeur": top["valeur"].to_numpy(),
+            "nb_lignes": top["nb_lignes"].to_numpy(dtype=np.int64),
+        })
+    if column in num_cols and sketch.quantiles is not None:
+        quantiles = sketch.quantiles
+        if not quantiles.n:
+            hist = pd.DataFrame(columns=["colonne", "x0", "x1", "nb_lignes"])
+        elif "int" in sketch.dtype.lower() and summary["schema"]["nb_uniques"] <= DISCRETE_MAX:
+            items, weights = quantiles.weighted_items()
+            counts = pd.Series(weights).groupby(items).sum()
+            x = counts.index.to_numpy(dtype=np.float64)
+            hist = pd.DataFrame({"colonne": column, "x0": x, "x1": x + 1, "nb_lignes": counts.to_numpy()})
+        else:
+            counts, edges = quantiles.histogram(HIST_BINS, tuple(quantiles.quantile(list(HIST_RANGE))))
+            hist = pd.DataFrame({"colonne": column, "x0": edges[:-1], "x1": edges[1:],
+                                 "nb_lignes": counts.astype(np.int64)})
+        summary.update(histogramme=hist, min=quantiles.min, max=quantiles.max)
+    return summary
+
+
+def compute_profile(path, sketches=PROFILE_SKETCHES) -> dict:
+    """
+    Profil complet d'un fichier Parquet, lu une colonne à la fois (ou par
+    lots, résumé par des sketches).
+
+    Parameters
+    ----------
+    path : str | Path
+        Fichier Parquet (ex. data/parquet/optimized_2020.parquet)
+    sketches : bool, default=PROFILE_SKETCHES
+        Cardinalités, modalités et histogrammes approchés (scripts/sketches.py)
+
+    Returns
+    -------
+    dict[str, pd.DataFrame]
+        kpis, schema (type, taux_manquant_%, nb_uniques), valeurs (modalités
+        des colonnes catégorielles), histogrammes (colonnes numériques),
+        mutations (les plus longues en lignes), exemple_mutation
+    """
+    parquet = pq.ParquetFile(path)
+    num_cols, cat_cols = _column_kinds(parquet)
+    names = parquet.schema_arrow.names
+    mutation_sizes = {}
+
+    def exact_summaries():
+        # Une lecture par colonne ; celle d'id_mutation sert aussi aux tailles de mutations
+        for column in names:
+            s = parquet.read(columns=[column]).to_pandas()[column]
+            if column == "id_mutation":
+                mutation_sizes[column] = _mutation_sizes(s)
+            yield _exact_column(s, column, num_cols, cat_cols)
+
+    if sketches:
+        summaries = (
+            _sketched_column(sketch, column, num_cols, cat_cols)
+            for column, sketch in sketch_parquet([path]).items()
+        )
+    else:
+        summaries = exact_summaries()
+
+    kpis = {
+        "lignes": parquet.metadata.num_rows,
+        "colonnes": len(names),
+        "colonnes_numeriques": len(num_cols),
+        "colonnes_categorielles": len(cat_cols),
+        "mutations": None,
+        "max_lignes_mutation": None,
+        "valeur_fonciere_min": None,
+        "valeur_fonciere_max": None,
+    }
+    schema, values, histograms = [], [], []
+    for summary in summaries:
+        schema.append(summary["schema"])
+        if summary["valeurs"] is not None:
+            values.append(summary["valeurs"])
+        if summary["histogramme"] is not None:
+            histograms.append(summary["histogramme"])
+        if summary["schema"]["colonne"] == "valeur_fonciere":
+            kpis["valeur_fonciere_min"] = float(summary["min"])
+            kpis["valeur_fonciere_max"] = float(summary["max"])
+
+    tables = {}
+    if "id_mutation" in names:
+        if "id_mutation" not in mutation_sizes:  # profil par sketches : tailles exactes, lecture dédiée
+            mutation_sizes["id_mutation"] = _mutation_sizes(
+                parquet.read(columns=["id_mutation"]).to_pandas()["id_mutation"])
+        sizes = mutation_sizes.pop("id_mutation")
+        kpis["mutations"] = len(sizes)
+        kpis["max_lignes_mutation"] = int(sizes.iloc[0]) if len(sizes) else None
+        tables["mutations"] = (
+            sizes.head(TOP_MUTATIONS).rename("nb_lignes").rename_axis("id_mutation").reset_index()
+        )
+
+    tables["kpis"] = pd.DataFrame([kpis]).astype({"mutations": "Int64", "max_lignes_mutation": "Int64"})
+    tables["schema"] = pd.DataFrame(schema)
+    if values:
+        tables["valeurs"] = pd.concat(values, ignore_index=True)
+    if histograms:
+        tables["histogrammes"] = pd.concat(histograms, ignore_index=True)
+    if "mutations" in tables and len(tables["mutations"]):
+        example_id = tables["mutations"]["id_mutation"].iloc[0]
+        example = pq.read_table(path, filters=[("id_mutation", "==", example_id)]).to_pandas()
+        tables["exemple_mutation"] = example.head(EXAMPLE_ROWS).reset_index(drop=True)
+    return tables
+
+
+def build_profile(path, root=None, force=False, sketches=PROFILE_SKETCHES) -> str:
+    """
+    Calcule et publie le profil d'un fichier, sauf si la version publiée
+    correspond déjà au fichier courant.
+
+    Parameters
+    ----------
+    path : str | Path
+        Fichier Parquet à profiler
+    root : str, optional
+        Dossier du profil (défaut : data/features/profile_<nom du fichier>)
+    force : bool, default=False
+        Recalcule même si la version est à jour
+    sketches : bool, default=PROFILE_SKETCHES
+        Profil approché, lu par lots (voir `compute_profile`)
+
+    Returns
+    -------
+    str
+        Version publiée
+    """
+    root = Path(root or default_root(path))
+    version = profile_version(path, sketches)
+    if not force and published_version(root) == version:
+        print(f"✅ Profil {Path(path).name} à jour (version {version})")
+        return version
+
+    tables = compute_profile(path, sketches)
+    writer = ParquetDatasetWriter(root, version)
+    for name, table in tables.items():
+        writer.write_part(table, name, compression="zstd")
+    writer.commit()
+    print(f"✅ Profil {Path(path).name} publié : {len(tables)} tables (version {version})")
+    return version
+
+
+def load_profile(root) -> dict:
+    """Tables du profil publié, par nom (ex. `profile["schema"]`)."""
+    return load_aggregates(root)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profil (schéma, manquants, cardinalités, distributions) d'un Parquet.")
+    parser.add_argument("paths", nargs="*", default=["data/parquet/optimized_2020.parquet"])
+    parser.add_argument("--root", help="Défaut : data/features/profile_<nom du fichier>")
+    parser.add_argument("--force", action="store_true", help="Recalcule même si la version est à jour")
+    parser.add_argument("--sketches", action="store_true", default=PROFILE_SKETCHES,
+                        help="Profil approché lu par lots (défaut : PROFILE_SKETCHES=1)")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        build_profile(path, args.root, args.force, args.sketches)
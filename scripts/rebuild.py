@@ -0,0 +1,214 @@
+import os
+import sys
+import json
+import hashlib
+import argparse
+from pathlib import Path
+
+import pandas as pd
+import requests
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+from scripts.dl_csvs import (  # noqa: E402
+    DVF_BASE_URL, build_urls, convert_to_parquet, download_file, partition_year, raw_sha256,
+)
+from scripts.io_utils import load_manifest, sha256_file, update_manifest  # noqa: E402
+from scripts.build_prod_datasets import finalize_prod_datasets, run_departements  # noqa: E402
+
+# Reconstruction incrémentale : chaque étape consigne l'empreinte (SHA-256)
+# de ses entrées et du code qui la produit ; seules les étapes, années et
+# départements dont l'empreinte a changé sont recalculés.
+#
+#   brut (csv.gz) → full_YYYY.parquet → annee=YYYY/code_departement=XX
+#                 → appartements par département → data/prod (modèle / streamlit)
+STAGE_CODE = {
+    "parquet": ["scripts/dl_csvs.py", "scripts/dvf_schema.py"],
+    "partition": ["scripts/dl_csvs.py", "scripts/dvf_schema.py"],
+    "clean": ["scripts/clean_appartements.py", "scripts/build_prod_datasets.py", "scripts/io_utils.py"],
+    "prod": ["scripts/build_prod_datasets.py", "scripts/io_utils.py"],
+}
+PIPELINE_MANIFEST = "data/pipeline_manifest.json"
+
+
+def fingerprint(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+def code_fingerprint(stage: str) -> str:
+    return fingerprint(*[sha256_file(PROJECT_ROOT / path).hexdigest() for path in STAGE_CODE[stage]])
+
+
+def raw_fingerprint(raw_path: Path) -> str:
+    """SHA-256 du fichier brut, repris du manifeste de téléchargement s'il est à jour."""
+    return raw_sha256(raw_path)
+
+
+def departement_fingerprints(dataset_dir: Path, year: int) -> dict:
+    """Empreinte du contenu de chaque partition département d'une année."""
+    year_dir = dataset_dir / f"annee={year}"
+    return {
+        part_dir.name.split("=", 1)[1]: fingerprint(*[
+            (path.name, sha256_file(path).hexdigest()) for path in sorted(part_dir.glob("*.parquet"))
+        ])
+        for part_dir in sorted(p for p in year_dir.iterdir() if p.is_dir() and "=" in p.name)
+    }
+
+
+def remote_changed(url: str, raw_path: Path) -> bool:
+    """Requête HEAD conditionnelle : le fichier publié a-t-il changé ?"""
+    entry = load_manifest(str(raw_path.parent / "manifest.json")).get(raw_path.name, {})
+    if not (raw_path.exists() and entry.get("complete")):
+        return True
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    r = requests.head(url, headers=headers, allow_redirects=True, timeout=30)
+    if r.status_code == 304:
+        return False
+    r.raise_for_status()
+    return not (entry.get("etag") and r.headers.get("ETag") == entry["etag"])
+
+
+class Rebuild:
+    """
+    Plan et exécution de la reconstruction d'une année.
+
+    Le manifeste (`data/pipeline_manifest.json`) garde, par année, l'empreinte
+    des entrées de chaque étape :
+    {"2020": {"parquet": ..., "partition": ..., "clean": {"75": ...}, "prod": ...}}
+    """
+
+    def __init__(self, year, raw_dir="data/raw", parquet_dir="data/parquet", dataset_dir="data/parquet/dvf",
+                 processed_dir="data/processed/departements", prod_dir="data/prod",
+                 manifest_path=PIPELINE_MANIFEST, dry_run=False):
+        self.year = int(year)
+        self.raw_path = Path(raw_dir) / f"full_{self.year}.csv.gz"
+        self.parquet_path = Path(parquet_dir) / f"full_{self.year}.parquet"
+        self.dataset_dir = Path(dataset_dir)
+        self.cache_dir = Path(processed_dir) / f"annee={self.year}"
+        self.prod_dir = Path(prod_dir)
+        self.manifest_path = str(manifest_path)
+        self.dry_run = dry_run
+        self.state = load_manifest(self.manifest_path).get(str(self.year), {})
+
+    def _save(self):
+        if not self.dry_run:
+            Path(self.manifest_path).parent.mkdir(parents=True, exist_ok=True)
+            update_manifest(self.manifest_path, str(self.year), self.state)
+
+    def _report(self, stage, stale, detail=""):
+        if stale:
+            verb = "à reconstruire" if self.dry_run else "reconstruction"
+            print(f"   🔄 {stage} : {verb}{f' ({detail})' if detail else ''}")
+        else:
+            print(f"   ✅ {stage} : à jour")
+
+    def cache_path(self, dep: str) -> Path:
+        return self.cache_dir / f"code_departement={dep}.parquet"
+
+    def run(self, workers=None, memory_budget_mb=1024, raw_changed=False):
+        print(f"📅 {self.year}{' (simulation)' if self.dry_run else ''}")
+        if not self.raw_path.exists():
+            if self.dry_run:
+                # Rien à hacher : le fichier serait téléchargé (--download), puis tout reconstruit
+                print(f"   🔄 téléchargement : à faire ({self.raw_path} absent)")
+                return self._report_downstream()
+            raise FileNotFoundError(f"Fichier brut absent : {self.raw_path}")
+
+        # Étape 1 : brut → Parquet annuel
+        key = fingerprint(raw_fingerprint(self.raw_path), code_fingerprint("parquet"))
+        stale = raw_changed or self.state.get("parquet") != key or not self.parquet_path.exists()
+        self._report("parquet", stale, "fichier brut ou conversion modifiés")
+        if stale:
+            if self.dry_run:
+                return self._report_downstream()
+            self.parquet_path.unlink(missing_ok=True)
+            convert_to_parquet(str(self.raw_path), str(self.parquet_path.parent))
+            self.state["parquet"] = key
+            self._save()
+
+        # Étape 2 : Parquet annuel → partitions département
+        key = fingerprint(sha256_file(self.parquet_path).hexdigest(), code_fingerprint("partition"))
+        year_dir = self.dataset_dir / f"annee={self.year}"
+        stale = self.state.get("partition") != key or not year_dir.exists()
+        self._report("partitions", stale, "Parquet annuel modifié")
+        if stale:
+            if self.dry_run:
+                return self._report_downstream()
+            partition_year(self.parquet_path, self.dataset_dir, self.year)
+            self.state["partition"] = key
+            self._save()
+
+        # Étape 3 : nettoyage des seuls départements modifiés
+        code = code_fingerprint("clean")
+        keys = {dep: fingerprint(h, code) for dep, h in departement_fingerprints(self.dataset_dir, self.year).items()}
+        clean = self.state.get("clean", {})
+        stale_deps = sorted(dep for dep, k in keys.items() if clean.get(dep) != k or not self.cache_path(dep).exists())
+        removed = sorted(set(clean) - set(keys))
+        self._report("départements", stale_deps or removed,
+                     f"{len(stale_deps)}/{len(keys)} : {' '.join(stale_deps)}"
+                     + (f" ; supprimés : {' '.join(removed)}" if removed else ""))
+        if (stale_deps or removed) and not self.dry_run:
+            for dep in removed:
+                self.cache_path(dep).unlink(missing_ok=True)
+                clean.pop(dep)
+            if stale_deps:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                parts = run_departements(self.dataset_dir, self.year, workers or os.cpu_count(),
+                                         memory_budget_mb, departements=stale_deps)
+                for dep, part in parts.items():
+                    tmp_path = self.cache_path(dep).with_suffix(".tmp")
+                    part.to_parquet(tmp_path, engine="pyarrow", index=False)
+                    os.replace(tmp_path, self.cache_path(dep))
+                    clean[dep] = keys[dep]
+            self.state["clean"] = clean
+            self._save()
+
+        # Étape 4 : assemblage des datasets de production
+        key = fingerprint(sorted(keys.values()), code_fingerprint("prod"))
+        outputs = [self.prod_dir / f"df_model_appart_{self.year}.parquet.gz",
+                   self.prod_dir / f"df_streamlit_appart_{self.year}.parquet.gz"]
+        stale = self.state.get("prod") != key or not all(p.exists() for p in outputs)
+        self._report("datasets prod", stale)
+        if stale and not self.dry_run:
+            parts = {dep: pd.read_parquet(self.cache_path(dep)) for dep in keys}
+            finalize_prod_datasets(parts, self.year, self.prod_dir)
+            self.state["prod"] = key
+            self._save()
+
+    def _report_downstream(self):
+        print("   🔄 étapes suivantes : à reconstruire (départements déterminés après partitionnement)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstruction incrémentale des datasets DVF.")
+    parser.add_argument("--years", nargs="+", type=int, default=[2020])
+    parser.add_argument("--download", action="store_true",
+                        help="Revalide d'abord les fichiers publiés (requêtes conditionnelles)")
+    parser.add_argument("--base-url", default=DVF_BASE_URL)
+    parser.add_argument("--raw-dir", default="./data/raw")
+    parser.add_argument("--parquet-dir", default="./data/parquet")
+    parser.add_argument("--dataset-dir", default="./data/parquet/dvf")
+    parser.add_argument("--processed-dir", default="./data/processed/departements")
+    parser.add_argument("--prod-dir", default="./data/prod")
+    parser.add_argument("--manifest", default=PIPELINE_MANIFEST)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--memory-budget-mb", type=int, default=1024)
+    parser.add_argument("--dry-run", action="store_true", help="Affiche ce qui serait reconstruit, sans rien écrire")
+    args = parser.parse_args()
+
+    urls = {year: url for year, url in zip(args.years, build_urls(args.years, args.base_url))}
+    for year in args.years:
+        raw_changed = False
+        if args.download:
+            raw_path = Path(args.raw_dir) / f"full_{year}.csv.gz"
+            if args.dry_run:
+                raw_changed = remote_changed(urls[year], raw_path)
+                print(f"🌐 {year} : fichier publié {'modifié' if raw_changed else 'inchangé'}")
+            else:
+                download_file(urls[year], args.raw_dir, raw_path.name)
+        Rebuild(year, args.raw_dir, args.parquet_dir, args.dataset_dir, args.processed_dir, args.prod_dir,
+                args.manifest, args.dry_run).run(args.workers, args.memory_budget_mb, raw_changed)
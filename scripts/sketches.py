@@ -0,0 +1,368 @@
+"""
+Statistiques approchées en flux : quantiles, nombre de valeurs distinctes et
+modalités les plus fréquentes, alimentées lot par lot (ex. `iter_batches`
+d'un Parquet) sans garder la colonne en mémoire ni la trier.
+
+Chaque sketch a une mémoire bornée par ses paramètres (pas par le nombre de
+lignes) et se fusionne avec `merge` : un sketch par département, par année
+ou par processus (ils sont sérialisables par pickle), fusionnés ensuite,
+donnent le même résultat qu'un sketch alimenté avec toutes les lignes, à
+l'erreur près.
+
+- `QuantileSketch` (KLL) : erreur de rang sous ~2/k (k=2000 : < 0.1 %
+  des lignes), mémoire ~3k valeurs ; min et max exacts.
+- `DistinctCounter` (HyperLogLog) : erreur relative ~1.04/sqrt(2^p)
+  (p=14 : ~0.8 %), 2^p octets.
+- `FrequentValues` (count-min + candidats) : comptages surestimés d'au plus
+  epsilon x nombre de lignes avec une probabilité 1 - delta.
+
+Exemple
+-------
+>>> sketches = sketch_parquet(["data/parquet/optimized_2020.parquet"], columns=["valeur_fonciere"])
+>>> sketches["valeur_fonciere"].quantiles.quantile([0.01, 0.5, 0.99])
+"""
+import math
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+QUANTILE_K = 2000
+HLL_PRECISION = 14
+TOP_K = 100
+CMS_EPSILON = 1e-4
+CMS_DELTA = 1e-3
+BATCH_SIZE = 256_000
+
+
+def _non_null(values) -> pd.Series:
+    s = values if isinstance(values, pd.Series) else pd.Series(values)
+    return s[s.notna()]
+
+
+def _hash64(s: pd.Series) -> np.ndarray:
+    """
+    Empreintes 64 bits des valeurs (non nulles), identiques d'un lot, d'un
+    fichier et d'un processus à l'autre : les numériques sont hachés en
+    float64 (mêmes empreintes pour Int16 et float32), le reste comme chaînes
+    (catégories hachées une fois).
+    """
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        categories = pd.util.hash_array(s.cat.categories.astype(str).to_numpy(dtype=object))
+        return categories[s.cat.codes.to_numpy()]
+    if pd.api.types.is_bool_dtype(s.dtype) or pd.api.types.is_numeric_dtype(s.dtype):
+        return pd.util.hash_array(s.to_numpy(dtype=np.float64))
+    return pd.util.hash_array(s.astype(str).to_numpy(dtype=object))
+
+
+def _bit_length(x: np.ndarray) -> np.ndarray:
+    """Nombre de bits significatifs de chaque uint64 (exact : deux moitiés de 32 bits)."""
+    hi, lo = (x >> np.uint64(32)).astype(np.float64), (x & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(hi > 0, 32 + np.frexp(hi)[1], np.frexp(lo)[1])
+
+
+class QuantileSketch:
+    """
+    Sketch de quantiles KLL : des compacteurs empilés, le niveau h gardant
+    des valeurs de poids 2^h. Un niveau plein est trié et une valeur sur deux
+    (décalage aléatoire) monte au niveau suivant ; les capacités décroissent
+    géométriquement vers les niveaux bas (facteur 2/3), ce qui borne la
+    mémoire à ~3k valeurs.
+
+    Parameters
+    ----------
+    k : int, default=QUANTILE_K
+        Capacité du niveau le plus haut (précision)
+    seed : int, optional
+        Graine des décalages de compaction
+    """
+
+    def __init__(self, k: int = QUANTILE_K, seed: int = None):
+        self.k = k
+        self.n = 0
+        self.min = np.nan
+        self.max = np.nan
+        self._levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self._levels) - 1 - level
+        return max(int(math.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def _compress(self):
+        level = 0
+        while level < len(self._levels):
+            items = self._levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self._levels):
+                    self._levels.append(np.empty(0))
+                items = np.sort(items)
+                # Nombre impair : la plus petite valeur reste à ce niveau
+                odd = len(items) % 2
+                promoted = items[odd + int(self._rng.integers(2))::2]
+                self._levels[level] = items[:odd]
+                self._levels[level + 1] = np.concatenate([self._levels[level + 1], promoted])
+            level += 1
+
+    def update(self, values) -> "QuantileSketch":
+        """Ajoute un lot de valeurs (les nulls / NaN sont ignorés)."""
+        values = _non_null(values).to_numpy(dtype=np.float64)
+        if not len(values):
+            return self
+        self.n += len(values)
+        self.min = np.nanmin([self.min, values.min()])
+        self.max = np.nanmax([self.max, values.max()])
+        self._levels[0] = np.concatenate([self._levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """Ajoute les valeurs résumées par `other` (même poids par niveau)."""
+        if not other.n:
+            return self
+        self.n += other.n
+        self.min = np.nanmin([self.min, other.min])
+        self.max = np.nanmax([self.max, other.max])
+        while len(self._levels) < len(other._levels):
+            self._levels.append(np.empty(0))
+        for level, items in enumerate(other._levels):
+            self._levels[level] = np.concatenate([self._levels[level], items])
+        self._compress()
+        return self
+
+    def weighted_items(self) -> tuple[np.ndarray, np.ndarray]:
+        """Valeurs retenues (triées) et leur poids ; la somme des poids vaut `n`."""
+        items = np.concatenate(self._levels)
+        weights = np.concatenate([np.full(len(v), 2 ** h, dtype=np.int64) for h, v in enumerate(self._levels)])
+        order = np.argsort(items, kind="stable")
+        return items[order], weights[order]
+
+    def quantile(self, q):
+        """Quantile(s) approché(s) ; q=0 et q=1 renvoient le min et le max exacts."""
+        items, weights = self.weighted_items()
+        q_arr = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        if not len(items):
+            out = np.full(len(q_arr), np.nan)
+        else:
+            ranks = np.cumsum(weights)
+            positions = np.searchsorted(ranks, q_arr * self.n, side="left")
+            out = items[np.clip(positions, 0, len(items) - 1)]
+            out = np.where(q_arr <= 0, self.min, np.where(q_arr >= 1, self.max, out))
+        return out if np.ndim(q) else float(out[0])
+
+    def rank(self, x) -> np.ndarray:
+        """Proportion approchée des valeurs <= x."""
+        items, weights = self.weighted_items()
+        ranks = np.concatenate([[0], np.cumsum(weights)])
+        return ranks[np.searchsorted(items, np.asarray(x, dtype=np.float64), side="right")] / max(self.n, 1)
+
+    def histogram(self, bins: int = 50, range: tuple = None) -> tuple[np.ndarray, np.ndarray]:
+        """Comptages approchés, comme `np.histogram(values, bins, range)`."""
+        items, weights = self.weighted_items()
+        return np.histogram(items, bins=bins, range=range, weights=weights)
+
+
+class DistinctCounter:
+    """
+    Nombre approché de valeurs distinctes (HyperLogLog).
+
+    Parameters
+    ----------
+    p : int, default=HLL_PRECISION
+        2^p registres ; erreur relative ~1.04 / sqrt(2^p)
+    """
+
+    def __init__(self, p: int = HLL_PRECISION):
+        self.p = p
+        self.registers = np.zeros(2 ** p, dtype=np.uint8)
+
+    def update(self, values) -> "DistinctCounter":
+        s = _non_null(values)
+        if not len(s):
+            return self
+        hashes = _hash64(s)
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = hashes << np.uint64(self.p)
+        rho = np.minimum(64 - _bit_length(rest) + 1, 64 - self.p + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rho)
+        return self
+
+    def merge(self, other: "DistinctCounter") -> "DistinctCounter":
+        if other.p != self.p:
+            raise ValueError(f"Précisions différentes : {self.p} != {other.p}")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        # Petites cardinalités : comptage linéaire des registres vides
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class FrequentValues:
+    """
+    Modalités les plus fréquentes : comptages dans un count-min sketch et
+    liste bornée de candidats (les `capacity` meilleures estimations).
+
+    Parameters
+    ----------
+    top_k : int, default=TOP_K
+        Nombre de modalités renvoyées par `top`
+    epsilon, delta : float
+        Surestimation d'au plus epsilon x n avec une probabilité 1 - delta
+    """
+
+    def __init__(self, top_k: int = TOP_K, epsilon: float = CMS_EPSILON, delta: float = CMS_DELTA):
+        self.top_k = top_k
+        self.width = int(math.ceil(math.e / epsilon))
+        self.depth = int(math.ceil(math.log(1 / delta)))
+        self.table = np.zeros((self.depth, self.width), dtype=np.int64)
+        self.n = 0
+        self.candidates = {}  # valeur -> empreinte 64 bits
+        self.capacity = 2 * top_k
+
+    def _buckets(self, hashes: np.ndarray) -> np.ndarray:
+        # Double hachage : h1 + i * h2 (mod largeur) pour chaque ligne
+        h1 = (hashes & np.uint64(0xFFFFFFFF)).astype(np.int64)
+        h2 = (hashes >> np.uint64(32)).astype(np.int64) | 1
+        rows = np.arange(self.depth, dtype=np.int64)[:, None]
+        return (h1[None, :] + rows * h2[None, :]) % self.width
+
+    def _estimate(self, hashes: np.ndarray) -> np.ndarray:
+        buckets = self._buckets(hashes)
+        return self.table[np.arange(self.depth)[:, None], buckets].min(axis=0)
+
+    def _keep_top(self, candidates: dict):
+        keys = list(candidates)
+        hashes = np.fromiter(candidates.values(), dtype=np.uint64, count=len(keys))
+        estimates = self._estimate(hashes)
+        best = np.argsort(-estimates, kind="stable")[:self.capacity]
+        self.candidates = {keys[i]: hashes[i] for i in best}
+
+    def update(self, values) -> "FrequentValues":
+        s = _non_null(values)
+        if not len(s):
+            return self
+        counts = s.value_counts(sort=False)
+        counts = counts[counts > 0]  # catégories absentes du lot
+        keys = counts.index.astype(str) if isinstance(s.dtype, pd.CategoricalDtype) else counts.index
+        hashes = _hash64(pd.Series(keys))
+        buckets = self._buckets(hashes)
+        for row in range(self.depth):
+            np.add.at(self.table[row], buckets[row], counts.to_numpy(dtype=np.int64))
+        self.n += len(s)
+        candidates = dict(self.candidates)
+        candidates.update(zip(keys.tolist(), hashes))
+        self._keep_top(candidates)
+        return self
+
+    def merge(self, other: "FrequentValues") -> "FrequentValues":
+        if other.table.shape != self.table.shape:
+            raise ValueError("Count-min sketches de dimensions différentes")
+        self.table += other.table
+        self.n += other.n
+        self._keep_top({**self.candidates, **other.candidates})
+        return self
+
+    def top(self, k: int = None) -> pd.DataFrame:
+        """Modalités (valeur, nb_lignes estimé), des plus fréquentes aux moins fréquentes."""
+        keys = list(self.candidates)
+        estimates = self._estimate(np.fromiter(self.candidates.values(), dtype=np.uint64, count=len(keys)))
+        order = np.argsort(-estimates, kind="stable")[:k or self.top_k]
+        return pd.DataFrame({"valeur": [keys[i] for i in order], "nb_lignes": estimates[order]})
+
+
+class ColumnSketch:
+    """
+    Résumé d'une colonne : lignes, nulls, distincts, et quantiles (colonnes
+    numériques) ou modalités fréquentes (autres colonnes).
+    """
+
+    def __init__(self, dtype, k: int = QUANTILE_K, p: int = HLL_PRECISION,
+                 top_k: int = TOP_K, epsilon: float = CMS_EPSILON, delta: float = CMS_DELTA):
+        self.dtype = str(dtype)
+        numeric = (pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+                   and not isinstance(dtype, pd.CategoricalDtype))
+        self.n = 0
+        self.nulls = 0
+        self.distinct = DistinctCounter(p)
+        self.quantiles = QuantileSketch(k) if numeric else None
+        self.frequent = None if numeric else FrequentValues(top_k, epsilon, delta)
+
+    def update(self, s: pd.Series) -> "ColumnSketch":
+        self.n += len(s)
+        self.nulls += int(s.isna().sum())
+        self.distinct.update(s)
+        if self.quantiles is not None:
+            self.quantiles.update(s)
+        else:
+            self.frequent.update(s)
+        return self
+
+    def merge(self, other: "ColumnSketch") -> "ColumnSketch":
+        self.n += other.n
+        self.nulls += other.nulls
+        self.distinct.merge(other.distinct)
+        if self.quantiles is not None:
+            self.quantiles.merge(other.quantiles)
+        else:
+            self.frequent.merge(other.frequent)
+        return self
+
+
+def sketch_parquet(paths, columns=None, batch_size: int = BATCH_SIZE, **params) -> dict:
+    """
+    Sketches des colonnes d'un ou plusieurs fichiers Parquet, lus par lots.
+
+    Parameters
+    ----------
+    paths : list[str | Path]
+        Fichiers Parquet (mêmes colonnes), ex. plusieurs années
+    columns : list[str], optional
+        Colonnes à résumer (toutes par défaut)
+    batch_size : int, default=BATCH_SIZE
+        Lignes par lot : la mémoire est celle d'un lot et des sketches
+    **params
+        Paramètres de `ColumnSketch` (k, p, top_k, epsilon, delta)
+
+    Returns
+    -------
+    dict[str, ColumnSketch]
+        Un sketch par colonne, fusionnable avec ceux d'autres fichiers
+    """
+    sketches = {}
+    for path in paths:
+        parquet = pq.ParquetFile(path)
+        names = columns or parquet.schema_arrow.names
+        dtypes = parquet.schema_arrow.empty_table().select(names).to_pandas().dtypes
+        for name in names:
+            sketches.setdefault(name, ColumnSketch(dtypes[name], **params))
+        for batch in parquet.iter_batches(batch_size=batch_size, columns=names):
+            df = batch.to_pandas()
+            for name in names:
+                sketches[name].update(df[name])
+    return sketches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quantiles et distincts approchés de colonnes Parquet, lus par lots.")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--columns", nargs="+")
+    parser.add_argument("--k", type=int, default=QUANTILE_K, help="Précision des quantiles (erreur de rang < 2/k)")
+    parser.add_argument("--p", type=int, default=HLL_PRECISION, help="Précision HyperLogLog (2^p registres)")
+    args = parser.parse_args()
+
+    sketches = sketch_parquet([Path(p) for p in args.paths], args.columns, k=args.k, p=args.p)
+    for name, sketch in sketches.items():
+        line = f"{name:<32} lignes={sketch.n:,} nulls={sketch.nulls:,} distincts≈{sketch.distinct.count():,}"
+        if sketch.quantiles is not None and sketch.quantiles.n:
+            q01, q50, q99 = sketch.quantiles.quantile([0.01, 0.5, 0.99])
+            line += f" q01≈{q01:.4g} médiane≈{q50:.4g} q99≈{q99:.4g}"
+        print(line.replace(",", " "))
@@ -0,0 +1,321 @@
+"""
+Accès aux fichiers Parquet des pages Streamlit.
+
+Les pages ne lisent que les colonnes dont elles ont besoin et poussent leurs
+filtres jusqu'à pyarrow (statistiques des row groups, pas de DataFrame
+complet intermédiaire). Les résultats sont gardés dans un cache LRU unique
+pour tout le processus, borné en mémoire et indexé par (fichier, colonnes,
+filtres, préparation, mtime du fichier) : toutes les sessions et toutes les
+pages partagent la même copie, rechargée si le fichier change.
+
+Chaque résultat est aussi écrit une fois en Arrow IPC dans
+`STREAMLIT_ARROW_CACHE_DIR`, puis relu par memory-map : les colonnes du
+DataFrame sont des vues sur le fichier mappé (page cache du système), que
+tous les processus Streamlit de la machine partagent sans copie. Seules les
+colonnes qui ne peuvent pas être des vues (booléens, entiers nullables)
+occupent de la mémoire privée. Les chaînes sont des vues de type `str`
+(pyarrow, valeurs manquantes NaN) quelle que soit la version de pandas :
+pandas 2 en ferait sinon des colonnes object, copiées dans chaque processus. Le dossier est borné par
+`STREAMLIT_ARROW_CACHE_MAX_MB` (éviction des fichiers les moins récemment
+utilisés) ; une valeur vide de `STREAMLIT_ARROW_CACHE_DIR` désactive le
+memory-map.
+
+Les DataFrames renvoyés sont partagés : les pages ne doivent pas les modifier
+en place (les colonnes dérivées passent par `prepare`).
+
+Exemple
+-------
+>>> df = read_parquet(
+...     "data/parquet/optimized_2020.parquet",
+...     columns=["id_mutation", "valeur_fonciere", "surface_reelle_bati"],
+...     filters=[("nature_mutation", "==", "Vente"), ("surface_reelle_bati", ">", 0)],
+... )
+"""
+import os
+import sys
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from scripts.io_utils import atomic_path  # noqa: E402
+
+# Mémoire privée maximale du cache du processus (Mo)
+CACHE_MAX_MB = float(os.getenv("STREAMLIT_CACHE_MAX_MB", "1024"))
+# Fichiers Arrow IPC partagés entre processus (memory-map)
+ARROW_CACHE_DIR = os.getenv("STREAMLIT_ARROW_CACHE_DIR", "data/cache/arrow")
+ARROW_CACHE_MAX_MB = float(os.getenv("STREAMLIT_ARROW_CACHE_MAX_MB", "4096"))
+# Chaînes des vues memory-mappées : le type `str` de pandas 3, aussi sous pandas 2
+STRING_DTYPE = pd.StringDtype("pyarrow", na_value=np.nan)
+
+
+def _freeze(value):
+    """Filtres pyarrow (listes de tuples, listes de valeurs) → clé hashable."""
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class SharedLRUCache:
+    """
+    Cache LRU thread-safe borné par la mémoire privée des DataFrames.
+
+    Un chargement en cours bloque les autres demandes de la même clé (une
+    seule lecture par fichier), sans bloquer les autres clés.
+    """
+
+    def __init__(self, max_bytes: float):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # clé -> (DataFrame, taille en octets)
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._loading = {}
+
+    def get_or_load(self, key, load):
+        """`load()` renvoie (DataFrame, mémoire privée en octets)."""
+        with self._lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return self.entries[key][0]
+                self.misses += 1
+            try:
+                df, size = load()
+                self._store(key, df, size)
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+        return df
+
+    def _store(self, key, df: pd.DataFrame, size: int):
+        with self._lock:
+            # Une autre version du même fichier / de la même requête est périmée
+            for stale in [k for k in self.entries if k[:-1] == key[:-1]]:
+                self.nbytes -= self.entries.pop(stale)[1]
+            if size > self.max_bytes:
+                return
+            self.entries[key] = (df, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                self.nbytes -= self.entries.popitem(last=False)[1][1]
+
+    def info(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self.entries),
+                "mb": round(self.nbytes / 1e6, 1),
+                "max_mb": round(self.max_bytes / 1e6, 1),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+
+_cache = SharedLRUCache(CACHE_MAX_MB * 1e6)
+
+
+# -------------------------------------------------------------------
+# Arrow IPC memory-mappé
+# -------------------------------------------------------------------
+def _mmap_friendly(table: pa.Table) -> pa.Table:
+    """
+    Table sur disque convertible en vues pandas sans copie : un seul chunk
+    par colonne, chaînes en large_string (le type des chaînes pandas) et
+    flottants numpy sans nulls (NaN, comme le ferait `to_pandas`).
+    """
+    table = table.unify_dictionaries().combine_chunks()
+    targets = table.schema.empty_table().to_pandas().dtypes
+    fields, columns = [], []
+    for field, column in zip(table.schema, table.columns):
+        if pa.types.is_string(field.type):
+            field, column = field.with_type(pa.large_string()), column.cast(pa.large_string())
+        elif pa.types.is_floating(field.type) and column.null_count and isinstance(targets[field.name], np.dtype):
+            column = pc.fill_null(column, pa.scalar(np.nan, field.type))
+        fields.append(field)
+        columns.append(column)
+    return pa.Table.from_arrays(columns, schema=pa.schema(fields, metadata=table.schema.metadata))
+
+
+def _string_view(column: pa.ChunkedArray, dtype: pd.StringDtype):
+    """Chaînes pandas adossées aux buffers Arrow de `column`, sans copie."""
+    array_type = dtype.construct_array_type()
+    try:
+        return array_type(column, dtype=dtype)
+    except TypeError:  # pandas 2 : la sémantique NaN est portée par la classe
+        return array_type(column)
+
+
+def arrow_to_pandas(table: pa.Table) -> tuple[pd.DataFrame, int]:
+    """
+    DataFrame dont les colonnes sont, autant que possible, des vues sur les
+    buffers Arrow (numériques et dates sans nulls, chaînes, codes des
+    catégories) ; les autres colonnes passent par `to_pandas`. Les types
+    sont ceux de `to_pandas` (métadonnées pandas du schéma comprises), sauf
+    les chaînes : toujours `str` (STRING_DTYPE), y compris sous pandas 2.
+
+    Returns
+    -------
+    tuple[pd.DataFrame, int]
+        DataFrame et mémoire privée des colonnes copiées (octets)
+    """
+    targets = table.schema.empty_table().to_pandas().dtypes
+    columns, copied = {}, []
+    for name, column in zip(table.column_names, table.columns):
+        dtype = targets[name]
+        array = column.chunk(0) if column.num_chunks == 1 else None
+        if array is None:
+            copied.append(name)
+        elif (isinstance(dtype, np.dtype) and dtype.kind in "iufM" and array.null_count == 0
+              and array.type.to_pandas_dtype() == dtype):
+            columns[name] = array.to_numpy(zero_copy_only=True)
+        elif pa.types.is_large_string(array.type) and (
+                dtype == object or (isinstance(dtype, pd.StringDtype) and dtype.storage == "pyarrow")):
+            columns[name] = _string_view(column, dtype if dtype != object else STRING_DTYPE)
+        elif isinstance(dtype, pd.CategoricalDtype) and pa.types.is_dictionary(array.type) and array.null_count == 0:
+            columns[name] = pd.Categorical.from_codes(
+                array.indices.to_numpy(zero_copy_only=True),
+                categories=array.dictionary.to_pandas(),
+                ordered=array.type.ordered,
+                validate=False,
+            )
+        else:
+            copied.append(name)
+
+    private = 0
+    if copied:
+        converted = table.select(copied).to_pandas()
+        columns.update({name: converted[name] for name in copied})
+        private = int(converted.memory_usage(deep=True, index=False).sum())
+    df = pd.DataFrame({name: columns[name] for name in table.column_names}, copy=False)
+    return df, private
+
+
+def _arrow_path(key) -> Path:
+    return Path(ARROW_CACHE_DIR) / f"{hashlib.sha256(repr(key).encode()).hexdigest()[:24]}.arrow"
+
+
+def _read_arrow(path: Path) -> pa.Table:
+    return pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+
+
+def _write_arrow(table: pa.Table, path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    table = _mmap_friendly(table)
+    with atomic_path(path) as tmp_path:
+        with pa.OSFile(str(tmp_path), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    _evict_arrow_files(keep=path)
+
+
+def _evict_arrow_files(keep: Path):
+    """Supprime les fichiers les moins récemment utilisés au-delà du budget."""
+    files = []
+    for path in Path(ARROW_CACHE_DIR).glob("*.arrow"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:  # supprimé entre-temps par un autre processus
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= ARROW_CACHE_MAX_MB * 1e6:
+            break
+        if path == keep:
+            continue
+        try:
+            # Les processus qui l'ont déjà mappé gardent leur vue (POSIX)
+            path.unlink()
+            total -= size
+        except OSError:
+            pass
+
+
+def _load_table(path: Path, columns, filters, prepare) -> pa.Table:
+    table = pq.read_table(path, columns=columns, filters=filters)
+    if prepare is None:
+        return table
+    return pa.Table.from_pandas(prepare(table.to_pandas()), preserve_index=False)
+
+
+# -------------------------------------------------------------------
+# API
+# -------------------------------------------------------------------
+def read_parquet(path, columns=None, filters=None, prepare=None) -> pd.DataFrame:
+    """
+    Lit un Parquet (colonnes et filtres poussés à pyarrow) via le cache partagé.
+
+    Parameters
+    ----------
+    path : str | Path
+        Fichier Parquet
+    columns : list[str], optional
+        Colonnes à charger ; celles absentes du fichier sont ignorées
+    filters : list[tuple], optional
+        Filtres pyarrow, ex. [("nature_mutation", "==", "Vente")]
+    prepare : callable, optional
+        Fonction appliquée une fois au DataFrame lu (colonnes dérivées) ;
+        son résultat est mis en cache à la place du DataFrame brut
+
+    Returns
+    -------
+    pd.DataFrame
+        DataFrame partagé, à ne pas modifier en place
+    """
+    path = Path(path)
+    if columns is not None:
+        available = set(pq.read_schema(path).names)
+        columns = [c for c in columns if c in available]
+    prepare_key = f"{prepare.__module__}.{prepare.__qualname__}" if prepare else None
+    key = (str(path.resolve()), _freeze(columns), _freeze(filters), prepare_key, os.path.getmtime(path))
+
+    def load():
+        if not ARROW_CACHE_DIR:
+            df = _load_table(path, columns, filters, prepare).to_pandas()
+            return df, int(df.memory_usage(deep=True).sum())
+        arrow_path = _arrow_path(key)
+        # Lecture d'abord : le fichier peut être évincé par un autre processus
+        # à tout moment (une fois mappé, il reste lisible même supprimé).
+        try:
+            os.utime(arrow_path)  # récence pour l'éviction
+            return arrow_to_pandas(_read_arrow(arrow_path))
+        except FileNotFoundError:
+            table = _load_table(path, columns, filters, prepare)
+            _write_arrow(table, arrow_path)
+        try:
+            return arrow_to_pandas(_read_arrow(arrow_path))
+        except FileNotFoundError:  # déjà réévincé : copie privée, comme sans cache disque
+            df = table.to_pandas()
+            return df, int(df.memory_usage(deep=True).sum())
+
+    return _cache.get_or_load(key, load)
+
+
+def cache_info() -> dict:
+    """Entrées, mémoire privée occupée et compteurs du cache du processus."""
+    return _cache.info()
+
+
+def clear_cache():
+    _cache.clear()
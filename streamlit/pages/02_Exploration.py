@@ -3,15 +3,23 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import plotly.express as px
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.profile_dataset import build_profile, default_root, load_profile, profile_version  # noqa: E402
 
 st.set_page_config(page_title="Exploration naïve — DVF", layout="wide")
 
 # =========================
 # Helpers
 # =========================
-@st.cache_data
-def load_parquet(path: str) -> pd.DataFrame:
-    return pd.read_parquet(path)
+# Profil partagé entre sessions, calculé une fois par version du fichier
+# (scripts/profile_dataset.py) : la page ne relit plus le dataset complet
+@st.cache_resource(show_spinner="Profil du dataset (une fois par version du fichier)…")
+def load_profile_tables(path: str, version: str) -> dict:
+    build_profile(path)  # sans effet si le profil publié est à jour
+    return load_profile(default_root(path))
 
 def format_int(n: int) -> str:
     return f"{n:,}".replace(",", " ")
@@ -19,20 +27,15 @@ def format_int(n: int) -> str:
 def memory_mb(df: pd.DataFrame) -> float:
     return float(df.memory_usage(deep=True).sum() / 1e6)
 
-def top_missing(df: pd.DataFrame, k: int = 20) -> pd.DataFrame:
-    s = df.isna().mean().sort_values(ascending=False) * 100
-    out = s.head(k).round(2).reset_index()
-    out.columns = ["colonne", "taux_manquant_%"]
-    return out
-
-def df_schema(df: pd.DataFrame) -> pd.DataFrame:
-    out = pd.DataFrame({
-        "colonne": df.columns,
-        "type": df.dtypes.astype(str),
-        "taux_manquant_%": (df.isna().mean() * 100).round(2),
-        "nb_uniques": df.nunique(dropna=True).values
-    })
-    return out
+def top_missing(schema: pd.DataFrame, k: int = 20) -> pd.DataFrame:
+    out = schema.sort_values("taux_manquant_%", ascending=False).head(k)
+    return out[["colonne", "taux_manquant_%"]].reset_index(drop=True)
+
+def value_counts(profile: dict, col: str) -> pd.DataFrame:
+    # Modalités d'une colonne catégorielle, NaN affiché comme une modalité
+    vc = profile["valeurs"]
+    vc = vc[vc["colonne"] == col]
+    return pd.DataFrame({col: vc["valeur"].fillna("NaN").to_numpy(), "count": vc["nb_lignes"].to_numpy()})
 
 def safe_sample(df: pd.DataFrame, n: int, seed: int = 42) -> pd.DataFrame:
     if len(df) <= n:
@@ -55,7 +58,7 @@ sample_n = st.sidebar.slider(
 # Load data
 # =========================
 try:
-    df = load_parquet(data_path)
+    profile = load_profile_tables(data_path, profile_version(data_path))
 except Exception as e:
     st.error(f"Impossible de charger le fichier : {data_path}\n\nErreur : {e}")
     st.stop()
@@ -80,38 +83,30 @@ st.divider()
 with tab1:
     st.header("1) Vue d’ensemble")
 
-    # Colonnes numériques / catégorielles
-    num_cols = df.select_dtypes(include=["number"]).columns.tolist()
-    cat_cols = df.select_dtypes(include=["object", "bool", "category"]).columns.tolist()
+    # KPIs précalculés (scripts/profile_dataset.py)
+    kpis = profile["kpis"].iloc[0]
 
-    # Mutations
-    nb_mutations = df["id_mutation"].nunique() if "id_mutation" in df.columns else None
+    def kpi(name: str):
+        return None if pd.isna(kpis[name]) else kpis[name]
 
-    # Valeur foncière min/max
-    vf_min, vf_max = None, None
-    if "valeur_fonciere" in df.columns:
-        vf_min = df["valeur_fonciere"].min(skipna=True)
-        vf_max = df["valeur_fonciere"].max(skipna=True)
-
-    # Max lignes par mutation
-    max_lines_per_mut = None
-    if "id_mutation" in df.columns:
-        max_lines_per_mut = df.groupby("id_mutation").size().max()
+    nb_mutations = kpi("mutations")
+    vf_min, vf_max = kpi("valeur_fonciere_min"), kpi("valeur_fonciere_max")
+    max_lines_per_mut = kpi("max_lignes_mutation")
 
     # Affichage KPI
     k1, k2, k3, k4 = st.columns(4)
     with k1:
-        st.metric("Lignes", format_int(df.shape[0]))
+        st.metric("Lignes", format_int(int(kpis["lignes"])))
     with k2:
-        st.metric("Colonnes", format_int(df.shape[1]))
+        st.metric("Colonnes", format_int(int(kpis["colonnes"])))
     with k3:
-        st.metric("Colonnes numériques", format_int(len(num_cols)))
+        st.metric("Colonnes numériques", format_int(int(kpis["colonnes_numeriques"])))
     with k4:
-        st.metric("Colonnes catégorielles", format_int(len(cat_cols)))
+        st.metric("Colonnes catégorielles", format_int(int(kpis["colonnes_categorielles"])))
 
     k5, k6, k7, k8 = st.columns(4)
     with k5:
-        st.metric("Mutations uniques", format_int(nb_mutations) if nb_mutations is not None else "—")
+        st.metric("Mutations uniques", format_int(int(nb_mutations)) if nb_mutations is not None else "—")
     with k6:
         st.metric(
             "Valeur foncière min",
@@ -142,13 +137,15 @@ with tab1:
         DVF décrit des **mutations** (transactions) pouvant comporter plusieurs lignes (lots, dépendances, parcelles…).
         """
     )
-    if max_lines_per_mut is not None:
+    if max_lines_per_mut is not None and "exemple_mutation" in profile:
         with st.expander("Voir un exemple de mutation avec beaucoup de lignes"):
-            # On récupère un id_mutation qui atteint le max (ou proche)
-            sizes = df.groupby("id_mutation").size()
-            example_id = sizes.sort_values(ascending=False).index[0]
-            st.write(f"Exemple id_mutation : **{example_id}** (nb lignes = {int(sizes.loc[example_id])})")
-            st.dataframe(df[df["id_mutation"] == example_id].head(30), width="stretch")
+            # id_mutation qui atteint le max, lignes extraites par le profil
+            sizes = profile["mutations"]
+            example_id, example_size = sizes.iloc[0]
+            st.write(f"Exemple id_mutation : **{example_id}** (nb lignes = {int(example_size)})")
+            st.dataframe(profile["exemple_mutation"], width="stretch")
+            st.markdown(f"**Top {len(sizes)} des mutations par nombre de lignes**")
+            st.dataframe(sizes, width="stretch")
 
 
 # =========================
@@ -157,7 +154,7 @@ with tab1:
 with tab2:
     st.header("2) Structure des colonnes et valeurs manquantes")
 
-    schema = df_schema(df)
+    schema = profile["schema"]
 
     left, right = st.columns([1.3, 1])
     with left:
@@ -166,7 +163,7 @@ with tab2:
 
     with right:
         st.markdown("**Top colonnes les plus manquantes**")
-        st.dataframe(top_missing(df, k=20), width="stretch", height=420)
+        st.dataframe(top_missing(schema, k=20), width="stretch", height=420)
 
     st.warning(
         "À ce stade, l’objectif est uniquement descriptif : la présence de valeurs manquantes et la diversité des types "
@@ -183,19 +180,21 @@ with tab3:
     # --- 3.1 Nombre de pièces principales ---
     st.subheader("3.1) Distribution du nombre de pièces principales")
 
-    if "nombre_pieces_principales" not in df.columns:
+    hist = profile.get("histogrammes", pd.DataFrame(columns=["colonne"]))
+    hist = hist[hist["colonne"] == "nombre_pieces_principales"]
+    if hist.empty:
         st.warning("La colonne `nombre_pieces_principales` n'est pas présente dans le dataset.")
     else:
-        s = df["nombre_pieces_principales"].dropna()
-
-        # Optionnel : filtrage léger pour lisibilité (souvent 0–10)
-        s_plot = s[(s >= 0) & (s <= 10)]
+        # Une classe par nombre de pièces (histogramme précalculé) ;
+        # filtrage léger pour lisibilité (souvent 0–10)
+        s_plot = hist[(hist["x0"] >= 0) & (hist["x0"] <= 10)]
 
-        fig = px.histogram(
+        fig = px.bar(
             s_plot,
-            nbins=11,
+            x="x0",
+            y="nb_lignes",
             title="Nombre de pièces principales (0 à 10)",
-            labels={"value": "nombre_pieces_principales", "count": "Fréquence"}
+            labels={"x0": "nombre_pieces_principales", "nb_lignes": "Fréquence"}
         )
         fig.update_layout(bargap=0.05)
         st.plotly_chart(fig, width="stretch")
@@ -208,17 +207,19 @@ with tab3:
     # --- 3.2 Top 10 codes postaux ---
     st.subheader("3.2) Top 10 des départements les plus représentés")
 
-    if "code_departement" not in df.columns:
+    dep = value_counts(profile, "code_departement") if "valeurs" in profile else pd.DataFrame()
+    if dep.empty:
         st.warning("La colonne `code_departement` n'est pas présente dans le dataset.")
     else:
-        dep = df["code_departement"].dropna().astype(str)
+        dep = dep[dep["code_departement"] != "NaN"].copy()
 
         # IMPORTANT : ne pas zfill sur 3 chiffres (ex: 2A/2B n'existent pas en métropole DVF standard)
         # On garde tel quel, et on nettoie juste les ".0" si la colonne est float
-        dep = dep.str.replace(r"\.0$", "", regex=True)
+        dep["code_departement"] = dep["code_departement"].str.replace(r"\.0$", "", regex=True)
 
         top10_dep = (
-            dep.value_counts()
+            dep.groupby("code_departement", sort=False)["count"].sum()
+            .sort_values(ascending=False, kind="stable")
             .head(10)
             .reset_index()
         )
@@ -263,23 +264,17 @@ with tab4:
         """
     )
 
-    def plot_cat_percent(df: pd.DataFrame, col: str, top_k: int = 15, title: str = ""):
-        if col not in df.columns:
+    def plot_cat_percent(profile: dict, col: str, top_k: int = 15, title: str = ""):
+        counts = value_counts(profile, col) if "valeurs" in profile else pd.DataFrame()
+        if counts.empty:
             st.warning(f"La colonne `{col}` n'est pas présente dans le dataset.")
             return
 
-        s = df[col].copy()
-
-        # Normaliser l'affichage des NaN
-        s = s.astype("object")
-        s = s.where(~s.isna(), other="NaN")
-
-        # Répartition en %
-        vc = (s.value_counts(normalize=True) * 100).round(3)
-
-        # Top K modalités
-        vc_top = vc.head(top_k).reset_index()
-        vc_top.columns = [col, "pourcentage"]
+        # Répartition en % (sur toutes les lignes, NaN compris)
+        n_rows = int(profile["kpis"]["lignes"].iloc[0])
+        vc_top = counts.head(top_k).copy()
+        vc_top["pourcentage"] = (vc_top["count"] / n_rows * 100).round(3)
+        vc_top = vc_top[[col, "pourcentage"]]
 
         # Ordre décroissant (plus fréquent -> moins fréquent)
         order = vc_top.sort_values("pourcentage", ascending=False)[col].tolist()
@@ -306,14 +301,14 @@ with tab4:
         st.plotly_chart(fig, width="stretch")
 
         with st.expander(f"Afficher le détail — {col}"):
-            detail = s.value_counts(dropna=False).rename("count").reset_index().rename(columns={"index": col})
-            detail["pourcentage_%"] = (detail["count"] / detail["count"].sum() * 100).round(3)
+            detail = counts.copy()
+            detail["pourcentage_%"] = (detail["count"] / n_rows * 100).round(3)
             st.dataframe(detail, width="stretch")
 
     # --- nature_mutation ---
     st.subheader("4.1) Répartition de la nature de mutation")
     plot_cat_percent(
-        df,
+        profile,
         col="nature_mutation",
         top_k=10
     )
@@ -321,7 +316,7 @@ with tab4:
     # --- type_local ---
     st.subheader("4.2) Répartition du type de local")
     plot_cat_percent(
-        df,
+        profile,
         col="type_local",
         top_k=10
     )
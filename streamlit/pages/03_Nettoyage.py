@@ -2,8 +2,12 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.express as px
+import sys
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from data_access import read_parquet  # noqa: E402
+
 st.set_page_config(
     page_title="EDA 2 — Démarche de nettoyage (Avant / Après)",
     page_icon="🧼",
@@ -19,36 +23,39 @@ PATH_AFTER = Path("data/processed/dvf_appartements_vente_2020.parquet.gz")
 # --------------------------------------------------
 # Loaders
 # --------------------------------------------------
-@st.cache_data(show_spinner=False)
-def load_before(path: Path) -> pd.DataFrame:
-    df = pd.read_parquet(path)
-
-    cols = [
-        "id_mutation",
-        "nature_mutation",
-        "type_local",
-        "valeur_fonciere",
-        "surface_reelle_bati",
-        "latitude",
-        "longitude",
-    ]
-    cols = [c for c in cols if c in df.columns]
-    df = df[cols].copy()
-
-    # Filtrage cohérent avec l’EDA initiale
-    df = df[df["nature_mutation"] == "Vente"]
-    df = df[df["surface_reelle_bati"].fillna(0) > 0]
-
+# Lecture partagée entre sessions (data_access) : seules les colonnes utiles
+# sont lues, et les filtres sont appliqués par pyarrow pendant la lecture
+COLS_BEFORE = [
+    "id_mutation",
+    "nature_mutation",
+    "type_local",
+    "valeur_fonciere",
+    "surface_reelle_bati",
+    "latitude",
+    "longitude",
+]
+COLS_AFTER = ["id_mutation", "type_local", "valeur_fonciere", "surface_reelle_bati"]
+# surface > 0 écarte aussi les surfaces manquantes (comme fillna(0) > 0)
+FILTER_SURFACE = ("surface_reelle_bati", ">", 0)
+
+
+def add_prix_m2(df: pd.DataFrame) -> pd.DataFrame:
     df["prix_m2"] = df["valeur_fonciere"] / df["surface_reelle_bati"]
     return df
 
 
-@st.cache_data(show_spinner=False)
+def load_before(path: Path) -> pd.DataFrame:
+    # Filtrage cohérent avec l’EDA initiale
+    return read_parquet(
+        path,
+        columns=COLS_BEFORE,
+        filters=[("nature_mutation", "==", "Vente"), FILTER_SURFACE],
+        prepare=add_prix_m2,
+    )
+
+
 def load_after(path: Path) -> pd.DataFrame:
-    df = pd.read_parquet(path)
-    df = df[df["surface_reelle_bati"].fillna(0) > 0]
-    df["prix_m2"] = df["valeur_fonciere"] / df["surface_reelle_bati"]
-    return df
+    return read_parquet(path, columns=COLS_AFTER, filters=[FILTER_SURFACE], prepare=add_prix_m2)
 
 
 def kpis(df: pd.DataFrame) -> dict:
@@ -2,8 +2,14 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.express as px
+import sys
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from scripts.aggregates import compute_aggregates, dataset_version, load_aggregates, published_version  # noqa: E402
+from scripts.feature_store import load_feature_store  # noqa: E402
+from scripts.map_grid import cells_in_view, grid_level  # noqa: E402
+
 st.set_page_config(page_title="Analyse descriptive finale", page_icon="🏢", layout="wide")
 
 # -------------------------------------------------------------------
@@ -11,55 +17,50 @@ st.set_page_config(page_title="Analyse descriptive finale", page_icon="🏢", la
 # -------------------------------------------------------------------
 PATH_STREAMLIT = Path("data/prod/df_streamlit_appart_2020.parquet.gz")
 PATH_MODEL = Path("data/prod/df_model_appart_2020.parquet.gz")
+PATH_FEATURES = Path("data/features/stats_2020.parquet")  # scripts/feature_store.py
+PATH_AGGREGATES = Path("data/features/aggregates_2020")  # scripts/aggregates.py
 
 # -------------------------------------------------------------------
 # Loaders (cache)
 # -------------------------------------------------------------------
-@st.cache_data(show_spinner=False)
-def load_parquet(path: Path) -> pd.DataFrame:
-    if not path.exists():
-        return pd.DataFrame()
-    return pd.read_parquet(path)
-
-def ensure_prix_m2(df: pd.DataFrame)-> pd.DataFrame:
-    df = df.copy()
-    if "prix_m2" not in df.columns and {"valeur_fonciere", "surface_reelle_bati"}.issubset(df.columns):
-        df = df[df["surface_reelle_bati"].fillna(0) > 0]
-        df["prix_m2"] = df["valeur_fonciere"] / df["surface_reelle_bati"]
-    return df
-
-def kpis_prix(df: pd.DataFrame) -> dict:
-    out = {"rows": len(df), "cols": df.shape[1]}
-    if "id_mutation" in df.columns:
-        out["mutations"] = int(df["id_mutation"].nunique())
+# Agrégats partagés entre sessions et non copiés à chaque rerun (lecture seule)
+@st.cache_resource(show_spinner=False)
+def load_tables(version: str) -> dict:
+    # Version publiée si elle correspond aux datasets courants, sinon calcul
+    # à partir des datasets (une fois par version)
+    if published_version(PATH_AGGREGATES) == version:
+        return load_aggregates(PATH_AGGREGATES)
+    return compute_aggregates(pd.read_parquet(PATH_STREAMLIT), pd.read_parquet(PATH_MODEL))
+
+def dep_medians(aggs: dict) -> pd.DataFrame:
+    # Médianes du feature store s'il existe, sinon celles des agrégats
+    if PATH_FEATURES.exists():
+        stats = load_feature_store(PATH_FEATURES).frame("departement")
+        dep = stats.rename(columns={"prix_m2_median": "prix_m2"})[["code_departement", "prix_m2"]]
     else:
-        out["mutations"] = np.nan
-    if "prix_m2" in df.columns and len(df) > 0:
-        out["median"] = float(df["prix_m2"].median())
-        out["q25"] = float(df["prix_m2"].quantile(0.25))
-        out["q75"] = float(df["prix_m2"].quantile(0.75))
-        out["q01"] = float(df["prix_m2"].quantile(0.01))
-        out["q99"] = float(df["prix_m2"].quantile(0.99))
-    return out
+        dep = aggs["departements"][["code_departement", "prix_m2"]]
+    return dep.sort_values("prix_m2", ascending=False)
+
+def quantile(aggs: dict, q: float) -> float:
+    return float(aggs["quantiles"].set_index("q").at[round(q, 3), "prix_m2"])
 
 # -------------------------------------------------------------------
 # Page
 # -------------------------------------------------------------------
 st.title("🏢 Analyse descriptive finale")
 
-df_stream = load_parquet(PATH_STREAMLIT)
-df_model = load_parquet(PATH_MODEL)
-
-if df_stream.empty:
+if not PATH_STREAMLIT.exists():
     st.error(f"Dataset Streamlit introuvable : {PATH_STREAMLIT}")
     st.stop()
 
-if df_model.empty:
+if not PATH_MODEL.exists():
     st.error(f"Dataset Modèle introuvable : {PATH_MODEL}")
     st.stop()
 
-df_stream = ensure_prix_m2(df_stream)
-df_model = ensure_prix_m2(df_model)  # au cas où
+# Seuls les agrégats sont gardés en mémoire, pas les datasets complets
+aggs = load_tables(dataset_version(PATH_STREAMLIT, PATH_MODEL))
+kpis = aggs["kpis"].set_index("jeu")
+schemas = aggs["schemas"]
 
 # Sidebar (contrôles légers)
 st.sidebar.header("⚙️ Paramètres d'affichage")
@@ -94,33 +95,23 @@ Les contrôles suivants visent à vérifier :
 """
     )
 
-    ks = kpis_prix(df_stream)
-    km = kpis_prix(df_model)
-
-    c1, c2 = st.columns(2)
-    with c1:
-        st.markdown("#### Jeu Streamlit")
-        a1, a2, a3 = st.columns(3)
-        a1.metric("Lignes", f"{ks['rows']:,}".replace(",", " "))
-        a2.metric("Colonnes", f"{ks['cols']:,}".replace(",", " "))
-        a3.metric("Prix/m² médian", f"{ks['median']:.0f} €" if "median" in ks else "—")
-
-    with c2:
-        st.markdown("#### Jeu Modèle")
-        a1, a2, a3 = st.columns(3)
-        a1.metric("Lignes", f"{km['rows']:,}".replace(",", " "))
-        a2.metric("Colonnes", f"{km['cols']:,}".replace(",", " "))
-        a3.metric("Prix/m² médian", f"{km['median']:.0f} €" if "median" in km else "—")
+    for col, (jeu, label) in zip(st.columns(2), [("streamlit", "Jeu Streamlit"), ("modele", "Jeu Modèle")]):
+        k = kpis.loc[jeu]
+        with col:
+            st.markdown(f"#### {label}")
+            a1, a2, a3 = st.columns(3)
+            a1.metric("Lignes", f"{int(k['lignes']):,}".replace(",", " "))
+            a2.metric("Colonnes", f"{int(k['colonnes']):,}".replace(",", " "))
+            a3.metric("Prix/m² médian", f"{k['prix_m2_median']:.0f} €" if pd.notna(k["prix_m2_median"]) else "—")
 
     # Null rates sur géoloc (reprend l’esprit du notebook)
-    geo_cols = [c for c in ["latitude", "longitude"] if c in df_stream.columns]
-    if geo_cols:
-        null_rates = df_stream[geo_cols].isna().mean().mul(100).round(2).to_frame("Taux de NA (%)")
+    if len(aggs["completude"]):
+        null_rates = aggs["completude"].set_index("colonne")["taux_na"].rename("Taux de NA (%)").to_frame()
         st.markdown("#### Complétude des coordonnées")
         st.dataframe(null_rates)
 
     st.markdown("#### Aperçu (échantillon)")
-    st.dataframe(df_stream.head(30))
+    st.dataframe(aggs["apercu"])
 
 # -------------------------------------------------------------------
 # 2) Distribution prix/m²
@@ -137,30 +128,32 @@ Une approche standard consiste à **tronquer** la distribution (ex. 1%–99%) po
 """
     )
 
-    if "prix_m2" not in df_stream.columns:
+    if "quantiles" not in aggs:
         st.warning("Colonne `prix_m2` absente.")
     else:
-        ql = df_stream["prix_m2"].quantile(q_low)
-        qh = df_stream["prix_m2"].quantile(q_high)
+        ql = quantile(aggs, q_low)
+        qh = quantile(aggs, q_high)
 
         c1, c2, c3 = st.columns(3)
         c1.metric("Quantile bas", f"{ql:,.0f} €".replace(",", " "))
-        c2.metric("Médiane", f"{df_stream['prix_m2'].median():,.0f} €".replace(",", " "))
+        c2.metric("Médiane", f"{kpis.at['streamlit', 'prix_m2_median']:,.0f} €".replace(",", " "))
         c3.metric("Quantile haut", f"{qh:,.0f} €".replace(",", " "))
 
-        fig = px.histogram(
-            df_stream[(df_stream["prix_m2"] >= ql) & (df_stream["prix_m2"] <= qh)],
-            x="prix_m2",
-            nbins=90,
+        # Histogramme précalculé pour chaque couple de coupes des curseurs
+        hist = aggs["histogrammes"]
+        hist = hist[(hist["q_low"] == round(q_low, 3)) & (hist["q_high"] == round(q_high, 3))]
+        fig = px.bar(
+            x=(hist["x0"] + hist["x1"]) / 2,
+            y=hist["nb_ventes"],
+            labels={"x": "prix_m2", "y": "count"},
             title=f"Distribution du prix/m² (tronquée {int(q_low*100)}%–{int(q_high*100)}%)"
         )
-        fig.update_layout(height=420)
+        fig.update_layout(height=420, bargap=0)
         st.plotly_chart(fig, width="stretch")
 
         # Scatter rapide (surface vs prix_m2) comme dans le notebook (mais échantillonné)
-        if "surface_reelle_bati" in df_stream.columns:
-            d = df_stream.dropna(subset=["surface_reelle_bati", "prix_m2"])
-            d = d.sample(min(sample_n, len(d)), random_state=42) if len(d) > sample_n else d
+        if "surface_reelle_bati" in aggs["echantillon"].columns:
+            d = aggs["echantillon"].head(sample_n)
 
             fig = px.scatter(
                 d[(d["prix_m2"] >= ql) & (d["prix_m2"] <= qh)],
@@ -185,21 +178,15 @@ et une forte structuration spatiale des prix.
 
 Deux niveaux sont proposés :
 - agrégation par département (médiane du prix/m²),
-- visualisation cartographique (points géolocalisés).
+- visualisation cartographique : grille agrégée sur toutes les ventes
+  (niveau de détail selon le zoom) ou points géolocalisés échantillonnés.
 """
     )
 
-    needed = {"code_departement", "prix_m2"}
-    if not needed.issubset(df_stream.columns):
+    if "departements" not in aggs:
         st.warning("Colonnes requises manquantes (code_departement, prix_m2).")
     else:
-        dep = (
-            df_stream
-            .dropna(subset=["code_departement", "prix_m2"])
-            .groupby("code_departement", as_index=False)["prix_m2"]
-            .median()
-            .sort_values("prix_m2", ascending=False)
-        )
+        dep = dep_medians(aggs)
 
         top_k = st.slider("Nombre de départements à afficher", 5, 30, 15)
 
@@ -221,33 +208,86 @@ Deux niveaux sont proposés :
         )
         st.plotly_chart(fig, width="stretch")
 
+    if "communes" in aggs:
+        min_ventes = st.slider("Ventes minimum par commune", 10, 500, 50, step=10)
+        communes = aggs["communes"][aggs["communes"]["nb_ventes"] >= min_ventes]
+        st.markdown(f"#### Communes par prix/m² médian ({len(communes):,} communes)".replace(",", " "))
+        st.dataframe(
+            communes.sort_values("prix_m2", ascending=False)
+            [["nom_commune", "nb_ventes", "prix_m2", "prix_m2_q25", "prix_m2_q75"]]
+            .round(0),
+            hide_index=True,
+            height=300,
+        )
+
     # Carte (avec palette lisible + coupe quantiles)
-    if {"latitude", "longitude", "prix_m2"}.issubset(df_stream.columns):
-        dmap = df_stream.dropna(subset=["latitude", "longitude", "prix_m2"]).copy()
-
-        # keep_bbox = st.checkbox("Filtrer à une bounding box France métro (approx.)", value=True)
-        # if keep_bbox:
-        #     dmap = dmap[
-        #         (dmap["latitude"].between(41, 51.5)) &
-        #         (dmap["longitude"].between(-5.5, 9.8))
-        #     ]
-
-        dmap = dmap.sample(min(sample_n, len(dmap)), random_state=42) if len(dmap) > sample_n else dmap
-
-        ql = dmap["prix_m2"].quantile(q_low)
-        qh = dmap["prix_m2"].quantile(q_high)
-
-        fig = px.scatter_mapbox(
-            dmap,
-            lat="latitude",
-            lon="longitude",
-            color="prix_m2",
-            color_continuous_scale="Viridis",
-            range_color=[ql, qh],
-            zoom=4,
-            height=560,
-            title="Répartition spatiale des ventes (couleur = prix/m², échantillon)"
+    if "grille" in aggs:
+        map_mode = st.radio(
+            "Mode de carte",
+            ["Grille agrégée (toutes les ventes)", "Points (échantillon)"],
+            horizontal=True,
         )
+
+        if map_mode.startswith("Grille"):
+            # Palette bornée par les quantiles de toutes les ventes (comme la grille)
+            ql = quantile(aggs, q_low)
+            qh = quantile(aggs, q_high)
+            # Cellules de taille constante à l'écran : le niveau de grille suit le
+            # zoom et seules les cellules visibles sont envoyées au navigateur
+            grid = aggs["grille"]
+            centres = aggs["departements"].set_index("code_departement") if "departements" in aggs else pd.DataFrame()
+            c1, c2 = st.columns([1, 2])
+            zoom = c1.slider("Zoom", 4, 14, 5)
+            centre = c2.selectbox("Centrer sur", ["France entière", *centres.index])
+            if centre == "France entière":
+                center_lat, center_lon = 46.6, 2.4
+            else:
+                center_lat, center_lon = float(centres.at[centre, "latitude"]), float(centres.at[centre, "longitude"])
+
+            cells = cells_in_view(grid, zoom, center_lat, center_lon, height_px=560)
+            fig = px.scatter_mapbox(
+                cells,
+                lat="latitude",
+                lon="longitude",
+                color="prix_m2_median",
+                size=np.log1p(cells["nb_ventes"]),
+                size_max=9,
+                hover_data={"nb_ventes": True, "prix_m2_q25": ":.0f", "prix_m2_q75": ":.0f", "prix_m2_median": ":.0f"},
+                color_continuous_scale="Viridis",
+                range_color=[ql, qh],
+                zoom=zoom,
+                center={"lat": center_lat, "lon": center_lon},
+                height=560,
+                title=(f"Prix/m² médian par cellule (niveau {grid_level(zoom)}, {len(cells):,} cellules, "
+                       f"{int(cells['nb_ventes'].sum()):,} ventes)").replace(",", " "),
+            )
+        else:
+            dmap = aggs["echantillon"].dropna(subset=["latitude", "longitude", "prix_m2"])
+
+            # keep_bbox = st.checkbox("Filtrer à une bounding box France métro (approx.)", value=True)
+            # if keep_bbox:
+            #     dmap = dmap[
+            #         (dmap["latitude"].between(41, 51.5)) &
+            #         (dmap["longitude"].between(-5.5, 9.8))
+            #     ]
+
+            dmap = dmap.head(sample_n)
+
+            # Palette bornée par les quantiles des points affichés
+            ql = dmap["prix_m2"].quantile(q_low)
+            qh = dmap["prix_m2"].quantile(q_high)
+
+            fig = px.scatter_mapbox(
+                dmap,
+                lat="latitude",
+                lon="longitude",
+                color="prix_m2",
+                color_continuous_scale="Viridis",
+                range_color=[ql, qh],
+                zoom=4,
+                height=560,
+                title="Répartition spatiale des ventes (couleur = prix/m², échantillon)"
+            )
         fig.update_layout(mapbox_style="carto-positron", margin=dict(l=10, r=10, t=50, b=10))
         st.plotly_chart(fig, width="stretch")
     else:
@@ -269,27 +309,12 @@ L’objectif n’est pas de démontrer une relation linéaire forte, mais de :
 """
     )
 
-    # Corrélation sur le dataset modèle (plus proche du ML)
-    num_cols = df_model.select_dtypes(include=[np.number]).columns.tolist()
-
-    # Sous-ensemble fixé, cohérent avec le notebook
-    selected_cols = [
-        c for c in [
-            "prix_m2",
-            "surface_reelle_bati",
-            "nombre_pieces_principales",
-            "latitude",
-            "longitude",
-            "has_dependance",
-            "nb_ventes_commune",
-        ]
-        if c in num_cols
-    ]
-
-    if len(selected_cols) < 2:
+    # Corrélation sur le dataset modèle (plus proche du ML), sur un sous-ensemble
+    # fixé cohérent avec le notebook (scripts/aggregates.py : CORR_COLUMNS)
+    if "correlations" not in aggs:
         st.warning("Pas assez de variables numériques pour calculer une corrélation.")
     else:
-        corr = df_model[selected_cols].corr(numeric_only=True)
+        corr = aggs["correlations"].set_index("variable").rename_axis(None)
 
         fig = px.imshow(
             corr,
@@ -331,8 +356,10 @@ Cette séparation améliore :
 """
     )
 
-    only_model = sorted(list(set(df_model.columns) - set(df_stream.columns)))
-    only_stream = sorted(list(set(df_stream.columns) - set(df_model.columns)))
+    model_schema = schemas[schemas["jeu"] == "modele"][["col", "dtype"]].reset_index(drop=True)
+    stream_schema = schemas[schemas["jeu"] == "streamlit"][["col", "dtype"]].reset_index(drop=True)
+    only_model = sorted(list(set(model_schema["col"]) - set(stream_schema["col"])))
+    only_stream = sorted(list(set(stream_schema["col"]) - set(model_schema["col"])))
 
     c1, c2 = st.columns(2)
     with c1:
@@ -346,10 +373,10 @@ Cette séparation améliore :
     s1, s2 = st.columns(2)
     with s1:
         st.write("Jeu Modèle")
-        st.dataframe(pd.DataFrame({"col": df_model.columns, "dtype": df_model.dtypes.astype(str)}))
+        st.dataframe(model_schema)
     with s2:
         st.write("Jeu Streamlit")
-        st.dataframe(pd.DataFrame({"col": df_stream.columns, "dtype": df_stream.dtypes.astype(str)}))
+        st.dataframe(stream_schema)
 
     st.divider()
     st.markdown(
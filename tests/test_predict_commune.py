@@ -0,0 +1,96 @@
+"""
+Résolution de la commune par l'API (app/main.py) : un modèle indexé sur le
+nom sert les requêtes `nom_commune` seules, même sans index des communes.
+
+Usage (depuis la racine du repo) :
+    python -m pytest tests
+"""
+import importlib
+import sys
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.pipeline import Pipeline
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(PROJECT_ROOT))
+sys.path.append(str(PROJECT_ROOT / "app"))
+from train.train import CommuneSalesEncoder, FeatureSelector  # noqa: E402
+
+FEATURES = ["surface_reelle_bati", "nombre_pieces_principales", "latitude", "longitude", "has_dependance"]
+ROW = {
+    "surface_reelle_bati": 50.0,
+    "nombre_pieces_principales": 2,
+    "latitude": 48.8566,
+    "longitude": 2.3522,
+    "has_dependance": 0,
+}
+API_KEY = "test_key"
+
+
+def name_keyed_pipeline() -> Pipeline:
+    # Pipeline historique : encodeur de commune sur nom_commune
+    rng = np.random.default_rng(0)
+    n = 200
+    X = pd.DataFrame({
+        "surface_reelle_bati": rng.uniform(20, 120, n),
+        "nombre_pieces_principales": rng.integers(1, 6, n),
+        "latitude": rng.uniform(43, 49, n),
+        "longitude": rng.uniform(0, 6, n),
+        "has_dependance": rng.integers(0, 2, n),
+        "nom_commune": rng.choice(["Paris", "Lyon", "Nantes"], n),
+    })
+    y = rng.uniform(2000, 10000, n)
+    return Pipeline(steps=[
+        ("commune_encoder", CommuneSalesEncoder()),
+        ("feature_selector", FeatureSelector(FEATURES + ["nb_ventes_commune"])),
+        ("model", RandomForestRegressor(n_estimators=5, random_state=0)),
+    ]).fit(X, y)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    joblib.dump(name_keyed_pipeline(), tmp_path / "model.joblib")
+    monkeypatch.setenv("MODEL_PATH", str(tmp_path / "model.joblib"))
+    monkeypatch.setenv("MODEL_DIR", str(tmp_path))
+    monkeypatch.setenv("COMMUNE_INDEX_PATH", str(tmp_path / "communes_absent.parquet"))
+    monkeypatch.setenv("API_KEY", API_KEY)
+    # Configuration lue à l'import : modules rechargés avec l'environnement du test
+    for module in ["main", "model_registry", "model_loader", "security"]:
+        sys.modules.pop(module, None)
+    main = importlib.import_module("main")
+    return TestClient(main.app, headers={"x-api-key": API_KEY})
+
+
+def test_predict_nom_commune_without_index(client):
+    response = client.post("/predict", json={**ROW, "nom_commune": "Paris"})
+    assert response.status_code == 200, response.text
+    assert response.json()["prix_m2"] > 0
+
+
+def test_predict_batch_nom_commune_without_index(client):
+    response = client.post("/predict/batch", json={"rows": [{**ROW, "nom_commune": "Lyon"}] * 3})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["n_errors"] == 0
+    assert all(p is not None for p in body["predictions"])
+
+
+def test_code_commune_only_needs_index(client):
+    # Le modèle lit le nom : un code seul n'est pas résoluble sans index
+    response = client.post("/predict", json={**ROW, "code_commune": "75056"})
+    assert response.status_code == 422
+
+
+def test_predict_batch_too_large_columns(client, monkeypatch):
+    import main
+    monkeypatch.setattr(main, "MAX_BATCH_SIZE", 2)
+    monkeypatch.setattr(main.BatchInputData, "to_rows", lambda self: pytest.fail("payload déplié"))
+    columns = {key: [value] * 3 for key, value in {**ROW, "nom_commune": "Paris"}.items()}
+    response = client.post("/predict/batch", json={"columns": columns})
+    assert response.status_code == 413
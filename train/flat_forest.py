@@ -0,0 +1,182 @@
+# 📦 Imports
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import joblib
+
+from train.train import features_from_columns
+
+FLAT_FORMAT = "flat_forest_v1"
+
+
+# =========================
+# 🌲 Forêt à plat
+# =========================
+class FlatForest:
+    """
+    Forêt d'arbres de régression stockée dans des tableaux NumPy contigus.
+
+    Tous les noeuds des arbres sont concaténés : `feature`, `threshold`,
+    `left`, `right` et `value` sont indexés par un identifiant global de
+    noeud, `roots` donne le noeud racine de chaque arbre. Les feuilles
+    bouclent sur elles-mêmes (left = right = noeud), ce qui permet de
+    parcourir tous les arbres pour tout un batch en `max_depth` itérations
+    vectorisées, sans branchement Python par noeud.
+    """
+
+    ARRAYS = ("feature", "threshold", "left", "right", "value", "roots")
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+
+    @classmethod
+    def from_estimator(cls, forest):
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        for est in forest.estimators_:
+            tree = est.tree_
+            ids = np.arange(tree.node_count, dtype=np.int32) + offset
+            is_leaf = tree.children_left == -1
+
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+            thresholds.append(tree.threshold.astype(np.float64))
+            lefts.append(np.where(is_leaf, ids, tree.children_left + offset).astype(np.int32))
+            rights.append(np.where(is_leaf, ids, tree.children_right + offset).astype(np.int32))
+            values.append(tree.value[:, 0, 0].astype(np.float64))
+            roots.append(offset)
+            offset += tree.node_count
+
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts),
+            right=np.concatenate(rights),
+            value=np.concatenate(values),
+            roots=np.asarray(roots, dtype=np.int32),
+            max_depth=max(est.tree_.max_depth for est in forest.estimators_),
+        )
+
+    @property
+    def n_estimators(self) -> int:
+        return len(self.roots)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in self.ARRAYS)
+
+    def predict(self, X: np.ndarray, block_size: int | None = None) -> np.ndarray:
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows = X.shape[0]
+        # Limite la matrice (arbres x lignes) à ~1M de noeuds par bloc
+        block_size = block_size or max(1, (1 << 20) // self.n_estimators)
+        y_pred = np.empty(n_rows, dtype=np.float64)
+        for start in range(0, n_rows, block_size):
+            y_pred[start:start + block_size] = self._predict_block(X[start:start + block_size])
+        return y_pred
+
+    def _predict_block(self, X: np.ndarray) -> np.ndarray:
+        n_rows, n_features = X.shape
+        X_flat = X.ravel()
+        # Décalage de chaque ligne dans X aplati : X[i, f] = X_flat[i * n_features + f]
+        row_offsets = (np.arange(n_rows, dtype=np.intp) * n_features)[None, :]
+        nodes = np.repeat(self.roots[:, None], n_rows, axis=1)
+        for _ in range(self.max_depth):
+            x = X_flat.take(row_offsets + self.feature.take(nodes))
+            # float32 promu en float64 pour la comparaison, comme dans sklearn
+            nodes = np.where(x <= self.threshold.take(nodes), self.left.take(nodes), self.right.take(nodes))
+        # Somme séquentielle arbre par arbre (cumsum ne fait pas de sommation
+        # par paires). RandomForestRegressor.predict (n_jobs=-1) somme entre
+        # threads dans un ordre non fixé : résultats égaux à 1e-9 près
+        # (scripts/bench_flat_forest.py), pas au bit près.
+        return np.cumsum(self.value.take(nodes), axis=0)[-1] / self.n_estimators
+
+    def to_dict(self) -> dict:
+        out = {name: getattr(self, name) for name in self.ARRAYS}
+        out["max_depth"] = self.max_depth
+        return out
+
+
+# =========================
+# 🚀 Pipeline d'inférence
+# =========================
+class FlatPipeline:
+    """
+    Remplaçant du pipeline sklearn pour le service : mêmes étapes de
+    préparation (encodeur commune, sélection de features), forêt à plat.
+    """
+
+    def __init__(self, steps, forest: FlatForest):
+        self.steps = steps
+        self.forest = forest
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        *steps, (_, forest) = pipeline.steps
+        return cls(steps, FlatForest.from_estimator(forest))
+
+    def predict_records(self, records: list) -> np.ndarray:
+        columns = {key: [record[key] for record in records] for key in records[0]}
+        return self.forest.predict(features_from_columns(self.steps, columns))
+
+    def predict(self, X) -> np.ndarray:
+        columns = {col: X[col].to_numpy() for col in X.columns}
+        return self.forest.predict(features_from_columns(self.steps, columns))
+
+    def save(self, path) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # Pas de compression : les tableaux doivent rester mappables (mmap)
+        joblib.dump(
+            {"format": FLAT_FORMAT, "steps": self.steps, "forest": self.forest.to_dict()},
+            path,
+        )
+
+    @classmethod
+    def from_dict(cls, payload: dict):
+        if payload.get("format") != FLAT_FORMAT:
+            raise ValueError(f"Format de modèle inattendu : {payload.get('format')!r}")
+        return cls(payload["steps"], FlatForest(**payload["forest"]))
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        # mmap_mode="r" : tableaux mappés en lecture seule, partagés entre
+        # processus via le cache de pages (fichier non compressé requis)
+        return cls.from_dict(joblib.load(path, mmap_mode=mmap_mode))
+
+
+def export_flat(pipeline_path, output_path) -> FlatPipeline:
+    """
+    Convertit un pipeline sklearn sérialisé (joblib) en modèle à plat.
+
+    Parameters
+    ----------
+    pipeline_path : str
+        Chemin du pipeline entraîné (.joblib)
+    output_path : str
+        Chemin du modèle à plat à écrire
+    """
+    start = time.perf_counter()
+    pipeline = joblib.load(pipeline_path)
+    flat = FlatPipeline.from_pipeline(pipeline)
+    flat.save(output_path)
+
+    print(f"✅ Modèle à plat sauvegardé : {output_path}")
+    print(f"   → arbres : {flat.forest.n_estimators}")
+    print(f"   → noeuds : {len(flat.forest.value):,}".replace(",", " "))
+    print(f"   → tableaux : {flat.forest.nbytes / 1e6:.1f} Mo")
+    print(f"   → durée : {time.perf_counter() - start:.1f} s")
+    return flat
+
+
+if __name__ == "__main__":
+    # python -m train.flat_forest model/model.joblib model/model_flat.joblib
+    src = sys.argv[1] if len(sys.argv) > 1 else "model/model.joblib"
+    dst = sys.argv[2] if len(sys.argv) > 2 else "model/model_flat.joblib"
+    export_flat(src, dst)
@@ -5,26 +5,47 @@ import joblib
 
 
 from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.neighbors import KDTree
 from sklearn.pipeline import Pipeline
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_squared_error, r2_score
 
 import os
-print(os.getcwd())
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from scripts.feature_store import SOURCE_COLUMNS, compute_feature_store, load_feature_store  # noqa: E402
+from scripts.io_utils import save_parquet  # noqa: E402
 
 # =========================
 # 🔧 Custom Transformer
 # =========================
 class CommuneSalesEncoder(BaseEstimator, TransformerMixin):
-    def __init__(self):
+    key = "nom_commune"
+    # Défaut de classe : les pipelines picklés avant l'ajout du paramètre
+    # n'ont pas l'attribut d'instance
+    feature_store = None
+
+    def __init__(self, feature_store=None):
+        # feature_store : chemin d'un Parquet de scripts/feature_store.py ;
+        # les comptages viennent alors du store au lieu d'un groupby sur X.
+        # Le store doit être construit sur les seules lignes d'entraînement
+        # (voir TRAIN_FEATURE_STORE) : celui de l'API couvre tout le dataset,
+        # jeu de test compris.
+        self.feature_store = feature_store
         self.commune_counts_ = None
         self.median_ = None
 
     def fit(self, X, y=None):
-        counts = X.groupby("nom_commune").size()
+        if self.feature_store:
+            counts = load_feature_store(self.feature_store).series("commune", "nb_ventes").astype("int64")
+        else:
+            counts = X.groupby("nom_commune").size()
         self.commune_counts_ = counts
         self.median_ = counts.median()
+        self.commune_index_ = counts.astype(float).to_dict()
         return self
 
     def transform(self, X):
@@ -33,6 +54,170 @@ class CommuneSalesEncoder(BaseEstimator, TransformerMixin):
         X["nb_ventes_commune"] = X["nb_ventes_commune"].fillna(self.median_)
         return X
 
+    def lookup(self, communes) -> np.ndarray:
+        # Recherche dict pure (sans pandas) ; reconstruit l'index pour les
+        # pipelines picklés avant l'ajout de `commune_index_`.
+        index = getattr(self, "commune_index_", None)
+        if index is None:
+            index = self.commune_index_ = self.commune_counts_.astype(float).to_dict()
+        median = float(self.median_)
+        return np.fromiter((index.get(c, median) for c in communes), dtype=np.float64, count=len(communes))
+
+    def transform_columns(self, columns: dict) -> dict:
+        columns["nb_ventes_commune"] = self.lookup(columns[self.key])
+        return columns
+
+
+class CommuneCodeEncoder(BaseEstimator, TransformerMixin):
+    """
+    Nombre de ventes par commune, indexé sur le code INSEE `code_commune`.
+
+    Au fit, les communes sont internées en identifiants int32 denses
+    (`communes_`) et les comptages rangés dans un tableau dont la dernière
+    case porte la médiane (communes inconnues). Le transform résout chaque
+    valeur distincte une seule fois (`factorize`, ou directement les
+    catégories d'une colonne catégorielle) puis lit le tableau.
+    Contrairement au nom, le code distingue les communes homonymes.
+    """
+
+    def __init__(self, key="code_commune", feature_store=None):
+        self.key = key
+        self.feature_store = feature_store
+
+    def fit(self, X, y=None):
+        if self.feature_store:
+            level = "code_commune" if self.key == "code_commune" else "commune"
+            counts = load_feature_store(self.feature_store).series(level, "nb_ventes")
+            communes, counts = counts.index.to_numpy(), counts.to_numpy(dtype=np.float64)
+        else:
+            ids, communes = pd.factorize(self._normalize(X[self.key]))
+            counts = np.bincount(ids[ids >= 0], minlength=len(communes)).astype(np.float64)
+        self.communes_ = pd.Index(communes)
+        self._index = None
+        self.median_ = float(np.median(counts))
+        self.counts_ = np.append(counts, self.median_)
+        return self
+
+    def _normalize(self, values):
+        if self.key == "code_commune" and pd.api.types.is_numeric_dtype(values):
+            return values.astype("Int64").astype("string").str.zfill(5)
+        return values
+
+    def ids(self, values) -> np.ndarray:
+        """Identifiants int32 des communes ; len(communes_) pour les inconnues."""
+        n = len(self.communes_)
+        if not isinstance(values, pd.Series):
+            # Listes (API) : recherche dict, sans construire de Series
+            index = getattr(self, "_index", None)
+            if index is None:
+                index = self._index = {c: i for i, c in enumerate(self.communes_)}
+            if self.key == "code_commune":
+                values = [str(v).zfill(5) if isinstance(v, int) else v for v in values]
+            return np.fromiter((index.get(v, n) for v in values), dtype=np.int32, count=len(values))
+
+        values = self._normalize(values)
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Seules les catégories sont résolues, puis propagées par les codes
+            uniques, codes = values.cat.categories, values.cat.codes.to_numpy()
+        else:
+            codes, uniques = pd.factorize(values)
+        ids = np.append(self.communes_.get_indexer(uniques), -1)[codes].astype(np.int32)
+        ids[ids < 0] = n
+        return ids
+
+    def transform(self, X):
+        X = X.copy()
+        X["nb_ventes_commune"] = self.counts_[self.ids(X[self.key])]
+        return X
+
+    def transform_columns(self, columns: dict) -> dict:
+        columns["nb_ventes_commune"] = self.counts_[self.ids(columns[self.key])]
+        return columns
+
+
+EARTH_RADIUS_M = 6_371_000.0
+
+
+class SpatialNeighborEncoder(BaseEstimator, TransformerMixin):
+    """
+    Prix des ventes voisines, à partir d'un index spatial des ventes
+    d'entraînement.
+
+    Les coordonnées sont projetées sur la sphère unité (x, y, z) et indexées
+    dans un KDTree euclidien : la distance de corde est une fonction
+    croissante de la distance haversine, donc voisins et comptages par rayon
+    sont exactement ceux d'un BallTree haversine, sans trigonométrie par
+    distance (mesuré sur 2020 : requêtes kNN environ 15 fois, comptages par
+    rayon environ 3 fois plus rapides).
+
+    Ajoute `prix_m2_voisins` (médiane du prix/m² des `k` plus proches
+    voisins) et `nb_ventes_<r>m` (nombre de ventes à moins de r mètres, pour
+    chaque rayon de `radii_m`). Au fit (`fit_transform`), chaque vente est
+    exclue de son propre voisinage (leave-one-out) : la cible d'une ligne
+    n'entre jamais dans ses features. L'index est picklé avec le pipeline.
+    """
+
+    def __init__(self, k=10, radii_m=(250, 1000)):
+        self.k = k
+        self.radii_m = radii_m
+
+    def fit(self, X, y=None):
+        if y is None:
+            raise ValueError("SpatialNeighborEncoder a besoin de la cible (prix/m²) au fit.")
+        self.tree_ = KDTree(self._unit_vectors(X["latitude"], X["longitude"]))
+        self.prices_ = np.asarray(y, dtype=np.float64)
+        return self
+
+    def fit_transform(self, X, y=None, **fit_params):
+        self.fit(X, y)
+        X = X.copy()
+        for name, values in self._features(X["latitude"], X["longitude"], leave_one_out=True).items():
+            X[name] = values
+        return X
+
+    @staticmethod
+    def _unit_vectors(latitude, longitude) -> np.ndarray:
+        lat = np.radians(np.asarray(latitude, dtype=np.float64))
+        lon = np.radians(np.asarray(longitude, dtype=np.float64))
+        return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+    @staticmethod
+    def _chord(radius_m: float) -> float:
+        # Distance sur la sphère (m) -> longueur de corde sur la sphère unité
+        return 2 * np.sin(radius_m / (2 * EARTH_RADIUS_M))
+
+    def _features(self, latitude, longitude, leave_one_out=False) -> dict:
+        points = self._unit_vectors(latitude, longitude)
+        n, k = len(points), self.k
+        if not leave_one_out:
+            ind = self.tree_.query(points, k=k, return_distance=False)
+        else:
+            # k+1 voisins, dont la ligne elle-même : on la retire (ou, si des
+            # doublons de coordonnées l'ont évincée, le voisin le plus lointain)
+            ind = self.tree_.query(points, k=k + 1, return_distance=False)
+            own = ind == np.arange(n)[:, None]
+            own[~own.any(axis=1), -1] = True
+            ind = ind[~own].reshape(n, k)
+
+        features = {"prix_m2_voisins": np.median(self.prices_[ind], axis=1)}
+        for radius in self.radii_m:
+            counts = self.tree_.query_radius(points, r=self._chord(radius), count_only=True)
+            features[f"nb_ventes_{radius}m"] = counts - 1 if leave_one_out else counts
+        return features
+
+    def transform(self, X):
+        X = X.copy()
+        for name, values in self._features(X["latitude"], X["longitude"]).items():
+            X[name] = values
+        return X
+
+    def transform_columns(self, columns: dict) -> dict:
+        columns.update(self._features(columns["latitude"], columns["longitude"]))
+        return columns
+
+    def feature_names(self) -> list:
+        return ["prix_m2_voisins", *[f"nb_ventes_{radius}m" for radius in self.radii_m]]
+
 
 class FeatureSelector(BaseEstimator, TransformerMixin):
     def __init__(self, features):
@@ -44,67 +229,136 @@ class FeatureSelector(BaseEstimator, TransformerMixin):
     def transform(self, X):
         return X[self.features]
 
+    def to_array(self, columns: dict) -> np.ndarray:
+        n_rows = len(next(iter(columns.values())))
+        X = np.empty((n_rows, len(self.features)), dtype=np.float32)
+        for j, feature in enumerate(self.features):
+            X[:, j] = columns[feature]
+        return X
+
 
 # =========================
-# 📊 Chargement données
+# ⚡ Inférence NumPy (sans DataFrame)
 # =========================
-df = pd.read_parquet('data/prod/df_model_appart_2020.parquet.gz', engine='pyarrow')
+def supports_records(pipeline) -> bool:
+    *steps, (_, model) = pipeline.steps
+    return hasattr(model, "estimators_") and all(
+        isinstance(step, FeatureSelector) or hasattr(step, "transform_columns")
+        for _, step in steps
+    )
 
-df["has_dependance"] = df["has_dependance"].astype(int)
 
-FEATURES_BASE = [
-    "surface_reelle_bati",
-    "nombre_pieces_principales",
-    "latitude",
-    "longitude",
-    "has_dependance",
-]
+def features_from_columns(steps, columns: dict) -> np.ndarray:
+    # Applique les étapes de préparation (hors modèle) sur un dict de colonnes
+    for _, step in steps:
+        if isinstance(step, FeatureSelector):
+            return step.to_array(columns)
+        columns = step.transform_columns(columns)
+    raise ValueError("Le pipeline ne contient pas de FeatureSelector.")
 
-TARGET = "prix_m2"
 
-X = df[FEATURES_BASE + ["nom_commune"]].copy()
-y = df[TARGET]
+def predict_records(pipeline, records: list) -> np.ndarray:
+    """
+    Prédit sur une liste de dicts sans passer par pandas.
 
-# =========================
-# ✂️ Split
-# =========================
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.2, random_state=42
-)
+    Les features sont assemblées directement dans une matrice float32, puis
+    chaque arbre est parcouru dans l'ordre. Le résultat égale
+    `pipeline.predict(pd.DataFrame(records))` à 1e-9 près (écart vérifié par
+    scripts/bench_flat_forest.py) : avec `n_jobs=-1`, sklearn somme les arbres
+    entre threads dans un ordre non fixé, l'égalité au bit près n'est pas garantie.
+    """
+    columns = {key: [record[key] for record in records] for key in records[0]}
+    *steps, (_, forest) = pipeline.steps
+    X = features_from_columns(steps, columns)
 
-# =========================
-# 🚀 Pipeline
-# =========================
-pipeline = Pipeline(steps=[
-    ("commune_encoder", CommuneSalesEncoder()),
-    ("feature_selector", FeatureSelector(FEATURES_BASE + ["nb_ventes_commune"])),
-    ("model", RandomForestRegressor(
-        n_estimators=300,
-        max_depth=22,
-        min_samples_leaf=20,
-        random_state=42,
-        n_jobs=-1
-    ))
-])
+    y_pred = np.zeros(len(records), dtype=np.float64)
+    for tree in forest.estimators_:
+        y_pred += tree.predict(X, check_input=False)
+    y_pred /= len(forest.estimators_)
+    return y_pred
 
-# =========================
-# 🎯 Train
-# =========================
-pipeline.fit(X_train, y_train)
 
-# =========================
-# 📈 Predict
-# =========================
-y_pred = pipeline.predict(X_test)
+if __name__ == "__main__":
+    print(os.getcwd())
 
-# =========================
-# 📊 Evaluation
-# =========================
-rmse = np.sqrt(mean_squared_error(y_test, y_pred))
-r2 = r2_score(y_test, y_pred)
+    # =========================
+    # 📊 Chargement données
+    # =========================
+    df = pd.read_parquet('data/prod/df_model_appart_2020.parquet.gz', engine='pyarrow')
+
+    df["has_dependance"] = df["has_dependance"].astype(int)
+
+    FEATURES_BASE = [
+        "surface_reelle_bati",
+        "nombre_pieces_principales",
+        "latitude",
+        "longitude",
+        "has_dependance",
+    ]
+
+    TARGET = "prix_m2"
+
+    # Les datasets de production récents portent le code INSEE de la commune
+    COMMUNE_KEYS = [c for c in ["nom_commune", "code_commune"] if c in df.columns]
+
+    X = df[FEATURES_BASE + COMMUNE_KEYS].copy()
+    y = df[TARGET]
+
+    # =========================
+    # ✂️ Split
+    # =========================
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.2, random_state=42
+    )
+
+    # Avec FEATURE_STORE=1, les encodeurs de commune lisent leurs comptages
+    # dans un feature store construit sur les lignes d'entraînement seules
+    # (le store de l'API, calculé sur tout le dataset, fuirait le jeu de test).
+    feature_store = None
+    if os.getenv("FEATURE_STORE", "0") == "1":
+        feature_store = os.getenv("TRAIN_FEATURE_STORE", "data/features/stats_train_2020.parquet")
+        train_rows = df.loc[X_train.index, [c for c in SOURCE_COLUMNS if c in df.columns]]
+        save_parquet(compute_feature_store(train_rows), feature_store, compression="zstd")
+
+    # =========================
+    # 🚀 Pipeline
+    # =========================
+    spatial_encoder = SpatialNeighborEncoder(k=10, radii_m=(250, 1000))
+
+    pipeline = Pipeline(steps=[
+        ("commune_encoder", (
+            CommuneCodeEncoder(feature_store=feature_store) if "code_commune" in COMMUNE_KEYS
+            else CommuneSalesEncoder(feature_store=feature_store)
+        )),
+        ("spatial_encoder", spatial_encoder),
+        ("feature_selector", FeatureSelector(FEATURES_BASE + ["nb_ventes_commune"] + spatial_encoder.feature_names())),
+        ("model", RandomForestRegressor(
+            n_estimators=300,
+            max_depth=22,
+            min_samples_leaf=20,
+            random_state=42,
+            n_jobs=-1
+        ))
+    ])
+
+    # =========================
+    # 🎯 Train
+    # =========================
+    pipeline.fit(X_train, y_train)
+
+    # =========================
+    # 📈 Predict
+    # =========================
+    y_pred = pipeline.predict(X_test)
+
+    # =========================
+    # 📊 Evaluation
+    # =========================
+    rmse = np.sqrt(mean_squared_error(y_test, y_pred))
+    r2 = r2_score(y_test, y_pred)
 
-print("Pipeline Random Forest")
-print("RMSE :", rmse)
-print("R2   :", r2)
+    print("Pipeline Random Forest")
+    print("RMSE :", rmse)
+    print("R2   :", r2)
 
-# joblib.dump(pipeline, "model.joblib")
\ No newline at end of file
+    # joblib.dump(pipeline, "model.joblib")